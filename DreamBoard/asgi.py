@@ -4,11 +4,12 @@ from django.core.asgi import get_asgi_application
 from channels.auth import AuthMiddlewareStack
 from channels.security.websocket import AllowedHostsOriginValidator
 from chat.routing import websocket_urlpatterns
+from offload.asgi import MediaFiles
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DreamBoard.settings')
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": MediaFiles(get_asgi_application()),
     "websocket": AllowedHostsOriginValidator(
         AuthMiddlewareStack(
             URLRouter(
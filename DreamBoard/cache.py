@@ -0,0 +1,110 @@
+"""
+Rendered-representation cache for detail views.
+
+Each cached object has a version token under `<prefix>:<pk>:version`.
+Rendered responses are stored under a key that embeds that token, so
+invalidating an object is a single write of a fresh token; the stale
+renders are never looked up again and simply expire. Tokens are bumped
+from model signals once the writing transaction commits, so a concurrent
+reader can never cache pre-commit data under the new token.
+
+Renders also embed users (authors, commenters). Rather than bumping every
+pin and board that shows a user, each user has a token of its own: the
+serializers report the users they render through `depend_on()`, the
+cached entry records their tokens, and a hit whose recorded tokens no
+longer match is rendered again. A profile edit or a follow therefore
+bumps only the users' own keys.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+
+def _timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def _version_key(prefix, pk):
+    return f'{prefix}:{pk}:version'
+
+
+def get_version(prefix, pk):
+    key = _version_key(prefix, pk)
+    version = cache.get(key)
+    if version is None:
+        # a fresh token, never a reused one, in case the old token was evicted
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(prefix, *pks):
+    """Invalidate every cached render of the given objects once the current transaction commits."""
+    pks = {pk for pk in pks if pk is not None}
+    if not pks:
+        return
+
+    def bump():
+        version = time.time_ns()
+        cache.set_many({_version_key(prefix, pk): version for pk in pks}, None)
+
+    transaction.on_commit(bump)
+
+
+def depend_on(context, prefix, pk):
+    """Record, during a cached render, that the body embeds object `pk` under `prefix`."""
+    dependencies = context.get('cache_dependencies')
+    if dependencies is not None:
+        dependencies.add((prefix, pk))
+
+
+def _current(tokens):
+    return cache.get_many(list(tokens)) == tokens
+
+
+def representation_key(prefix, pk, request):
+    # the rendered body depends on ?fields=/?expand= and on the host used in absolute media URLs
+    variant = '&'.join(sorted(request.GET.urlencode().split('&')))
+    digest = hashlib.md5(f'{request.scheme}://{request.get_host()}?{variant}'.encode()).hexdigest()
+    return f'{prefix}:{pk}:v{get_version(prefix, pk)}:{digest}'
+
+
+class CachedRetrieveMixin:
+    """
+    Serves `retrieve` from the representation cache. Only the shared,
+    viewer-independent body is cached: it is rendered with `shared` set in
+    the serializer context, and `add_viewer_data()` fills in the requesting
+    user's fields on every response. The entry keeps the tokens of the
+    objects reported through `depend_on()`; a render during which one of
+    them was bumped is served but not stored.
+    """
+    cache_prefix = None
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        key = representation_key(self.cache_prefix, pk, request)
+        entry = cache.get(key)
+        if entry is not None and _current(entry['tokens']):
+            data = entry['data']
+        else:
+            started = time.time_ns()
+            dependencies = set()
+            instance = self.get_object()
+            context = {**self.get_serializer_context(), 'shared': True, 'cache_dependencies': dependencies}
+            data = self.get_serializer(instance, context=context).data
+            objects = {_version_key(*dependency): dependency for dependency in dependencies}
+            tokens = cache.get_many(list(objects))
+            # tokens are bump timestamps: a newer one means an embedded row changed after it was read
+            fresh = all(token < started for token in tokens.values())
+            tokens.update({name: get_version(*objects[name]) for name in objects.keys() - tokens.keys()})
+            if fresh:
+                cache.set(key, {'data': data, 'tokens': tokens}, _timeout())
+        return Response(self.add_viewer_data(data))
+
+    def add_viewer_data(self, data):
+        return data
@@ -0,0 +1,12 @@
+"""
+Correlated COUNT subqueries, for annotating or recomputing counters without
+a GROUP BY over the outer query.
+"""
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_for(model, field):
+    """The number of `model` rows whose `field` points at the outer row, 0 when there are none."""
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(rows.annotate(total=Count('pk')).values('total')), Value(0))
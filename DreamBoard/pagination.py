@@ -0,0 +1,96 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Opaque-cursor pagination that seeks on the full `ordering` key, e.g.
+    `(date_created, id)`, instead of an OFFSET or a single column plus an
+    offset. Every page is one indexed range scan with no COUNT(*), so deep
+    pages cost the same as the first and rows inserted at the head of the
+    list never shift the pages a client is walking through.
+    """
+    ordering = ('-date_created', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+
+        ordering = [self._flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None and self.cursor.position is not None:
+            try:
+                queryset = queryset.filter(self._seek(ordering, self._decode_position()))
+            except (ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        # an explicit order_by() on the queryset, such as relevance from a
+        # search filter, takes precedence over the class default
+        if queryset.query.order_by:
+            return tuple(queryset.query.order_by)
+        return super().get_ordering(request, queryset, view)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def _link(self, instance, reverse):
+        values = [str(getattr(instance, field.lstrip('-'))) for field in self.ordering]
+        cursor = Cursor(offset=0, reverse=reverse, position=json.dumps(values))
+        return self.encode_cursor(cursor)
+
+    def _decode_position(self):
+        try:
+            values = json.loads(self.cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _seek(ordering, values):
+        """
+        Rows strictly after `values` in `ordering`, expanded lexicographically:
+        (a > x) OR (a = x AND b > y) ...
+        """
+        condition = Q()
+        for i, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clause = Q(**{f.lstrip('-'): v for f, v in zip(ordering[:i], values[:i])})
+            clause &= Q(**{f'{field.lstrip("-")}__{lookup}': values[i]})
+            condition |= clause
+        return condition
@@ -0,0 +1,65 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _parse_paths(value):
+    """Turn 'id,user.username,user.bio' into {'id': {}, 'user': {'username': {}, 'bio': {}}}."""
+    tree = {}
+    for path in filter(None, (part.strip() for part in value.split(','))):
+        node = tree
+        for name in path.split('.'):
+            node = node.setdefault(name, {})
+    return tree
+
+
+class DynamicFieldsMixin:
+    """
+    Lets GET requests shape the response with `?fields=` and `?expand=`.
+
+    `fields` keeps only the listed fields (dotted paths reach into nested
+    serializers), and a relation it lists is rendered in full. Once either
+    parameter is given, the relations named in `expandable_fields` that
+    `fields` does not list are rendered in full only if they appear in
+    `expand`; otherwise a to-one relation collapses to its primary key and a
+    to-many relation is dropped. Without either parameter the full tree is
+    rendered as before.
+
+    Pruning happens when the serializer is built, so `setup_eager_loading`
+    can look at `self.fields` and skip joins for anything not rendered.
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        params = request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return
+        fields = _parse_paths(params['fields']) if 'fields' in params else None
+        _prune(self, fields, _parse_paths(params.get('expand', '')))
+
+
+def _prune(serializer, fields, expand):
+    for name, field in list(serializer.fields.items()):
+        if fields and name not in fields:
+            serializer.fields.pop(name)
+            continue
+
+        many = isinstance(field, serializers.ListSerializer)
+        nested = field.child if many else field
+        if not isinstance(nested, serializers.Serializer):
+            continue
+
+        # anything still here when `fields` is given was asked for by name, so it is expanded
+        if name in getattr(serializer, 'expandable_fields', ()) and name not in expand and not fields:
+            if many:
+                serializer.fields.pop(name)
+            else:
+                source = {} if field.source == name else {'source': field.source}
+                serializer.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, **source)
+            continue
+
+        _prune(nested, (fields or {}).get(name) or None, expand.get(name, {}))
@@ -71,6 +71,7 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    'django.contrib.postgres',
     'cloudinary_storage',
     'django.contrib.staticfiles',
     'cloudinary',
@@ -82,6 +83,7 @@ INSTALLED_APPS = [
     'pins',
     'chat',
     'boards',
+    'offload',
     'django_filters',
     'corsheaders',
     'drf_yasg',
@@ -125,6 +127,66 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20
 }
 
+# Home feed: pins are fanned out on write to followers of accounts up to this
+# many followers; bigger accounts are merged into feeds at read time instead.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+# How many recent pins a new follow seeds into the follower's feed.
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', 50))
+
+# Reply trees: levels rendered below a comment and replies shown per node
+# before the rest is left to a "more_replies" link.
+REPLY_TREE_MAX_DEPTH = int(os.getenv('REPLY_TREE_MAX_DEPTH', 5))
+REPLY_TREE_MAX_CHILDREN = int(os.getenv('REPLY_TREE_MAX_CHILDREN', 10))
+# Comments inlined in a pin response; the rest are paged via /pins/<id>/comments/.
+PIN_COMMENTS_PREVIEW_SIZE = int(os.getenv('PIN_COMMENTS_PREVIEW_SIZE', 10))
+# Boards whose pin rank keys grow past this length are rewritten by
+# `manage.py rebalance_board_ranks`.
+BOARD_RANK_REBALANCE_LENGTH = int(os.getenv('BOARD_RANK_REBALANCE_LENGTH', 16))
+# Cache each user's liked/saved pin ids for is_liked/is_saved when they have
+# at most this many; 0 always answers with one IN query per page instead.
+VIEWER_STATE_CACHE_LIMIT = int(os.getenv('VIEWER_STATE_CACHE_LIMIT', 0))
+
+# Write-behind for like/save toggles: buffer them per process and write them
+# in batches every WRITE_BEHIND_INTERVAL seconds or WRITE_BEHIND_FLUSH_SIZE
+# toggles. Set WRITE_BEHIND_JOURNAL_DIR to journal pending toggles to disk.
+# Pending toggles are shown to every worker through the cache (REDIS_URL);
+# past WRITE_BEHIND_MAX_PENDING unflushed toggles they are written through.
+WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'False') == 'True'
+WRITE_BEHIND_INTERVAL = float(os.getenv('WRITE_BEHIND_INTERVAL', 1.0))
+WRITE_BEHIND_FLUSH_SIZE = int(os.getenv('WRITE_BEHIND_FLUSH_SIZE', 1000))
+WRITE_BEHIND_JOURNAL_DIR = os.getenv('WRITE_BEHIND_JOURNAL_DIR')
+WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', WRITE_BEHIND_FLUSH_SIZE * 10))
+WRITE_BEHIND_PENDING_TIMEOUT = int(os.getenv('WRITE_BEHIND_PENDING_TIMEOUT', 300))
+
+# Responsive image variants: widths of the WebP/JPEG ladder built for every
+# uploaded image, and the worker processes that build them (0 builds them
+# inline, after the upload commits).
+IMAGE_VARIANT_WIDTHS = [int(w) for w in os.getenv('IMAGE_VARIANT_WIDTHS', '236,474,736,1200').split(',')]
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+# Uploads are sampled for their layout hints and dHash while the request
+# saves them; images whose draft decode is larger than this many pixels are
+# sampled after commit instead, on the variant workers.
+IMAGE_DESCRIBE_MAX_PIXELS = int(os.getenv('IMAGE_DESCRIBE_MAX_PIXELS', 4000000))
+
+# Near-duplicate images: the dHash distance the duplicates endpoint matches
+# within, and whether uploads within PIN_UPLOAD_DEDUP_DISTANCE of a stored
+# image reuse its file instead of storing another copy.
+PIN_DUPLICATE_DISTANCE = int(os.getenv('PIN_DUPLICATE_DISTANCE', 6))
+PIN_UPLOAD_DEDUP = os.getenv('PIN_UPLOAD_DEDUP', 'False') == 'True'
+PIN_UPLOAD_DEDUP_DISTANCE = int(os.getenv('PIN_UPLOAD_DEDUP_DISTANCE', 2))
+
+# "More like this": directory of the memory-mapped image vector index. Every
+# web process on a host must see the same directory.
+SIMILAR_INDEX_DIR = os.getenv('SIMILAR_INDEX_DIR', os.path.join(BASE_DIR, 'var', 'similar'))
+SIMILAR_PINS_LIMIT = int(os.getenv('SIMILAR_PINS_LIMIT', 20))
+
+# Resumable video uploads: where chunks are staged on local disk, the largest
+# video accepted, and the threads handing finished uploads to storage (0 hands
+# them off inline).
+VIDEO_UPLOAD_STAGING_DIR = os.getenv('VIDEO_UPLOAD_STAGING_DIR', os.path.join(BASE_DIR, 'var', 'uploads'))
+VIDEO_UPLOAD_MAX_SIZE = int(os.getenv('VIDEO_UPLOAD_MAX_SIZE', 1024 ** 3))
+VIDEO_UPLOAD_WORKERS = int(os.getenv('VIDEO_UPLOAD_WORKERS', 2))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
@@ -169,12 +231,33 @@ ASGI_APPLICATION = 'DreamBoard.asgi.application'
 #     },
 # }
 
+# Channel layer shared by every daphne worker on the host through a broker on
+# a Unix socket (chat.layers). The first worker to need it hosts the broker
+# unless `run_channel_broker` runs it standalone.
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+        "BACKEND": "chat.layers.UnixSocketChannelLayer",
+        "CONFIG": {
+            "path": os.getenv('CHANNEL_BROKER_SOCKET', os.path.join(BASE_DIR, 'var', 'channels.sock')),
+        },
     }
 }
 
+# Off PostgreSQL, username and board title search uses an in-process trigram
+# index, rebuilt once it is this many seconds old to pick up other workers' writes.
+TRIGRAM_INDEX_MAX_AGE = float(os.getenv('TRIGRAM_INDEX_MAX_AGE', 60))
+
+# Shared cache for rendered pin/board responses. Without REDIS_URL every
+# process keeps its own local-memory cache.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv('REDIS_URL'),
+        }
+    }
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -245,12 +328,16 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Serve MEDIA_ROOT at MEDIA_URL from this app (offload.media), with byte
+# ranges and sendfile; on by default only in DEBUG.
+MEDIA_SERVE_LOCAL = os.getenv('MEDIA_SERVE_LOCAL', 'True' if DEBUG else 'False') == 'True'
+
 
 
 
 STORAGES = {
     "default": {
-        "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
+        "BACKEND": "offload.storage.OffloadStorage",
     },
     "staticfiles": {
         "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
@@ -258,6 +345,19 @@ STORAGES = {
 }
 
 
+# Media offload: uploads are written to MEDIA_OFFLOAD_STAGING_DIR, served from
+# MEDIA_OFFLOAD_PENDING_URL meanwhile, and copied to MEDIA_OFFLOAD_REMOTE by
+# MEDIA_OFFLOAD_WORKERS threads (0 copies inline), retrying up to
+# MEDIA_OFFLOAD_RETRIES times with backoff from MEDIA_OFFLOAD_RETRY_DELAY seconds.
+MEDIA_OFFLOAD_REMOTE = {
+    "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
+}
+MEDIA_OFFLOAD_STAGING_DIR = os.getenv('MEDIA_OFFLOAD_STAGING_DIR', os.path.join(BASE_DIR, 'var', 'staging'))
+MEDIA_OFFLOAD_PENDING_URL = os.getenv('MEDIA_OFFLOAD_PENDING_URL', '/media/pending/')
+MEDIA_OFFLOAD_WORKERS = int(os.getenv('MEDIA_OFFLOAD_WORKERS', 4))
+MEDIA_OFFLOAD_RETRIES = int(os.getenv('MEDIA_OFFLOAD_RETRIES', 5))
+MEDIA_OFFLOAD_RETRY_DELAY = float(os.getenv('MEDIA_OFFLOAD_RETRY_DELAY', 1.0))
+
 CLOUDINARY_STORAGE = {
     'CLOUD_NAME': os.getenv('CLOUDINARY_NAME'),
     'API_KEY': os.getenv('CLOUDINARY_API_KEY'),
@@ -0,0 +1,57 @@
+"""
+Settings for the test suite: `python manage.py test --settings=DreamBoard.test_settings`.
+
+An in-memory SQLite database, media and every scratch directory under one
+temporary directory, and the background pools turned off so thumbnails,
+video assembly and media offload run inline where a test can see them.
+"""
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+SECRET_KEY = 'tests'
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix='dreamboard-tests-')
+
+MEDIA_ROOT = os.path.join(SCRATCH_DIR, 'media')
+MEDIA_SERVE_LOCAL = True
+MEDIA_OFFLOAD_REMOTE = {
+    'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    'OPTIONS': {'location': os.path.join(SCRATCH_DIR, 'remote'), 'base_url': '/remote/'},
+}
+MEDIA_OFFLOAD_STAGING_DIR = os.path.join(SCRATCH_DIR, 'staging')
+MEDIA_OFFLOAD_WORKERS = 0
+MEDIA_OFFLOAD_RETRY_DELAY = 0
+
+IMAGE_VARIANT_WORKERS = 0
+VIDEO_UPLOAD_WORKERS = 0
+VIDEO_UPLOAD_STAGING_DIR = os.path.join(SCRATCH_DIR, 'uploads')
+SIMILAR_INDEX_DIR = os.path.join(SCRATCH_DIR, 'similar')
+WRITE_BEHIND_JOURNAL_DIR = os.path.join(SCRATCH_DIR, 'journal')
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'chat.layers.UnixSocketChannelLayer',
+        'CONFIG': {'path': os.path.join(SCRATCH_DIR, 'channels.sock')},
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# rows made by bulk_create or rolled back between tests never reach the index's signals
+TRIGRAM_INDEX_MAX_AGE = 0
@@ -0,0 +1,163 @@
+"""
+Typo-tolerant substring search over a single text column.
+
+On PostgreSQL this uses pg_trgm: matches come from the `<%` (word
+similarity) and ILIKE operators, both served by a `gin_trgm_ops` index, and
+are ranked with word_similarity(). `<%` compares against the session's
+pg_trgm.word_similarity_threshold, so that is set to `threshold` first and
+the rank is checked against it as well. Other databases get an in-process
+inverted trigram index per column, built lazily and kept current by
+post_save/post_delete signals. Those signals only fire in the process that
+made the change (and not at all for queryset .update() calls), so each
+index is rebuilt once it is TRIGRAM_INDEX_MAX_AGE seconds old; until then
+rows written by other worker processes can be missing from its results.
+The best MAX_MATCHES fuzzy matches within the queryset are kept.
+
+Either way the queryset comes back annotated with an integer `search_rank`
+and ordered by it, so results paginate with KeysetPagination.
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import BigIntegerField, Case, IntegerField, Q, Value, When
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_save
+
+THRESHOLD = 0.3
+RANK_SCALE = 1000000
+MAX_MATCHES = 500
+
+
+def max_age():
+    return getattr(settings, 'TRIGRAM_INDEX_MAX_AGE', 60)
+
+
+def trigrams(text):
+    """The pg_trgm trigram set: each lowercased word padded with two leading blanks and one trailing."""
+    grams = set()
+    for word in re.findall(r'[^\W_]+', (text or '').lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Inverted trigram -> primary keys index over one model column."""
+    _indexes = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, model, field):
+        self.model = model
+        self.field = field
+        self._postings = None
+        self._built_at = None
+        self._grams = {}
+        self._lock = threading.Lock()
+        post_save.connect(self._saved, sender=model, weak=False)
+        post_delete.connect(self._deleted, sender=model, weak=False)
+
+    @classmethod
+    def for_field(cls, model, field):
+        key = (model._meta.label, field)
+        with cls._registry_lock:
+            if key not in cls._indexes:
+                cls._indexes[key] = cls(model, field)
+            return cls._indexes[key]
+
+    def _build(self):
+        self._postings = defaultdict(set)
+        self._grams = {}
+        self._built_at = time.monotonic()
+        for pk, text in self.model._default_manager.values_list('pk', self.field).iterator():
+            self._add(pk, text)
+
+    def _add(self, pk, text):
+        grams = trigrams(text)
+        self._grams[pk] = grams
+        for gram in grams:
+            self._postings[gram].add(pk)
+
+    def _discard(self, pk):
+        for gram in self._grams.pop(pk, ()):
+            self._postings[gram].discard(pk)
+
+    def _saved(self, sender, instance, **kwargs):
+        with self._lock:
+            if self._postings is not None:
+                self._discard(instance.pk)
+                self._add(instance.pk, getattr(instance, self.field))
+
+    def _deleted(self, sender, instance, **kwargs):
+        with self._lock:
+            if self._postings is not None:
+                self._discard(instance.pk)
+
+    def search(self, query, threshold=THRESHOLD):
+        """Return {pk: score} for rows whose word similarity to `query` reaches `threshold`."""
+        wanted = trigrams(query)
+        if not wanted:
+            return {}
+        with self._lock:
+            if self._postings is None or time.monotonic() - self._built_at > max_age():
+                self._build()
+            shared = defaultdict(int)
+            for gram in wanted:
+                for pk in self._postings.get(gram, ()):
+                    shared[pk] += 1
+        return {
+            pk: count / len(wanted)
+            for pk, count in shared.items()
+            if count / len(wanted) >= threshold
+        }
+
+
+def trigram_search(queryset, field, query, threshold=THRESHOLD):
+    """Filter `queryset` to rows whose `field` contains `query` or a near miss of it, best first."""
+    query = (query or '').strip()
+    if not query:
+        return queryset
+
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)", [str(threshold)])
+        queryset = queryset.annotate(
+            search_rank=Cast(TrigramWordSimilarity(query, field) * RANK_SCALE, BigIntegerField())
+        ).filter(
+            Q(**{f'{field}__icontains': query})
+            | Q(**{f'{field}__trigram_word_similar': query}, search_rank__gte=int(threshold * RANK_SCALE))
+        )
+    else:
+        scores = TrigramIndex.for_field(queryset.model, field).search(query, threshold)
+        substring = queryset.filter(**{f'{field}__icontains': query}).values_list('pk', flat=True)
+        for pk in substring:
+            scores[pk] = 1.0
+        # the index covers the whole table: drop rows outside the queryset, best candidates first,
+        # a batch at a time so each IN list stays within SQLite's variable limit
+        candidates = sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        best = []
+        for start in range(0, len(candidates), MAX_MATCHES):
+            batch = candidates[start:start + MAX_MATCHES]
+            present = set(queryset.filter(pk__in=[pk for pk, _ in batch]).values_list('pk', flat=True))
+            best.extend(item for item in batch if item[0] in present)
+            if len(best) >= MAX_MATCHES:
+                break
+        best = best[:MAX_MATCHES]
+        if not best:
+            return queryset.none()
+        # one WHEN per distinct score, however many rows share it
+        ranked = defaultdict(list)
+        for pk, score in best:
+            ranked[int(score * RANK_SCALE)].append(pk)
+        queryset = queryset.filter(pk__in=[pk for pk, _ in best]).annotate(
+            search_rank=Case(
+                *[When(pk__in=pks, then=Value(rank)) for rank, pks in ranked.items()],
+                output_field=IntegerField(),
+            )
+        )
+    return queryset.order_by('-search_rank', '-id')
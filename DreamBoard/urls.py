@@ -15,12 +15,11 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import path, include
 import pins.urls
 import boards.urls
 import accounts.urls
+import offload.urls
 from rest_framework import permissions
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from drf_yasg.views import get_schema_view
@@ -53,8 +52,5 @@ urlpatterns = [
     path('api/', include(pins.urls)),
     path('api/', include(boards.urls)),
     path('api/accounts/', include(accounts.urls)),
+    path('', include(offload.urls)),
 ]
-
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -0,0 +1,13 @@
+from django_filters import rest_framework as filters
+from .models import User
+from DreamBoard.trigram import trigram_search
+
+class UserFilter(filters.FilterSet):
+    username = filters.CharFilter(method='search_username')
+
+    class Meta:
+        model = User
+        fields = ['username']
+
+    def search_username(self, queryset, name, value):
+        return trigram_search(queryset, 'username', value)
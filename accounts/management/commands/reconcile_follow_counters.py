@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from accounts.models import Follow, User
+from DreamBoard.counters import count_for
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored follower/following counters on users to backfill or repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Number of user ids recomputed per UPDATE statement.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = User.objects.aggregate(last=Max('pk'))['last'] or 0
+        updated = 0
+
+        for start in range(0, last_id + 1, batch_size):
+            with transaction.atomic():
+                updated += User.objects.filter(pk__gte=start, pk__lt=start + batch_size).update(
+                    followers_count=count_for(Follow, 'followed_user'),
+                    following_count=count_for(Follow, 'follower'),
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled follow counters on {updated} users."))
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Follow = apps.get_model('accounts', 'Follow')
+
+    def follow_count(field):
+        rows = Follow.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        return Coalesce(Subquery(rows.annotate(total=Count('pk')).values('total')), Value(0))
+
+    User.objects.update(
+        followers_count=follow_count('followed_user'),
+        following_count=follow_count('follower'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_user_bio_user_profile_pic_user_website_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -35,6 +35,11 @@ class User(AbstractUser):
     profile_pic = models.ImageField(upload_to='profile_pics', blank=True, null=True)
     bio = models.TextField(null=True, blank=True)
     website = models.URLField(null=True, blank=True)
+    # denormalized Follow counts, kept in sync by accounts.signals
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    # also moved by accounts.signals when the counts change; part of the ETag of everything the user authored
+    updated_at = models.DateTimeField(auto_now=True)
 
     objects = CustomUserManager()
     def __str__(self):
@@ -1,18 +1,16 @@
 from rest_framework import serializers
+
+from DreamBoard.cache import depend_on
 from .models import Follow, User
 
 class UserSerializer(serializers.ModelSerializer):
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
     class Meta:
         model = User
         fields = ('id', 'email', 'username','profile_pic', 'bio', 'website', 'followers_count', 'following_count')
-        
-    def get_followers_count(self, obj):
-        return Follow.objects.filter(followed_user=obj).count()
-    
-    def get_following_count(self, obj):
-        return Follow.objects.filter(follower=obj).count()
+
+    def to_representation(self, instance):
+        depend_on(self.context, 'user', instance.pk)
+        return super().to_representation(instance)
         
         
 class RegisterSerializer(serializers.ModelSerializer):
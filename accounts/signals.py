@@ -1,8 +1,12 @@
-from django.db.models.signals import post_save
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from django.core.mail import send_mail
 from django.urls import reverse
 from django_rest_passwordreset.signals import reset_password_token_created
+from .models import Follow, User
 
 
 @receiver(reset_password_token_created)
@@ -34,3 +38,26 @@ def password_reset_token_created(sender, instance, reset_password_token, *args,
         [reset_password_token.user.email],
         fail_silently=False,
     )
+
+
+def _bump_follow_counts(follow, delta):
+    now = timezone.now()
+    User.objects.filter(pk=follow.followed_user_id).update(
+        followers_count=Greatest(F('followers_count') + delta, Value(0)), updated_at=now
+    )
+    User.objects.filter(pk=follow.follower_id).update(
+        following_count=Greatest(F('following_count') + delta, Value(0)), updated_at=now
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """Keeps the stored follower/following counts in step with new Follow rows."""
+    if created:
+        _bump_follow_counts(instance, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Keeps the stored follower/following counts in step with removed Follow rows."""
+    _bump_follow_counts(instance, -1)
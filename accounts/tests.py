@@ -1,3 +1,110 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from DreamBoard.trigram import MAX_MATCHES, TrigramIndex, trigram_search, trigrams
+from .models import Follow, User
+
+
+def make_user(name):
+    return User.objects.create_user(email=f'{name}@example.com', password='secret', username=name)
+
+
+class FollowCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ann = make_user('ann')
+        cls.ben = make_user('ben')
+
+    def counts(self):
+        self.ann.refresh_from_db()
+        self.ben.refresh_from_db()
+        return self.ann.following_count, self.ben.followers_count
+
+    def test_follow_and_unfollow_move_both_counts(self):
+        follow = Follow.objects.create(follower=self.ann, followed_user=self.ben)
+        self.assertEqual(self.counts(), (1, 1))
+        follow.delete()
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_profile_renders_stored_counts_without_counting(self):
+        Follow.objects.create(follower=self.ann, followed_user=self.ben)
+        client = APIClient()
+        client.force_authenticate(self.ann)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('user-details', kwargs={'username': 'ben'}))
+        self.assertFalse([query for query in queries if 'accounts_follow' in query['sql']])
+        self.assertEqual((response.data['followers_count'], response.data['following_count']), (1, 0))
+
+    def test_reconcile_repairs_drift(self):
+        Follow.objects.create(follower=self.ann, followed_user=self.ben)
+        User.objects.update(followers_count=9, following_count=9)
+        call_command('reconcile_follow_counters', stdout=StringIO())
+        self.assertEqual(self.counts(), (1, 1))
+        self.assertEqual((self.ann.followers_count, self.ben.following_count), (0, 0))
+
+
+class TrigramSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user('alice_painter')
+        cls.alicia = make_user('alicia')
+        cls.bob = make_user('bob')
+
+    def search(self, query):
+        return list(trigram_search(User.objects.all(), 'username', query))
+
+    def test_trigrams_match_pg_trgm(self):
+        self.assertEqual(trigrams('Cat'), {'  c', ' ca', 'cat', 'at '})
+
+    def test_substring_ranks_first(self):
+        self.assertEqual(self.search('alic')[:2], [self.alicia, self.alice])
+
+    def test_tolerates_typos(self):
+        self.assertIn(self.alice, self.search('painter alise'))
+        self.assertNotIn(self.bob, self.search('alise'))
+
+    def test_many_matches_stay_within_sqlite_limits(self):
+        User.objects.bulk_create([
+            User(username=f'crowd{i}', email=f'crowd{i}@example.com') for i in range(MAX_MATCHES + 700)
+        ])
+        results = trigram_search(User.objects.all(), 'username', 'crowd')
+        self.assertEqual(results.count(), MAX_MATCHES)
+        self.assertTrue(results.first().username.startswith('crowd'))
+
+    def test_matches_are_taken_from_the_queryset(self):
+        kites = make_user('kites')
+        # as close to 'kiet' as 'kites' is, with higher pks, so they win every tie
+        User.objects.bulk_create([
+            User(username=f'kite{i}', email=f'kite{i}@example.com', bio='crowd') for i in range(MAX_MATCHES + 5)
+        ])
+        results = trigram_search(User.objects.exclude(bio='crowd'), 'username', 'kiet')
+        self.assertEqual(list(results), [kites])
+
+    @override_settings(TRIGRAM_INDEX_MAX_AGE=3600)
+    def test_index_follows_saves_in_this_process(self):
+        index = TrigramIndex.for_field(User, 'username')
+        index.search('warmup')
+        carol = make_user('caroline')
+        self.assertIn(carol.pk, index.search('carolin'))
+        carol.delete()
+        self.assertNotIn(carol.pk, index.search('carolin'))
+
+    def test_stale_index_is_rebuilt(self):
+        index = TrigramIndex.for_field(User, 'username')
+        index.search('warmup')
+        # bulk_create sends no post_save, like a row written by another worker
+        dave, = User.objects.bulk_create([User(username='davide', email='davide@example.com')])
+        self.assertIn(dave.pk, index.search('davdie'))
+
+
+    def test_user_search_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        response = client.get(reverse('user-search'), {'username': 'alcia'})
+        self.assertEqual(response.data['results'][0]['username'], 'alicia')
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import UserView, FollowUser, UnfollowUser, FollowersList, FollowingList, UserDetails, RegisterAPIView, LogoutAPIView, ChangePasswordView,ActivateAPIView, LoginAPIView
+from .views import UserView, UserSearch, FollowUser, UnfollowUser, FollowersList, FollowingList, UserDetails, RegisterAPIView, LogoutAPIView, ChangePasswordView,ActivateAPIView, LoginAPIView
 
 urlpatterns = [
     path('users/', UserView.as_view(), name='users'),
+    path('users/search/', UserSearch.as_view(), name='user-search'),
     path('signup/', RegisterAPIView.as_view(), name='signup'),
     path('login/', LoginAPIView.as_view(), name='login'),
     path('activate/<uidb64>/<token>/', ActivateAPIView.as_view(), name='activate'),
@@ -3,6 +3,8 @@ from rest_framework import views, generics, status, viewsets
 from rest_framework.response import Response
 from .models import Follow, User
 from .serializers import UserSerializer, RegisterSerializer, ChangePasswordSerializer
+from .filters import UserFilter
+from DreamBoard.conditional import ConditionalGetMixin
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
@@ -137,3 +139,145 @@ class LogoutAPIView(views.APIView):
             return response
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+class UserView(generics.ListAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    queryset = User.objects.filter(is_active=True).order_by('username')
+    serializer_class = UserSerializer
+
+    @swagger_auto_schema(
+        operation_description="Retrieve a list of users.",
+        responses={200: UserSerializer(many=True)}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+class UserSearch(generics.ListAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    queryset = User.objects.filter(is_active=True).order_by('username')
+    serializer_class = UserSerializer
+    filterset_class = UserFilter
+
+    @swagger_auto_schema(
+        operation_description="Search users by username; tolerates typos and partial names.",
+        manual_parameters=[
+            openapi.Parameter('username', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Username or part of it')
+        ],
+        responses={200: UserSerializer(many=True)}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+class UserDetails(ConditionalGetMixin, generics.RetrieveAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    queryset = User.objects.all()
+    serializer_class = UserSerializer
+    lookup_field = 'username'
+
+    def get_validators(self):
+        # hash the rendered columns themselves: bulk counter repairs move them without touching updated_at
+        columns = [field.source for field in self.get_serializer().fields.values() if field.source != '*']
+        row = User.objects.filter(username=self.kwargs['username']).values_list(*columns).first()
+        if row is None:
+            return None
+        return repr(row), None
+
+    @swagger_auto_schema(
+        operation_description="Retrieve a user's profile by username.",
+        responses={200: UserSerializer, 404: "Not Found"}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+class FollowUser(views.APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Follow a user.",
+        responses={201: "Followed", 200: "Already following", 400: "Bad Request", 404: "Not Found"}
+    )
+    def post(self, request, username, *args, **kwargs):
+        user = get_object_or_404(User, username=username)
+        if user == request.user:
+            return Response({'error': 'You cannot follow yourself.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        _, created = Follow.objects.get_or_create(follower=request.user, followed_user=user)
+        if created:
+            return Response({'detail': f'You are now following {user.username}.'}, status=status.HTTP_201_CREATED)
+        return Response({'detail': f'You already follow {user.username}.'}, status=status.HTTP_200_OK)
+
+class UnfollowUser(views.APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Unfollow a user.",
+        responses={200: "Unfollowed", 400: "Not following", 404: "Not Found"}
+    )
+    def post(self, request, username, *args, **kwargs):
+        user = get_object_or_404(User, username=username)
+        deleted, _ = Follow.objects.filter(follower=request.user, followed_user=user).delete()
+        if not deleted:
+            return Response({'error': f'You do not follow {user.username}.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'detail': f'You unfollowed {user.username}.'}, status=status.HTTP_200_OK)
+
+class FollowersList(generics.ListAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = UserSerializer
+
+    def get_queryset(self):
+        user = get_object_or_404(User, username=self.kwargs['username'])
+        return User.objects.filter(following__followed_user=user).order_by('-following__created_at')
+
+    @swagger_auto_schema(
+        operation_description="Retrieve the users following a user.",
+        responses={200: UserSerializer(many=True), 404: "Not Found"}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+class FollowingList(generics.ListAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = UserSerializer
+
+    def get_queryset(self):
+        user = get_object_or_404(User, username=self.kwargs['username'])
+        return User.objects.filter(followers__follower=user).order_by('-followers__created_at')
+
+    @swagger_auto_schema(
+        operation_description="Retrieve the users a user follows.",
+        responses={200: UserSerializer(many=True), 404: "Not Found"}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+class ChangePasswordView(generics.UpdateAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = ChangePasswordSerializer
+
+    def get_object(self):
+        return self.request.user
+
+    @swagger_auto_schema(
+        operation_description="Change the current user's password.",
+        request_body=ChangePasswordSerializer,
+        responses={200: "Password updated successfully", 400: "Bad Request"}
+    )
+    def put(self, request, *args, **kwargs):
+        user = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if not user.check_password(serializer.validated_data['old_password']):
+            return Response({'old_password': ['Wrong password.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        user.set_password(serializer.validated_data['new_password'])
+        user.save()
+        return Response({'detail': 'Password updated successfully'}, status=status.HTTP_200_OK)
@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Board
+from .models import Board, BoardPin
 admin.site.register(Board)
+admin.site.register(BoardPin)
 # Register your models here.
@@ -1,10 +1,14 @@
 from django_filters import rest_framework as filters
 from .models import Board
+from DreamBoard.trigram import trigram_search
 
 class BoardFilter(filters.FilterSet):
-    title = filters.CharFilter(field_name='title', lookup_expr='icontains')
+    title = filters.CharFilter(method='search_title')
     # description = filters.CharFilter(field_name='description', lookup_expr='icontains')
     
     class Meta:
         model = Board
-        fields = ['title']
\ No newline at end of file
+        fields = ['title']
+
+    def search_title(self, queryset, name, value):
+        return trigram_search(queryset, 'title', value)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from boards.membership import boards_to_rebalance, rebalance, rebalance_length
+
+
+class Command(BaseCommand):
+    help = "Rewrite the pin rank keys of boards whose keys have grown long after many reorders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-length', type=int, default=None,
+                            help="Rebalance boards with a rank key longer than this "
+                                 "(defaults to BOARD_RANK_REBALANCE_LENGTH).")
+        parser.add_argument('--board', type=int, action='append', dest='boards',
+                            help="Rebalance this board regardless of key length; may be repeated.")
+
+    def handle(self, *args, **options):
+        board_ids = options['boards'] or list(boards_to_rebalance(options['max_length']))
+        rows = sum(rebalance(board_id) for board_id in board_ids)
+        limit = options['max_length'] or rebalance_length()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebalanced {rows} pin ranks on {len(board_ids)} boards (key length limit {limit})."
+        ))
@@ -0,0 +1,144 @@
+"""
+Set-based, ordered board membership changes.
+
+Pins are added with one INSERT ... ON CONFLICT DO NOTHING and removed with
+one DELETE ... WHERE pin_id IN (...) on BoardPin, inside a single
+transaction, however many pins a request names. New pins are appended
+after the board's last rank, read with the board row locked; moving a pin within a board rewrites only its
+own rank (see boards.ranks). None of this sends m2m_changed, so the boards'
+updated_at and cache versions are moved here instead.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from DreamBoard.cache import bump_version
+from pins.models import Pin
+from . import ranks
+from .models import Board, BoardPin
+
+MAX_BULK_PINS = 500
+
+
+def rebalance_length():
+    return getattr(settings, 'BOARD_RANK_REBALANCE_LENGTH', 16)
+
+
+def touch_boards(*board_ids):
+    # membership changes don't save the board row, so move updated_at by hand
+    Board.objects.filter(pk__in=board_ids).update(updated_at=timezone.now())
+    bump_version('board', *board_ids)
+
+
+def _last_rank(board_id):
+    return BoardPin.objects.filter(board_id=board_id).order_by('-rank').values_list('rank', flat=True).first()
+
+
+def add_pins(board_id, pin_ids):
+    """Append `pin_ids` to the board in order; returns the ids that were actually inserted."""
+    if not pin_ids:
+        return []
+    with transaction.atomic():
+        # appends to one board take turns, so no two of them read the same last rank
+        list(Board.objects.select_for_update().filter(pk=board_id).values_list('pk', flat=True))
+        existing = set(
+            BoardPin.objects.filter(board_id=board_id, pin_id__in=pin_ids).values_list('pin_id', flat=True)
+        )
+        added = list(dict.fromkeys(pin_id for pin_id in pin_ids if pin_id not in existing))
+        keys = dict(zip(added, ranks.spread(len(added), _last_rank(board_id))))
+        BoardPin.objects.bulk_create(
+            [BoardPin(board_id=board_id, pin_id=pin_id, rank=rank) for pin_id, rank in keys.items()],
+            ignore_conflicts=True,
+        )
+        # a conflicting row written by anything else is skipped, and then holds a rank of its own
+        rows = BoardPin.objects.filter(board_id=board_id, pin_id__in=added).values_list('pin_id', 'rank')
+        return sorted(pin_id for pin_id, rank in rows if keys[pin_id] == rank)
+
+
+def remove_pins(board_id, pin_ids):
+    """Unlink `pin_ids` from the board; returns the ids that were on it."""
+    if not pin_ids:
+        return []
+    rows = BoardPin.objects.filter(board_id=board_id, pin_id__in=pin_ids)
+    removed = sorted(rows.values_list('pin_id', flat=True))
+    rows.delete()
+    return removed
+
+
+def change_pins(board, add=(), remove=(), move=(), target=None):
+    """
+    Apply one bulk request to `board` and return the compact diff:
+    the ids actually added, removed and moved to `target`, and any ids
+    asked to be added that are not pins at all.
+    """
+    known = set(Pin.objects.filter(pk__in=add).values_list('pk', flat=True)) if add else set()
+    with transaction.atomic():
+        diff = {
+            'board': board.pk,
+            'added': add_pins(board.pk, [pin_id for pin_id in add if pin_id in known]),
+            'removed': remove_pins(board.pk, remove),
+            'missing': sorted(set(add) - known),
+        }
+        touched = [board.pk]
+        if move:
+            moved = remove_pins(board.pk, move)
+            add_pins(target.pk, moved)
+            diff['moved'] = {'to': target.pk, 'pins': moved}
+            touched.append(target.pk)
+        touch_boards(*touched)
+    return diff
+
+
+def set_pins(board, pins):
+    """Make `pins` the board's membership, keeping the order of pins already on it."""
+    wanted = [pin.pk for pin in pins]
+    with transaction.atomic():
+        BoardPin.objects.filter(board=board).exclude(pin_id__in=wanted).delete()
+        add_pins(board.pk, wanted)
+        touch_boards(board.pk)
+
+
+def move_pin(board, pin_id, after=None, before=None):
+    """
+    Place `pin_id` directly after the pin `after`, directly before the pin
+    `before`, or at the top of the board if neither is given, by giving it
+    a rank between its new neighbours. Only the moved row is written.
+    Raises BoardPin.DoesNotExist if either pin is not on the board.
+    """
+    with transaction.atomic():
+        membership = BoardPin.objects.select_for_update().get(board=board, pin_id=pin_id)
+        others = BoardPin.objects.filter(board=board).exclude(pk=membership.pk).values_list('rank', flat=True)
+        if after is not None:
+            lower = others.get(pin_id=after)
+            upper = others.filter(rank__gt=lower).order_by('rank').first()
+        elif before is not None:
+            upper = others.get(pin_id=before)
+            lower = others.filter(rank__lt=upper).order_by('-rank').first()
+        else:
+            lower, upper = None, others.order_by('rank').first()
+
+        membership.rank = ranks.between(lower, upper)
+        membership.save(update_fields=['rank'])
+        touch_boards(board.pk)
+    return membership.rank
+
+
+def rebalance(board_id):
+    """Rewrite every rank on the board as short, evenly spaced keys, keeping the order."""
+    with transaction.atomic():
+        memberships = list(BoardPin.objects.select_for_update().filter(board_id=board_id).order_by('rank', 'id'))
+        for membership, rank in zip(memberships, ranks.evenly(len(memberships))):
+            membership.rank = rank
+        BoardPin.objects.bulk_update(memberships, ['rank'], batch_size=1000)
+    return len(memberships)
+
+
+def boards_to_rebalance(max_length=None):
+    """Ids of boards holding a rank key longer than `max_length`."""
+    max_length = rebalance_length() if max_length is None else max_length
+    return (
+        BoardPin.objects.values('board_id').annotate(longest=Max(Length('rank')))
+        .filter(longest__gt=max_length).values_list('board_id', flat=True)
+    )
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:26
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0002_board_pin'),
+        ('pins', '0005_pin_engagement_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='board',
+            name='date_created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='board',
+            index=models.Index(fields=['date_created', 'id'], name='board_date_created_id_idx'),
+        ),
+    ]
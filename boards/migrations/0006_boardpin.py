@@ -0,0 +1,106 @@
+from collections import defaultdict
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+# boards.ranks as of this migration, frozen so later changes to it can't alter what it writes
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+
+
+def evenly(count):
+    """`count` evenly spaced keys of one fixed width."""
+    width = 1
+    while BASE ** width <= count * 2:
+        width += 1
+    step = BASE ** width // (count + 1)
+    return [_encode(step * i, width) for i in range(1, count + 1)]
+
+
+def _encode(value, width):
+    digits = []
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits)).rstrip('0')
+
+
+def fold_memberships(apps, schema_editor):
+    """Copy the Board.pin M2M rows, then any Pin.board links not already among them, into BoardPin."""
+    Board = apps.get_model('boards', 'Board')
+    BoardPin = apps.get_model('boards', 'BoardPin')
+    Pin = apps.get_model('pins', 'Pin')
+
+    boards = defaultdict(dict)
+    old = Board.pin.through.objects.order_by('id').values_list('board_id', 'pin_id')
+    for board_id, pin_id in old.iterator():
+        boards[board_id].setdefault(pin_id, None)
+    linked = Pin.objects.filter(board__isnull=False).order_by('date_created', 'id').values_list('board_id', 'id')
+    for board_id, pin_id in linked.iterator():
+        boards[board_id].setdefault(pin_id, None)
+
+    rows = [
+        BoardPin(board_id=board_id, pin_id=pin_id, rank=rank)
+        for board_id, pins in boards.items()
+        for pin_id, rank in zip(pins, evenly(len(pins)))
+    ]
+    BoardPin.objects.bulk_create(rows, batch_size=1000)
+
+
+def unfold_memberships(apps, schema_editor):
+    """Copy BoardPin back into the Board.pin M2M, and point each pin's Pin.board at the first board it joined."""
+    Board = apps.get_model('boards', 'Board')
+    BoardPin = apps.get_model('boards', 'BoardPin')
+    Pin = apps.get_model('pins', 'Pin')
+    Membership = Board.pin.through
+    rows = BoardPin.objects.order_by('board_id', 'rank', 'id').values_list('board_id', 'pin_id')
+    Membership.objects.bulk_create(
+        [Membership(board_id=board_id, pin_id=pin_id) for board_id, pin_id in rows.iterator()], batch_size=1000
+    )
+
+    first_board = {}
+    for board_id, pin_id in BoardPin.objects.order_by('date_added', 'id').values_list('board_id', 'pin_id').iterator():
+        first_board.setdefault(pin_id, board_id)
+    pins_by_board = defaultdict(list)
+    for pin_id, board_id in first_board.items():
+        pins_by_board[board_id].append(pin_id)
+    for board_id, pin_ids in pins_by_board.items():
+        for start in range(0, len(pin_ids), 1000):
+            Pin.objects.filter(pk__in=pin_ids[start:start + 1000]).update(board_id=board_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0005_board_updated_at'),
+        ('pins', '0009_comment_updated_at_pin_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardPin',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.CharField(max_length=255)),
+                ('date_added', models.DateTimeField(default=django.utils.timezone.now)),
+                ('board', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='boards.board')),
+                ('pin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='board_memberships', to='pins.pin')),
+            ],
+            options={
+                'ordering': ['rank', 'id'],
+                'indexes': [models.Index(fields=['board', 'rank', 'id'], name='boardpin_board_rank_idx')],
+                'unique_together': {('board', 'pin')},
+            },
+        ),
+        migrations.RunPython(fold_memberships, unfold_memberships),
+        migrations.RemoveField(
+            model_name='board',
+            name='pin',
+        ),
+        migrations.AddField(
+            model_name='board',
+            name='pin',
+            field=models.ManyToManyField(related_name='pins', through='boards.BoardPin', to='pins.pin'),
+        ),
+    ]
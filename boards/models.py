@@ -6,13 +6,45 @@ from django.conf import settings
 
 class Board(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='board_user')
-    pin = models.ManyToManyField('pins.Pin', related_name='pins')
+    pin = models.ManyToManyField('pins.Pin', related_name='pins', through='BoardPin')
     title = models.CharField(max_length=250)
     cover = models.ImageField(upload_to='boards', default='boards/default.png', null=True)
     is_private = models.BooleanField(default=False)
     description = models.CharField(max_length=250, blank=True)
-    
+    date_created = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_created', 'id'], name='board_date_created_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    @property
+    def ordered_pins(self):
+        """The board's pins in rank order; prefetch `memberships` to avoid a query per pin."""
+        return [membership.pin for membership in self.memberships.all()]
+
+
+class BoardPin(models.Model):
+    """
+    A pin's place on a board. `rank` is a lexicographic key from
+    boards.ranks, so moving a pin rewrites only its own row.
+    """
+    board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name='memberships')
+    pin = models.ForeignKey('pins.Pin', on_delete=models.CASCADE, related_name='board_memberships')
+    rank = models.CharField(max_length=255)
+    date_added = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['rank', 'id']
+        unique_together = ('board', 'pin')
+        indexes = [
+            models.Index(fields=['board', 'rank', 'id'], name='boardpin_board_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.pin_id} on {self.board}'
         
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""
+Lexicographic rank keys for ordered board membership.
+
+A key is the fractional part of a base-36 number, written with the digits
+0-9a-z and never ending in '0', so plain string comparison orders keys by
+value and there is always room for another key between any two. Moving an
+item therefore only rewrites that item's key; keys grow by a character
+roughly every five inserts into the same gap. `spread` bisects short keys
+for a batch of appends, and `evenly` lays out fresh fixed-width keys when a
+board is rebalanced.
+"""
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+
+
+def between(lower=None, upper=None):
+    """A key strictly between `lower` and `upper`; None means unbounded."""
+    lower = lower or ''
+    if upper is not None and lower >= upper:
+        raise ValueError(f'{lower!r} is not below {upper!r}')
+    return _midpoint(lower, upper)
+
+
+def _midpoint(lower, upper):
+    if upper is not None:
+        # carry over the shared prefix, reading missing digits of `lower` as 0
+        n = 0
+        while n < len(upper) and (lower[n] if n < len(lower) else '0') == upper[n]:
+            n += 1
+        if n:
+            return upper[:n] + _midpoint(lower[n:], upper[n:])
+
+    low = DIGITS.index(lower[0]) if lower else 0
+    high = DIGITS.index(upper[0]) if upper is not None else BASE
+    if high - low > 1:
+        return DIGITS[(low + high) // 2]
+    # adjacent digits: keep the lower one and recurse into the next position
+    if upper is not None and len(upper) > 1:
+        return upper[0]
+    return DIGITS[low] + _midpoint(lower[1:], None)
+
+
+def spread(count, lower=None, upper=None):
+    """`count` ascending keys between `lower` and `upper`, bisecting so they stay short."""
+    if count <= 0:
+        return []
+    middle = between(lower, upper)
+    half = count // 2
+    return spread(half, lower, middle) + [middle] + spread(count - half - 1, middle, upper)
+
+
+def evenly(count):
+    """`count` evenly spaced keys of one fixed width, for rebalancing."""
+    width = 1
+    while BASE ** width <= count * 2:
+        width += 1
+    step = BASE ** width // (count + 1)
+    return [_encode(step * i, width) for i in range(1, count + 1)]
+
+
+def _encode(value, width):
+    digits = []
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits)).rstrip('0')
@@ -1,15 +1,99 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Board
+from .models import Board, BoardPin
+from .membership import MAX_BULK_PINS, set_pins
+from pins.models import Pin
+from pins.images import ImageSetField, variant_index_for
 from pins.serializers import PinSerializer
+from pins.viewer import viewer_state_for
+from DreamBoard.serializers import DynamicFieldsMixin
+
+class BoardListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        boards = list(data.all() if hasattr(data, 'all') else data)
+        # one viewer-state batch for the pins of every board on the page
+        state = viewer_state_for(self.context)
+        pins = self.child.fields.get('pins')
+        if state is not None and pins is not None and {'is_liked', 'is_saved'} & set(pins.child.fields):
+            state.prime([pin.pk for board in boards for pin in board.ordered_pins])
+        # and one variant lookup for every cover and pin image on it
+        covers = [board.cover.name for board in boards]
+        board_pins = [pin for board in boards for pin in board.ordered_pins] if pins is not None else []
+        sources = list(covers) if 'cover_images' in self.child.fields else []
+        if pins is not None and 'images' in pins.child.fields:
+            sources += [pin.image.name for pin in board_pins]
+        index = variant_index_for(self.context)
+        index.prime(sources)
+        # the originals' URLs too, for `cover` and the pins' `image` and `video`
+        index.prime_files(covers + [pin.image.name for pin in board_pins] + [pin.video.name for pin in board_pins])
+        return super().to_representation(boards)
+
+
+class BoardSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    # both render in rank order; writing `pin` keeps the rank of pins already on the board
+    pin = serializers.PrimaryKeyRelatedField(
+        source='ordered_pins', many=True, queryset=Pin.objects.all(), allow_empty=False
+    )
+    pins = PinSerializer(source='ordered_pins', read_only=True, many=True)
+    cover_images = ImageSetField(source='cover')
+    expandable_fields = ('pins',)
 
-class BoardSerializer(serializers.ModelSerializer):
-    pins = PinSerializer(read_only=True, many=True)
     class Meta:
         model = Board
         fields = '__all__'
-        
+        list_serializer_class = BoardListSerializer
+
     def create(self, validated_data):
         request = self.context.get('request', None)
         if request:
             validated_data['user'] = request.user
-        return super().create(validated_data)
\ No newline at end of file
+        pins = validated_data.pop('ordered_pins', None)
+        board = super().create(validated_data)
+        if pins is not None:
+            set_pins(board, pins)
+        return board
+
+    def update(self, instance, validated_data):
+        pins = validated_data.pop('ordered_pins', None)
+        board = super().update(instance, validated_data)
+        if pins is not None:
+            set_pins(board, pins)
+        return board
+
+    def setup_eager_loading(self, queryset):
+        # `pins` and the `pin` id list share one prefetch of the board's memberships
+        if 'pins' in self.fields:
+            pins = self.fields['pins'].child.setup_eager_loading(Pin.objects.all())
+            memberships = BoardPin.objects.prefetch_related(Prefetch('pin', queryset=pins))
+        elif 'pin' in self.fields:
+            memberships = BoardPin.objects.select_related('pin').only('board', 'rank', 'pin__id')
+        else:
+            return queryset
+        return queryset.prefetch_related(Prefetch('memberships', queryset=memberships))
+
+
+class BoardPinsChangeSerializer(serializers.Serializer):
+    add = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    remove = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    move = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    to = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        total = len(data['add']) + len(data['remove']) + len(data['move'])
+        if not total:
+            raise serializers.ValidationError("Nothing to change.")
+        if total > MAX_BULK_PINS:
+            raise serializers.ValidationError(f"At most {MAX_BULK_PINS} pin ids per request.")
+        if data['move'] and data.get('to') is None:
+            raise serializers.ValidationError("A target board `to` is required to move pins.")
+        return data
+
+
+class BoardPinMoveSerializer(serializers.Serializer):
+    after = serializers.IntegerField(required=False)
+    before = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        if 'after' in data and 'before' in data:
+            raise serializers.ValidationError("Give either `after` or `before`, not both.")
+        return data
@@ -0,0 +1,18 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from DreamBoard.cache import bump_version
+from .membership import touch_boards
+from .models import Board
+
+
+@receiver([post_save, post_delete], sender=Board)
+def board_cache_changed(sender, instance, **kwargs):
+    bump_version('board', instance.pk)
+
+
+@receiver(m2m_changed, sender=Board.pin.through)
+def board_pins_cache_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    touch_boards(*((pk_set or ()) if reverse else [instance.pk]))
@@ -1,3 +1,249 @@
-from django.test import TestCase
+import random
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from pins.models import Comment, ImageVariant, Pin, SavePins
+from . import ranks
+from .membership import MAX_BULK_PINS, add_pins, boards_to_rebalance, move_pin, rebalance
+from .models import Board, BoardPin
+
+User = get_user_model()
+
+
+def make_user(name):
+    return User.objects.create_user(email=f'{name}@example.com', password='secret', username=name)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = make_user('owner')
+        cls.author = make_user('author')
+        cls.board = Board.objects.create(user=cls.owner, title='Kitchens')
+        cls.pin = Pin.objects.create(user=cls.author, title='Tiles', description='')
+        add_pins(cls.board.pk, [cls.pin.pk])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.urls = [reverse('board-details', kwargs={'pk': self.board.pk}), reverse('board-list-create')]
+
+    def test_unchanged_board_is_not_modified(self):
+        for url in self.urls:
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_pin_author_change_changes_etag(self):
+        for url in self.urls:
+            etag = self.client.get(url)['ETag']
+            self.author.website = f'https://example.com{url}'
+            self.author.save()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_viewer_toggle_changes_etag(self):
+        for url in self.urls:
+            etag = self.client.get(url)['ETag']
+            with self.captureOnCommitCallbacks(execute=True):
+                SavePins.objects.create(user=self.owner, pin=self.pin)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+            SavePins.objects.all().delete()
+
+
+class BoardListQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = make_user('browser')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def add_boards(self, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            owner = make_user(f'browser-{i}')
+            board = Board.objects.create(user=owner, title=f'Board {i}', cover=f'boards/covers/{i}.jpg')
+            pins = [
+                Pin.objects.create(user=owner, title=f'Pin {i}-{n}', description='', image=f'pins/images/{i}-{n}.jpg')
+                for n in range(i % 3 + 1)
+            ]
+            add_pins(board.pk, [pin.pk for pin in pins])
+            for source in [board.cover.name] + [pin.image.name for pin in pins]:
+                ImageVariant.objects.create(source=source, format='webp', width=320, height=240, file=f'{source}.webp')
+            Comment.objects.create(pin=pins[0], user=self.viewer, content='Lovely')
+            SavePins.objects.create(user=self.viewer, pin=pins[0])
+
+    def queries(self, expected, **params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('board-list-create'), params)
+        self.assertEqual(len(response.data['results']), expected)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        for params in ({}, {'expand': 'pins'}):
+            Board.objects.all().delete()
+            self.add_boards(2)
+            few = self.queries(2, **params)
+            self.add_boards(6)
+            self.assertEqual(self.queries(8, **params), few, params)
+
+
+class BoardSearchTests(TestCase):
+    def test_title_search_tolerates_typos(self):
+        owner = make_user('searching')
+        kitchens = Board.objects.create(user=owner, title='Kitchen ideas')
+        Board.objects.create(user=owner, title='Garden')
+        client = APIClient()
+        client.force_authenticate(owner)
+        results = client.get(reverse('board-list-create'), {'title': 'kitchn'}).data['results']
+        self.assertEqual([board['id'] for board in results], [kitchens.pk])
+
+
+class BulkMembershipTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = make_user('bulk')
+        cls.board = Board.objects.create(user=cls.owner, title='Inbox')
+        cls.archive = Board.objects.create(user=cls.owner, title='Archive')
+        cls.pins = [Pin.objects.create(user=cls.owner, title=f'Bulk {i}', description='') for i in range(5)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def change(self, board, **data):
+        return self.client.post(reverse('board-pins', kwargs={'pk': board.pk}), data, format='json')
+
+    def members(self, board):
+        return set(BoardPin.objects.filter(board=board).values_list('pin_id', flat=True))
+
+    def test_returns_only_what_changed(self):
+        first, second, third = (pin.pk for pin in self.pins[:3])
+        add_pins(self.board.pk, [first])
+        response = self.change(self.board, add=[first, second, third, 999999], remove=[self.pins[4].pk])
+        self.assertEqual(response.data, {
+            'board': self.board.pk, 'added': [second, third], 'removed': [], 'missing': [999999],
+        })
+        self.assertEqual(self.members(self.board), {first, second, third})
+
+    def test_move_between_boards(self):
+        ids = [pin.pk for pin in self.pins]
+        add_pins(self.board.pk, ids)
+        response = self.change(self.board, move=ids[:2], to=self.archive.pk)
+        self.assertEqual(response.data['moved'], {'to': self.archive.pk, 'pins': ids[:2]})
+        self.assertEqual(self.members(self.archive), set(ids[:2]))
+        self.assertEqual(self.members(self.board), set(ids[2:]))
+
+    def test_statement_count_does_not_grow_with_the_batch(self):
+        with CaptureQueriesContext(connection) as few:
+            self.change(self.board, add=[self.pins[0].pk])
+        with CaptureQueriesContext(connection) as many:
+            self.change(self.board, add=[pin.pk for pin in self.pins[1:]])
+        self.assertEqual(len(many), len(few))
+
+    def test_rejects_oversized_and_foreign_requests(self):
+        self.assertEqual(self.change(self.board, add=list(range(MAX_BULK_PINS + 1))).status_code, 400)
+        self.assertEqual(self.change(self.board, move=[self.pins[0].pk], to=self.board.pk).status_code, 400)
+        stranger = Board.objects.create(user=make_user('stranger'), title='Theirs')
+        self.assertEqual(self.change(stranger, add=[self.pins[0].pk]).status_code, 404)
+
+
+class RankTests(SimpleTestCase):
+    def test_between_orders_strictly(self):
+        for lower, upper in [(None, None), (None, 'a'), ('a', None), ('a', 'b'), ('a', 'a1'), ('az', 'b'), ('1', '2')]:
+            key = ranks.between(lower, upper)
+            self.assertTrue((lower or '') < key, (lower, upper, key))
+            self.assertTrue(upper is None or key < upper, (lower, upper, key))
+            self.assertFalse(key.endswith('0'))
+
+    def test_between_rejects_inverted_bounds(self):
+        with self.assertRaises(ValueError):
+            ranks.between('b', 'a')
+
+    def test_repeated_inserts_into_one_gap_stay_ordered(self):
+        keys = [ranks.between(), ranks.between('z')]
+        rng = random.Random(7)
+        for _ in range(300):
+            i = rng.randrange(len(keys) - 1)
+            keys.insert(i + 1, ranks.between(keys[i], keys[i + 1]))
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+
+    def test_spread_and_evenly(self):
+        for count in (1, 2, 17, 500):
+            spread = ranks.spread(count, 'a', 'b')
+            self.assertEqual(spread, sorted(set(spread)))
+            self.assertTrue(all('a' < key < 'b' for key in spread))
+            evenly = ranks.evenly(count)
+            self.assertEqual(evenly, sorted(set(evenly)))
+            # 500 keys fit in two base-36 digits
+            self.assertLessEqual(max(len(key) for key in evenly), 2)
+
+
+class MembershipTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = make_user('curator')
+        cls.board = Board.objects.create(user=cls.owner, title='Gardens')
+        cls.pins = [Pin.objects.create(user=cls.owner, title=f'Pin {i}', description='') for i in range(4)]
+        add_pins(cls.board.pk, [pin.pk for pin in cls.pins])
+
+    def order(self):
+        return list(BoardPin.objects.filter(board=self.board).order_by('rank', 'id').values_list('pin_id', flat=True))
+
+    def test_add_keeps_request_order_and_skips_members(self):
+        self.assertEqual(self.order(), [pin.pk for pin in self.pins])
+        self.assertEqual(add_pins(self.board.pk, [self.pins[0].pk]), [])
+
+    def test_add_reports_only_rows_it_inserted(self):
+        extra = [Pin.objects.create(user=self.owner, title=f'Extra {i}', description='') for i in range(2)]
+        spread = ranks.spread
+
+        def racing_spread(*args):
+            # a writer outside add_pins links one of the pins after it was checked for
+            BoardPin.objects.get_or_create(board=self.board, pin=extra[0], defaults={'rank': 'zzz'})
+            return spread(*args)
+
+        with mock.patch.object(ranks, 'spread', racing_spread):
+            self.assertEqual(add_pins(self.board.pk, [pin.pk for pin in extra]), [extra[1].pk])
+
+    def test_move_rewrites_only_the_moved_row(self):
+        first, second, third, fourth = (pin.pk for pin in self.pins)
+        before = dict(BoardPin.objects.values_list('pin_id', 'rank'))
+        move_pin(self.board, fourth, after=first)
+        self.assertEqual(self.order(), [first, fourth, second, third])
+        after = dict(BoardPin.objects.values_list('pin_id', 'rank'))
+        self.assertEqual({pin for pin in before if before[pin] != after[pin]}, {fourth})
+        move_pin(self.board, first, before=third)
+        move_pin(self.board, third)
+        self.assertEqual(self.order(), [third, fourth, second, first])
+
+    def test_rebalance_keeps_order_and_shortens_keys(self):
+        first, second = self.pins[0].pk, self.pins[1].pk
+        for _ in range(40):
+            move_pin(self.board, second, after=first)
+            move_pin(self.board, first, after=second)
+        order = self.order()
+        self.assertIn(self.board.pk, list(boards_to_rebalance(max_length=4)))
+        rebalance(self.board.pk)
+        self.assertEqual(self.order(), order)
+        self.assertNotIn(self.board.pk, list(boards_to_rebalance(max_length=4)))
+
+    def test_move_endpoint_reorders_the_rendered_board(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        first, second, third, fourth = (pin.pk for pin in self.pins)
+        url = reverse('move-board-pin', kwargs={'pk': self.board.pk, 'pin_id': third})
+        self.assertEqual(client.post(url, {'before': first}, format='json').status_code, 200)
+        detail = client.get(reverse('board-details', kwargs={'pk': self.board.pk}))
+        self.assertEqual(detail.data['pin'], [third, first, second, fourth])
+        missing = reverse('move-board-pin', kwargs={'pk': self.board.pk, 'pin_id': 999999})
+        self.assertEqual(client.post(missing, {}, format='json').status_code, 404)
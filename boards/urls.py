@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import BoardListCreate, BoardDetails, AddPinToBoard
+from .views import BoardListCreate, BoardDetails, AddPinToBoard, BoardPins, MoveBoardPin
 
 urlpatterns = [
     path('boards/', BoardListCreate.as_view(), name='board-list-create'),
     path('boards/<int:pk>/', BoardDetails.as_view(), name='board-details'),
     path('boards/<int:pk>/add_pin/', AddPinToBoard.as_view(), name='add-pin-to-board'),
+    path('boards/<int:pk>/pins/', BoardPins.as_view(), name='board-pins'),
+    path('boards/<int:pk>/pins/<int:pin_id>/move/', MoveBoardPin.as_view(), name='move-board-pin'),
 ]
@@ -1,3 +1,4 @@
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, views
 from rest_framework.permissions import IsAuthenticated
@@ -6,17 +7,38 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from .models import Board
-from .serializers import BoardSerializer
+from .models import Board, BoardPin
+from .serializers import BoardSerializer, BoardPinsChangeSerializer, BoardPinMoveSerializer
+from .membership import change_pins, move_pin
 from .filters import BoardFilter
 from accounts.models import Follow
+from pins.models import Pin
+from pins import viewer
+from pins.viewer import ViewerState
+from DreamBoard.cache import CachedRetrieveMixin
+from DreamBoard.conditional import ConditionalGetMixin
+from DreamBoard.pagination import KeysetPagination
 
-class BoardListCreate(generics.ListCreateAPIView):
+class BoardListCreate(ConditionalGetMixin, generics.ListCreateAPIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = Board.objects.all()
     serializer_class = BoardSerializer
     filterset_class = BoardFilter
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return self.get_serializer().setup_eager_loading(Board.objects.all())
+
+    def get_validators(self):
+        # nested pins are rendered in full, with their authors and the viewer's flags, so those move the ETag too
+        boards = Board.objects.annotate(
+            pins_updated_at=Max('pin__updated_at'), authors_updated_at=Max('pin__user__updated_at')
+        )
+        return self.page_validators(
+            boards, stamp_fields=('updated_at', 'pins_updated_at', 'authors_updated_at'),
+            marker=viewer.marker(self.request.user),
+        )
 
     @swagger_auto_schema(
         operation_description="Retrieve a list of boards or create a new board.",
@@ -33,11 +55,36 @@ class BoardListCreate(generics.ListCreateAPIView):
     def post(self, request, *args, **kwargs):
         return super().post(request, *args, **kwargs)
 
-class BoardDetails(generics.RetrieveUpdateDestroyAPIView):
+class BoardDetails(ConditionalGetMixin, CachedRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = Board.objects.all()
     serializer_class = BoardSerializer
+    cache_prefix = 'board'
+
+    def get_queryset(self):
+        return self.get_serializer().setup_eager_loading(Board.objects.all())
+
+    def get_validators(self):
+        state = (
+            Board.objects.filter(pk=self.kwargs['pk'])
+            .annotate(
+                pins_updated_at=Max('pin__updated_at'), authors_updated_at=Max('pin__user__updated_at'),
+                pins=Count('pin'),
+            )
+            .values_list('updated_at', 'pins_updated_at', 'authors_updated_at', 'pins')
+            .first()
+        )
+        if state is None:
+            return None
+        updated_at, pins_updated_at, authors_updated_at, pins = state
+        source = f'{updated_at.isoformat()}|{pins_updated_at}|{authors_updated_at}|{pins}'
+        # no Last-Modified: a toggle still in the write-behind buffer moves no timestamp, only the ETag
+        return f'{source}|{viewer.marker(self.request.user)}', None
+
+    def add_viewer_data(self, data):
+        ViewerState(self.request.user).fill(data.get('pins', []))
+        return data
 
     @swagger_auto_schema(
         operation_description="Retrieve, update, or delete a specific board.",
@@ -83,6 +130,59 @@ class AddPinToBoard(views.APIView):
         if not pin_id:
             return Response({"error": "Pin ID is required"}, status=400)
 
-        board.pins.add(pin_id)
-        serializer = BoardSerializer(board)
+        pin = get_object_or_404(Pin, pk=pin_id)
+        change_pins(board, add=[pin.pk])
+        serializer = BoardSerializer(board, context={'request': request})
         return Response(serializer.data)
+
+class BoardPins(views.APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Add, remove or move up to 500 pins on one of your boards in a single request. "
+            "Returns only the ids that changed."
+        ),
+        request_body=BoardPinsChangeSerializer,
+        responses={200: "Membership diff", 400: "Bad Request", 404: "Not Found"}
+    )
+    def post(self, request, pk):
+        board = get_object_or_404(Board, pk=pk, user=request.user)
+        serializer = BoardPinsChangeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=400)
+        data = serializer.validated_data
+
+        target = None
+        if data['move']:
+            target = get_object_or_404(Board, pk=data['to'], user=request.user)
+            if target.pk == board.pk:
+                return Response({"error": "Cannot move pins to the board they are on"}, status=400)
+
+        diff = change_pins(board, add=data['add'], remove=data['remove'], move=data['move'], target=target)
+        return Response(diff)
+
+class MoveBoardPin(views.APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Reorder a pin on one of your boards: place it right after the pin `after`, right before "
+            "the pin `before`, or at the top if neither is given."
+        ),
+        request_body=BoardPinMoveSerializer,
+        responses={200: "New rank", 400: "Bad Request", 404: "Not Found"}
+    )
+    def post(self, request, pk, pin_id):
+        board = get_object_or_404(Board, pk=pk, user=request.user)
+        serializer = BoardPinMoveSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=400)
+
+        try:
+            rank = move_pin(board, pin_id, **serializer.validated_data)
+        except BoardPin.DoesNotExist:
+            return Response({"error": "Pin is not on this board"}, status=404)
+        return Response({"board": board.pk, "pin": pin_id, "rank": rank})
@@ -1,8 +1,10 @@
-from channels.generic.websocket import WebsocketConsumer
-from asgiref.sync import async_to_sync
+from channels.generic.websocket import AsyncWebsocketConsumer
 import json
+import logging
 
-class GroupChatConsumer(WebsocketConsumer):
+logger = logging.getLogger(__name__)
+
+class GroupChatConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer for handling group chat functionality.
 
@@ -17,31 +19,31 @@ class GroupChatConsumer(WebsocketConsumer):
         - chat_message(): Sends messages received from the group to the WebSocket.
     """
 
-    def connect(self):
+    async def connect(self):
         """Handles WebSocket connection and joins the chat room."""
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f'chat_{self.room_name}'
 
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
-        self.accept()
-        print(f"WebSocket connected to room {self.room_name}")
+        await self.accept()
+        logger.debug("WebSocket connected to room %s", self.room_name)
 
-    def disconnect(self, close_code):
+    async def disconnect(self, close_code):
         """Handles WebSocket disconnection and removes it from the chat room."""
-        async_to_sync(self.channel_layer.group_discard)(
+        await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
-        print(f"WebSocket disconnected from room {self.room_name}")
+        logger.debug("WebSocket disconnected from room %s", self.room_name)
 
-    def receive(self, text_data):
+    async def receive(self, text_data):
         """Receives a message and broadcasts it to the chat room."""
-        print(f"Received data: {text_data}")
+        logger.debug("Received data: %s", text_data)
 
-        async_to_sync(self.channel_layer.group_send)(
+        await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat_message',
@@ -49,13 +51,13 @@ class GroupChatConsumer(WebsocketConsumer):
             }
         )
 
-    def chat_message(self, event):
+    async def chat_message(self, event):
         """Sends a message from the chat room to the WebSocket."""
         message = event['message']
-        self.send(text_data=message)
+        await self.send(text_data=message)
 
 
-class DirectChatConsumer(WebsocketConsumer):
+class DirectChatConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer for handling direct messages between users.
 
@@ -70,32 +72,32 @@ class DirectChatConsumer(WebsocketConsumer):
         - chat_message(): Sends messages received from the private chat to the WebSocket.
     """
 
-    def connect(self):
+    async def connect(self):
         """Handles WebSocket connection and joins the private chat room."""
         self.sender = self.scope['user'].username
         self.recipient = self.scope['url_route']['kwargs']['username']
         self.room_group_name = f'direct_{self.sender}_{self.recipient}'
 
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
-        self.accept()
-        print(f"WebSocket connected to room {self.room_group_name}")
+        await self.accept()
+        logger.debug("WebSocket connected to room %s", self.room_group_name)
 
-    def disconnect(self, close_code):
+    async def disconnect(self, close_code):
         """Handles WebSocket disconnection and removes it from the private chat room."""
-        async_to_sync(self.channel_layer.group_discard)(
+        await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
-        print(f"WebSocket disconnected from room {self.room_group_name}")
+        logger.debug("WebSocket disconnected from room %s", self.room_group_name)
 
-    def receive(self, text_data):
+    async def receive(self, text_data):
         """Receives a message and sends it to the recipient."""
-        print(f"Received data: {text_data}")
+        logger.debug("Received data: %s", text_data)
 
-        async_to_sync(self.channel_layer.group_send)(
+        await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat_message',
@@ -104,12 +106,12 @@ class DirectChatConsumer(WebsocketConsumer):
             }
         )
 
-    def chat_message(self, event):
+    async def chat_message(self, event):
         """Sends a direct message from the chat room to the WebSocket."""
         message = event['message']
         sender = event['sender']
 
-        self.send(text_data=json.dumps({
+        await self.send(text_data=json.dumps({
             'message': message,
             'sender': sender
         }))
@@ -0,0 +1,651 @@
+"""
+A channel layer shared by every process on a host, without Redis.
+
+InMemoryChannelLayer only reaches consumers in its own process, which ties
+chat to a single daphne worker. UnixSocketChannelLayer connects each process
+(one connection per event loop) to a small broker on a Unix socket:
+
+* A consumer's own channel is process-specific ("specific.<client>!<name>").
+  Messages for it go through the broker to the process that owns it, or
+  straight into its inbox when that is the sending process.
+* Group membership is kept by the process owning the channel; the broker
+  only knows which processes have members in which group. A group_send is
+  one frame to the broker and one frame on to each of those processes,
+  however many sockets are in the group, and each process fans it out to its
+  own members.
+* Ordinary channels (no "!", as used by `runworker`) are queued at the
+  broker.
+* The broker passes message bodies on as opaque bytes and never decodes them.
+
+Messages expire after `expiry` seconds and group memberships after
+`group_expiry`, as in the other layers, and an inbox holds at most
+`capacity` messages (or its `channel_capacity` match). Each process
+announces its capacities when it connects, so the broker sizes the
+ordinary channels a group_send reaches as the sender would. Sending to a
+full ordinary channel, or to a full channel of the sending process, raises
+ChannelFull; a direct message to a full channel in another process is
+dropped, as group messages to full channels are in every layer.
+
+The first process to need the broker runs it on a daemon thread. If that
+process exits, the next one to reconnect takes over and every process
+re-announces its groups. `run_channel_broker` runs it standalone instead.
+
+Frames are pickled, so only the user running the processes may talk to
+the broker. The socket is bound in a private (0700) directory, made
+owner-only and only then moved to `path`, so it is never reachable with
+wider permissions; and where the platform reports peer credentials
+(SO_PEERCRED), the broker and its clients hang up on a peer running as
+anyone else before unpickling anything from it.
+"""
+import asyncio
+import fcntl
+import logging
+import os
+import pickle
+import socket
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+# header length, body length
+FRAME = struct.Struct('>II')
+# a process further behind than this loses messages rather than the broker buffering them
+MAX_BACKLOG = 64 * 1024 * 1024
+SWEEP_INTERVAL = 30
+CONNECT_ATTEMPTS = 8
+
+
+def _frame(header, body=b''):
+    header = pickle.dumps(header, pickle.HIGHEST_PROTOCOL)
+    return FRAME.pack(len(header), len(body)) + header + body
+
+
+async def _read_frame(reader):
+    header_size, body_size = FRAME.unpack(await reader.readexactly(FRAME.size))
+    header = pickle.loads(await reader.readexactly(header_size))
+    return header, await reader.readexactly(body_size) if body_size else b''
+
+
+def _peer_trusted(writer):
+    """Whether the other end of a Unix socket runs as this process's user (True where that can't be told)."""
+    option = getattr(socket, 'SO_PEERCRED', None)
+    sock = writer.get_extra_info('socket')
+    if option is None or sock is None:
+        return True
+    _, uid, _ = struct.unpack('3i', sock.getsockopt(socket.SOL_SOCKET, option, struct.calcsize('3i')))
+    return uid == os.getuid()
+
+
+def _owner(channel):
+    """The id of the client owning a process-specific channel, or None for an ordinary one."""
+    local, bang, _ = channel.partition('!')
+    return local.rpartition('.')[2] if bang else None
+
+
+class _Connection:
+    __slots__ = ('writer', 'client_id', 'capacity', 'channel_capacity')
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.client_id = None
+        # the client's capacities, from its hello, which is always its first frame
+        self.capacity = None
+        self.channel_capacity = []
+
+    get_capacity = BaseChannelLayer.get_capacity
+
+
+class Broker:
+    def __init__(self):
+        self.clients = {}                        # client id -> _Connection
+        self.groups = defaultdict(set)           # group -> ids of the clients with members in it
+        self.joined = defaultdict(set)           # client id -> its groups
+        self.group_channels = defaultdict(dict)  # group -> {ordinary channel: membership expires at}
+        self.queues = defaultdict(deque)         # ordinary channel -> deque of (expires at, body)
+        self.waiters = defaultdict(deque)        # ordinary channel -> deque of (_Connection, request id)
+
+    async def serve(self, path, ready=None):
+        # bind where only we can reach, tighten, then publish with an atomic rename
+        private = tempfile.mkdtemp(prefix='.broker-', dir=os.path.dirname(path) or '.')
+        bound = os.path.join(private, 'socket')
+        try:
+            server = await asyncio.start_unix_server(self.handle, bound)
+            os.chmod(bound, 0o600)
+            os.replace(bound, path)
+        finally:
+            if os.path.lexists(bound):
+                os.remove(bound)
+            os.rmdir(private)
+        if ready is not None:
+            ready.set()
+        sweeper = asyncio.ensure_future(self.sweep_forever())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+
+    def write(self, connection, header, body=b''):
+        transport = connection.writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > MAX_BACKLOG:
+            logger.warning("Channel layer client %s is not keeping up; dropping a message", connection.client_id)
+            return
+        connection.writer.write(_frame(header, body))
+
+    async def handle(self, reader, writer):
+        if not _peer_trusted(writer):
+            logger.warning("Refused a channel layer connection from another user")
+            writer.close()
+            return
+        connection = _Connection(writer)
+        try:
+            while True:
+                header, body = await _read_frame(reader)
+                getattr(self, f'_on_{header[0]}')(connection, body, *header[1:])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.forget(connection)
+            writer.close()
+
+    def forget(self, connection):
+        if self.clients.get(connection.client_id) is connection:
+            del self.clients[connection.client_id]
+            for group in self.joined.pop(connection.client_id, ()):
+                self._leave(connection.client_id, group)
+        for channel, waiters in list(self.waiters.items()):
+            remaining = deque(waiter for waiter in waiters if waiter[0] is not connection)
+            if remaining:
+                self.waiters[channel] = remaining
+            else:
+                del self.waiters[channel]
+
+    def _leave(self, client_id, group):
+        members = self.groups.get(group)
+        if members is not None:
+            members.discard(client_id)
+            if not members:
+                del self.groups[group]
+
+    def put(self, channel, expires, capacity, body):
+        """Queue a message on an ordinary channel, or hand it to a waiting receiver; False if full."""
+        waiters = self.waiters.get(channel)
+        while waiters:
+            connection, request_id = waiters.popleft()
+            if not connection.writer.transport.is_closing():
+                self.write(connection, ('reply', request_id, True), body)
+                return True
+        queue = self.queues[channel]
+        now = time.time()
+        while queue and queue[0][0] < now:
+            queue.popleft()
+        if len(queue) >= capacity:
+            return False
+        queue.append((expires, body))
+        return True
+
+    def _on_hello(self, connection, body, client_id, capacity, channel_capacity):
+        connection.client_id = client_id
+        connection.capacity = capacity
+        connection.channel_capacity = channel_capacity
+        self.clients[client_id] = connection
+
+    def _on_send(self, connection, body, channel, expires):
+        target = self.clients.get(_owner(channel))
+        if target is not None:
+            self.write(target, ('deliver', channel, expires), body)
+
+    def _on_put(self, connection, body, request_id, channel, expires, capacity):
+        done = self.put(channel, expires, capacity, body)
+        if request_id is not None:
+            self.write(connection, ('reply', request_id, done))
+
+    def _on_get(self, connection, body, request_id, channel):
+        queue = self.queues.get(channel)
+        now = time.time()
+        while queue:
+            expires, message = queue.popleft()
+            if expires >= now:
+                self.write(connection, ('reply', request_id, True), message)
+                break
+        else:
+            self.waiters[channel].append((connection, request_id))
+        if queue is not None and not queue:
+            del self.queues[channel]
+
+    def _on_cancel(self, connection, body, request_id, channel):
+        waiters = self.waiters.get(channel, ())
+        if (connection, request_id) in waiters:
+            waiters.remove((connection, request_id))
+            if not waiters:
+                del self.waiters[channel]
+            # otherwise the message is already on its way and answers the request
+            self.write(connection, ('reply', request_id, False))
+
+    def _on_join(self, connection, body, group):
+        self.groups[group].add(connection.client_id)
+        self.joined[connection.client_id].add(group)
+
+    def _on_leave(self, connection, body, group):
+        self._leave(connection.client_id, group)
+        self.joined[connection.client_id].discard(group)
+
+    def _on_group_add(self, connection, body, group, channel, expires):
+        owner = _owner(channel)
+        if owner is None:
+            self.group_channels[group][channel] = expires
+        elif owner in self.clients:
+            self.write(self.clients[owner], ('group_add', group, channel))
+
+    def _on_group_discard(self, connection, body, group, channel):
+        owner = _owner(channel)
+        if owner is None:
+            channels = self.group_channels.get(group, {})
+            channels.pop(channel, None)
+            if not channels:
+                self.group_channels.pop(group, None)
+        elif owner in self.clients:
+            self.write(self.clients[owner], ('group_discard', group, channel))
+
+    def _on_group_send(self, connection, body, group, expires):
+        # the sender has already delivered to its own members
+        for client_id in self.groups.get(group, ()):
+            target = self.clients.get(client_id)
+            if target is not None and target is not connection:
+                self.write(target, ('group', group, expires), body)
+        channels = self.group_channels.get(group)
+        if channels:
+            now = time.time()
+            for channel, member_expires in list(channels.items()):
+                if member_expires < now:
+                    del channels[channel]
+                else:
+                    self.put(channel, expires, connection.get_capacity(channel), body)
+            if not channels:
+                del self.group_channels[group]
+
+    def _on_flush(self, connection, body):
+        self.groups.clear()
+        self.joined.clear()
+        self.group_channels.clear()
+        self.queues.clear()
+        for other in self.clients.values():
+            if other is not connection:
+                self.write(other, ('flush',))
+
+    def sweep(self):
+        now = time.time()
+        for group, channels in list(self.group_channels.items()):
+            for channel, expires in list(channels.items()):
+                if expires < now:
+                    del channels[channel]
+            if not channels:
+                del self.group_channels[group]
+        for channel, queue in list(self.queues.items()):
+            while queue and queue[0][0] < now:
+                queue.popleft()
+            if not queue:
+                del self.queues[channel]
+
+    async def sweep_forever(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            self.sweep()
+
+
+_claimed = {}
+_claimed_lock = threading.Lock()
+
+
+def claim(path):
+    """
+    Take the right to serve the broker socket at `path` for the life of this
+    process; False if another live process has it.
+    """
+    with _claimed_lock:
+        if path in _claimed:
+            return False
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        lock = open(f'{path}.lock', 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return False
+        # whoever served it before has exited, so a socket file left behind is stale
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        _claimed[path] = lock
+        return True
+
+
+def host_broker(path):
+    """Run the broker for `path` on a daemon thread unless another process does; True if started."""
+    if not claim(path):
+        return False
+    ready = threading.Event()
+    threading.Thread(
+        target=lambda: asyncio.run(Broker().serve(path, ready)), name='channel-broker', daemon=True
+    ).start()
+    ready.wait(5)
+    return True
+
+
+class _Inbox:
+    __slots__ = ('messages', 'capacity', 'waiter')
+
+    def __init__(self, capacity):
+        self.messages = deque()
+        self.capacity = capacity
+        self.waiter = None
+
+
+class _Client:
+    """One event loop's connection to the broker, with the inboxes and groups of the channels it owns."""
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.id = uuid.uuid4().hex
+        self.inboxes = {}
+        self.groups = {}  # group -> {own channel: membership expires at}
+        self.requests = {}  # request id -> (future, channel)
+        self.next_request = 0
+        self.writer = None
+        self.closed = False
+        self._connecting = asyncio.Lock()
+        self._tasks = set()
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def connection(self):
+        if self.writer is None or self.writer.is_closing():
+            async with self._connecting:
+                if self.writer is None or self.writer.is_closing():
+                    reader, writer = await self.layer.connect()
+                    writer.write(_frame(('hello', self.id, self.layer.capacity, self.layer.channel_capacity)))
+                    for group in self.groups:
+                        writer.write(_frame(('join', group)))
+                    if self.writer is None:
+                        self._spawn(self.sweep_forever())
+                    self.writer = writer
+                    self._spawn(self.read(reader, writer))
+        return self.writer
+
+    async def write(self, header, body=b''):
+        writer = await self.connection()
+        writer.write(_frame(header, body))
+        await writer.drain()
+
+    def write_now(self, header, body=b''):
+        # from frame handlers; groups announced before connecting are replayed on connect
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(_frame(header, body))
+
+    async def request(self, op, channel, *args, body=b''):
+        self.next_request += 1
+        request_id = self.next_request
+        future = asyncio.get_running_loop().create_future()
+        self.requests[request_id] = (future, channel)
+        await self.write((op, request_id, channel, *args), body)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # the broker still answers, with the message if it had already sent one
+            self.write_now(('cancel', request_id, channel))
+            raise
+
+    async def read(self, reader, writer):
+        try:
+            while True:
+                header, body = await _read_frame(reader)
+                getattr(self, f'_on_{header[0]}')(body, *header[1:])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            if not self.closed:
+                logger.warning("Lost the channel layer broker; reconnecting")
+        finally:
+            writer.close()
+            for future, _ in self.requests.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Lost the channel layer broker."))
+            self.requests.clear()
+        if not self.closed:
+            # reconnect now rather than on the next send, so group messages keep arriving
+            try:
+                await self.connection()
+            except ConnectionError:
+                logger.exception("Could not reconnect to the channel layer broker")
+
+    def deliver(self, channel, expires, body):
+        """Queue a message for one of this client's channels; False if its inbox is full."""
+        inbox = self.inboxes.get(channel)
+        if inbox is None:
+            inbox = self.inboxes[channel] = _Inbox(self.layer.get_capacity(channel))
+        if len(inbox.messages) >= inbox.capacity:
+            return False
+        inbox.messages.append((expires, body))
+        if inbox.waiter is not None and not inbox.waiter.done():
+            inbox.waiter.set_result(None)
+        return True
+
+    async def receive(self, channel):
+        await self.connection()
+        inbox = self.inboxes.get(channel)
+        if inbox is None:
+            inbox = self.inboxes[channel] = _Inbox(self.layer.get_capacity(channel))
+        while True:
+            while inbox.messages:
+                expires, body = inbox.messages.popleft()
+                if expires >= time.time():
+                    return pickle.loads(body)
+            inbox.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await inbox.waiter
+            except asyncio.CancelledError:
+                # the consumer has gone; nobody will read this inbox again
+                if not inbox.messages and self.inboxes.get(channel) is inbox:
+                    del self.inboxes[channel]
+                raise
+            finally:
+                inbox.waiter = None
+
+    def add_member(self, group, channel):
+        members = self.groups.get(group)
+        if members is None:
+            members = self.groups[group] = {}
+            self.write_now(('join', group))
+        members[channel] = time.time() + self.layer.group_expiry
+
+    def discard_member(self, group, channel):
+        members = self.groups.get(group)
+        if members is not None:
+            members.pop(channel, None)
+            if not members:
+                del self.groups[group]
+                self.write_now(('leave', group))
+
+    def _on_deliver(self, body, channel, expires):
+        self.deliver(channel, expires, body)
+
+    def deliver_group(self, group, expires, body):
+        members = self.groups.get(group)
+        if not members:
+            return
+        now = time.time()
+        for channel, member_expires in list(members.items()):
+            if member_expires < now:
+                self.discard_member(group, channel)
+            else:
+                self.deliver(channel, expires, body)
+
+    def _on_group(self, body, group, expires):
+        self.deliver_group(group, expires, body)
+
+    def _on_group_add(self, body, group, channel):
+        self.add_member(group, channel)
+
+    def _on_group_discard(self, body, group, channel):
+        self.discard_member(group, channel)
+
+    def _on_reply(self, body, request_id, done):
+        future, channel = self.requests.pop(request_id, (None, None))
+        if future is None:
+            return
+        if not future.done():
+            future.set_result((done, body))
+        elif done and body:
+            # the receive was cancelled after the broker handed it this message; put it back
+            expires = time.time() + self.layer.expiry
+            self.write_now(('put', None, channel, expires, self.layer.get_capacity(channel)), body)
+
+    def _on_flush(self, body):
+        self.flush()
+
+    def flush(self):
+        # inboxes being waited on stay, emptied, so their receivers are still woken
+        for channel, inbox in list(self.inboxes.items()):
+            inbox.messages.clear()
+            if inbox.waiter is None:
+                del self.inboxes[channel]
+        self.groups.clear()
+
+    def sweep(self):
+        now = time.time()
+        for channel, inbox in list(self.inboxes.items()):
+            if inbox.waiter is None and (not inbox.messages or inbox.messages[-1][0] < now):
+                del self.inboxes[channel]
+        for group, members in list(self.groups.items()):
+            for channel, expires in list(members.items()):
+                if expires < now:
+                    self.discard_member(group, channel)
+
+    async def sweep_forever(self):
+        while not self.closed:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            self.sweep()
+
+    async def close(self):
+        self.closed = True
+        for task in list(self._tasks):
+            task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class UnixSocketChannelLayer(BaseChannelLayer):
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None, auto_start=True):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.path = path
+        self.group_expiry = group_expiry
+        self.auto_start = auto_start
+        self._clients = {}  # event loop -> _Client
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            # async_to_sync runs each call on a new loop; drop the clients of finished ones
+            for stale in [other for other in self._clients if other.is_closed()]:
+                del self._clients[stale]
+            client = self._clients[loop] = _Client(self)
+        return client
+
+    async def connect(self):
+        for attempt in range(CONNECT_ATTEMPTS):
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if self.auto_start and host_broker(self.path):
+                    continue
+                await asyncio.sleep(0.05 * 2 ** attempt)
+                continue
+            if not _peer_trusted(writer):
+                writer.close()
+                raise ConnectionError(f"The channel layer broker on {self.path} runs as another user.")
+            return reader, writer
+        raise ConnectionError(f"No channel layer broker is listening on {self.path}.")
+
+    async def new_channel(self, prefix='specific'):
+        return f'{prefix}.{self._client().id}!{uuid.uuid4().hex}'
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.valid_channel_name(channel)
+        body = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        expires = time.time() + self.expiry
+        client = self._client()
+        owner = _owner(channel)
+        if owner == client.id:
+            if not client.deliver(channel, expires, body):
+                raise ChannelFull(channel)
+        elif owner is not None:
+            await client.write(('send', channel, expires), body)
+        else:
+            done, _ = await client.request('put', channel, expires, self.get_capacity(channel), body=body)
+            if not done:
+                raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.valid_channel_name(channel)
+        client = self._client()
+        if '!' in channel:
+            return await client.receive(channel)
+        while True:
+            done, body = await client.request('get', channel)
+            if done:
+                return pickle.loads(body)
+
+    async def group_add(self, group, channel):
+        self.valid_group_name(group)
+        self.valid_channel_name(channel)
+        client = self._client()
+        await client.connection()
+        if _owner(channel) == client.id:
+            client.add_member(group, channel)
+        else:
+            await client.write(('group_add', group, channel, time.time() + self.group_expiry))
+
+    async def group_discard(self, group, channel):
+        self.valid_group_name(group)
+        self.valid_channel_name(channel)
+        client = self._client()
+        if _owner(channel) == client.id:
+            client.discard_member(group, channel)
+        else:
+            await client.write(('group_discard', group, channel))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.valid_group_name(group)
+        body = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        expires = time.time() + self.expiry
+        client = self._client()
+        client.deliver_group(group, expires, body)
+        await client.write(('group_send', group, expires), body)
+
+    async def flush(self):
+        client = self._client()
+        client.flush()
+        await client.write(('flush',))
+
+    async def close(self):
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
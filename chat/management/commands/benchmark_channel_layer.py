@@ -0,0 +1,139 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from chat.layers import UnixSocketChannelLayer
+
+# the workers' group is separate, so the one-process runs never reach them
+GROUP, WORKER_GROUP = 'benchmark', 'benchmark.workers'
+
+
+def _worker(path, capacity, members, group_messages, direct_messages, pipe):
+    """A receiving process: `members` channels in WORKER_GROUP, plus one channel for direct messages."""
+    async def run():
+        layer = UnixSocketChannelLayer(path, capacity=capacity)
+        channels = [await layer.new_channel() for _ in range(members)]
+        for channel in channels:
+            await layer.group_add(WORKER_GROUP, channel)
+        direct = await layer.new_channel()
+        pipe.send(direct)
+
+        async def drain(channel, count):
+            for _ in range(count):
+                await layer.receive(channel)
+
+        await asyncio.gather(*(drain(channel, group_messages) for channel in channels))
+        pipe.send('group')
+        await drain(direct, direct_messages)
+        pipe.send('direct')
+        await layer.close()
+
+    asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the throughput of the multi-process UnixSocketChannelLayer against InMemoryChannelLayer: "
+        "direct messages and group fan-out within one process, and across worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=20000,
+                            help="Direct messages sent to one channel.")
+        parser.add_argument('--members', type=int, default=1000,
+                            help="Channels in the group, spread over the worker processes when crossing them.")
+        parser.add_argument('--group-messages', type=int, default=20,
+                            help="Messages sent to the group.")
+        parser.add_argument('--processes', type=int, default=2,
+                            help="Receiving worker processes for the cross-process runs (0 skips them).")
+
+    def handle(self, *args, **options):
+        self.options = options
+        # every queued message must fit, so that what is measured is delivery rather than drops
+        self.capacity = max(options['messages'], options['group_messages']) + 1
+        path = os.path.join(tempfile.mkdtemp(prefix='channel-benchmark-'), 'broker.sock')
+
+        # workers are forked before this process has an event loop, a connection or a broker thread
+        workers = []
+        context = multiprocessing.get_context('fork')
+        processes = options['processes']
+        for index in range(processes):
+            ours, theirs = context.Pipe()
+            members = options['members'] // processes + (index < options['members'] % processes)
+            direct_messages = options['messages'] if index == 0 else 0
+            process = context.Process(target=_worker, args=(
+                path, self.capacity, members, options['group_messages'], direct_messages, theirs,
+            ))
+            process.start()
+            workers.append((process, ours))
+
+        try:
+            for layer in (InMemoryChannelLayer(capacity=self.capacity), UnixSocketChannelLayer(path, capacity=self.capacity)):
+                asyncio.run(self.run_local(layer))
+            if workers:
+                asyncio.run(self.run_across(UnixSocketChannelLayer(path, capacity=self.capacity), workers))
+        finally:
+            for process, _ in workers:
+                process.join(timeout=60)
+                if process.is_alive():
+                    process.terminate()
+
+    def report(self, layer, scenario, count, elapsed):
+        self.stdout.write(f"{type(layer).__name__:<24} {scenario:<34} {count / elapsed:>12,.0f} msg/s")
+
+    async def run_local(self, layer):
+        messages, members, group_messages = (
+            self.options['messages'], self.options['members'], self.options['group_messages']
+        )
+        channel = await layer.new_channel()
+        started = time.perf_counter()
+        receiver = asyncio.ensure_future(self.drain(layer, channel, messages))
+        for number in range(messages):
+            await layer.send(channel, {'type': 'benchmark.message', 'number': number})
+        await receiver
+        self.report(layer, "direct, one process", messages, time.perf_counter() - started)
+
+        channels = [await layer.new_channel() for _ in range(members)]
+        for member in channels:
+            await layer.group_add(GROUP, member)
+        started = time.perf_counter()
+        receivers = asyncio.gather(*(self.drain(layer, member, group_messages) for member in channels))
+        for number in range(group_messages):
+            await layer.group_send(GROUP, {'type': 'benchmark.message', 'number': number})
+        await receivers
+        self.report(layer, f"group of {members}, one process", members * group_messages, time.perf_counter() - started)
+        for member in channels:
+            await layer.group_discard(GROUP, member)
+        await layer.close()
+
+    async def run_across(self, layer, workers):
+        loop = asyncio.get_running_loop()
+        direct = [await loop.run_in_executor(None, pipe.recv) for _, pipe in workers]
+        processes = len(workers)
+
+        started = time.perf_counter()
+        for number in range(self.options['group_messages']):
+            await layer.group_send(WORKER_GROUP, {'type': 'benchmark.message', 'number': number})
+        for _, pipe in workers:
+            await loop.run_in_executor(None, pipe.recv)
+        self.report(
+            layer, f"group of {self.options['members']}, {processes} processes",
+            self.options['members'] * self.options['group_messages'], time.perf_counter() - started,
+        )
+
+        started = time.perf_counter()
+        for number in range(self.options['messages']):
+            await layer.send(direct[0], {'type': 'benchmark.message', 'number': number})
+        for _, pipe in workers:
+            await loop.run_in_executor(None, pipe.recv)
+        self.report(layer, "direct, to another process", self.options['messages'], time.perf_counter() - started)
+        await layer.close()
+
+    async def drain(self, layer, channel, count):
+        for _ in range(count):
+            await layer.receive(channel)
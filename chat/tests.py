@@ -1,3 +1,139 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import stat
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase, mock
 
-# Create your tests here.
+from channels.exceptions import ChannelFull
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, override_settings
+
+from . import layers
+from .layers import UnixSocketChannelLayer
+from .routing import websocket_urlpatterns
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ChatConsumerTests(SimpleTestCase):
+    async def connect(self, path, username='ann'):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        communicator.scope['user'] = SimpleNamespace(username=username)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_group_messages_reach_everyone_in_the_room(self):
+        first, second = await self.connect('/ws/chat/lobby/'), await self.connect('/ws/chat/lobby/')
+        elsewhere = await self.connect('/ws/chat/other/')
+        await first.send_to(text_data='hello')
+        self.assertEqual(await first.receive_from(), 'hello')
+        self.assertEqual(await second.receive_from(), 'hello')
+        self.assertTrue(await elsewhere.receive_nothing())
+        for communicator in (first, second, elsewhere):
+            await communicator.disconnect()
+
+    async def test_direct_messages_carry_the_sender(self):
+        communicator = await self.connect('/ws/direct/ben/', username='ann')
+        await communicator.send_to(text_data='hi ben')
+        self.assertEqual(json.loads(await communicator.receive_from()), {'message': 'hi ben', 'sender': 'ann'})
+        await communicator.disconnect()
+
+
+class UnixSocketChannelLayerTests(IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='dreamboard-broker-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'channels.sock')
+
+    def layer(self, **kwargs):
+        # every layer instance has its own client, as a separate worker process would
+        layer = UnixSocketChannelLayer(self.path, **kwargs)
+        self.addAsyncCleanup(layer.close)
+        return layer
+
+    async def acknowledged(self, layer):
+        # the broker handles a connection's frames in order, so once it answers
+        # this put it has handled everything the layer sent before it
+        await layer.send('acknowledge', {'type': 'acknowledge'})
+
+    async def test_process_channel_across_clients(self):
+        sender, receiver = self.layer(), self.layer()
+        channel = await receiver.new_channel()
+        await receiver.group_add('warmup', channel)  # connect before the message is sent
+        await sender.send(channel, {'type': 'hello', 'text': 'hi'})
+        self.assertEqual(await asyncio.wait_for(receiver.receive(channel), 2), {'type': 'hello', 'text': 'hi'})
+
+    async def test_group_send_reaches_every_client(self):
+        first, second = self.layer(), self.layer()
+        channels = [await first.new_channel(), await second.new_channel()]
+        await first.group_add('room', channels[0])
+        await second.group_add('room', channels[1])
+        await self.acknowledged(second)
+        await first.group_send('room', {'type': 'chat.message', 'message': 'hey'})
+        for layer, channel in zip((first, second), channels):
+            self.assertEqual((await asyncio.wait_for(layer.receive(channel), 2))['message'], 'hey')
+        await second.group_discard('room', channels[1])
+        await first.group_send('room', {'type': 'chat.message', 'message': 'again'})
+        self.assertEqual((await asyncio.wait_for(first.receive(channels[0]), 2))['message'], 'again')
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(second.receive(channels[1]), 0.2)
+
+    async def test_ordinary_channels_queue_at_the_broker(self):
+        producer, worker = self.layer(capacity=2), self.layer(capacity=2)
+        await producer.send('thumbnails', {'type': 'job', 'n': 1})
+        await producer.send('thumbnails', {'type': 'job', 'n': 2})
+        with self.assertRaises(ChannelFull):
+            await producer.send('thumbnails', {'type': 'job', 'n': 3})
+        self.assertEqual((await worker.receive('thumbnails'))['n'], 1)
+        self.assertEqual((await worker.receive('thumbnails'))['n'], 2)
+
+    async def test_full_channel_of_the_sending_process_raises(self):
+        layer = self.layer(capacity=1)
+        channel = await layer.new_channel()
+        await layer.send(channel, {'type': 'job', 'n': 1})
+        with self.assertRaises(ChannelFull):
+            await layer.send(channel, {'type': 'job', 'n': 2})
+        self.assertEqual((await layer.receive(channel))['n'], 1)
+
+    async def test_group_send_uses_each_channels_capacity(self):
+        sender, worker = self.layer(channel_capacity={'thumb*': 1}), self.layer()
+        await sender.group_add('uploads', 'thumbnails')
+        await sender.group_send('uploads', {'type': 'job', 'n': 1})
+        await sender.group_send('uploads', {'type': 'job', 'n': 2})
+        await self.acknowledged(sender)
+        self.assertEqual((await asyncio.wait_for(worker.receive('thumbnails'), 2))['n'], 1)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(worker.receive('thumbnails'), 0.2)
+
+    async def test_group_memberships_expire(self):
+        layer = self.layer(group_expiry=60)
+        channel = await layer.new_channel()
+        await layer.group_add('room', channel)
+        await layer.group_add('room', 'thumbnails')
+        await self.acknowledged(layer)
+        later = mock.Mock(time=lambda: time.time() + 120)
+        with mock.patch.object(layers, 'time', later):
+            await layer.group_send('room', {'type': 'chat.message', 'message': 'late'})
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(channel), 0.2)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive('thumbnails'), 0.2)
+        self.assertEqual(layer._client().groups, {})
+
+    async def test_socket_is_owner_only(self):
+        layer = self.layer()
+        await layer.send('probe', {'type': 'probe'})
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        # nothing is left of the private directory it was bound in
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.path))), ['channels.sock', 'channels.sock.lock'])
+
+    async def test_refuses_peers_running_as_another_user(self):
+        await self.layer().send('probe', {'type': 'probe'})
+        with mock.patch.object(layers, '_peer_trusted', return_value=False):
+            with self.assertRaises(ConnectionError):
+                await self.layer(auto_start=False).send('probe', {'type': 'probe'})
@@ -0,0 +1,145 @@
+"""
+ASGI front for media files.
+
+MediaFiles answers requests under offload.media.mounts() before they reach
+Django, with the same validators and byte ranges as offload.media.serve but
+no middleware, URL resolving or thread hop. File slices go out through the
+`http.response.zerocopysend` extension when the server offers it, and as
+blocks of a memory-mapped file otherwise (daphne), sent no faster than the
+client reads them.
+
+ASGI leaves backpressure to `send`, and daphne's returns before anything is
+written. FlowControl works around that through daphne's request object;
+it is feature-detected, and with any other server (or a daphne that no
+longer looks the same) blocks go out paced by `await send()` alone, with a
+warning logged once.
+"""
+import asyncio
+import logging
+from functools import partial
+
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from .media import MediaFile, mounts
+
+logger = logging.getLogger(__name__)
+
+ZEROCOPY = 'http.response.zerocopysend'
+
+
+def _encode(headers):
+    return [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers.items()]
+
+
+class FlowControl:
+    """
+    Backpressure for daphne. Its `send` returns as soon as a message is handed
+    to Twisted, so sending a file block after block would queue all of it in
+    the transport's write buffer. This registers as a push producer on
+    daphne's request, the public Twisted way to be paused while that buffer
+    is full. Use `attach()`, which returns None when `send` is not daphne's.
+    """
+    warned = False
+
+    @classmethod
+    def attach(cls, send):
+        # daphne passes functools.partial(server.handle_reply, request)
+        request = send.args[0] if isinstance(send, partial) and send.args else None
+        if getattr(request, 'channel', None) is not None and callable(getattr(request, 'registerProducer', None)):
+            flow = cls(request)
+            try:
+                request.registerProducer(flow, True)
+                return flow
+            except Exception:
+                logger.debug("Could not register a producer on the ASGI server's request", exc_info=True)
+        if not cls.warned:
+            cls.warned = True
+            logger.warning(
+                "The ASGI server's send() offers no flow control hook; media responses rely on "
+                "send() for backpressure, which may buffer whole files on servers that don't apply it."
+            )
+        return None
+
+    def __init__(self, request):
+        self.request = request
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.stopped = False
+
+    def pauseProducing(self):
+        self.writable.clear()
+
+    def resumeProducing(self):
+        self.writable.set()
+
+    def stopProducing(self):
+        # the client went away
+        self.stopped = True
+        self.writable.set()
+
+    async def wait(self):
+        """Wait until more may be written; False once the client has gone."""
+        await self.writable.wait()
+        return not self.stopped
+
+    def close(self):
+        if self.request.channel is not None and getattr(self.request, 'producer', None) is self:
+            self.request.unregisterProducer()
+
+
+class MediaFiles:
+    def __init__(self, application):
+        self.application = application
+
+    @cached_property
+    def mounts(self):
+        # read on first use, once settings are certainly configured
+        return mounts()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            for prefix, root in self.mounts:
+                if scope['path'].startswith(prefix):
+                    return await self.serve(scope, send, root, scope['path'][len(prefix):])
+        return await self.application(scope, receive, send)
+
+    async def _respond(self, send, status, headers):
+        headers = {**headers, 'Content-Length': '0'}
+        await send({'type': 'http.response.start', 'status': status, 'headers': _encode(headers)})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def serve(self, scope, send, root, path):
+        if scope['method'] not in ('GET', 'HEAD'):
+            return await self._respond(send, 405, {'Allow': 'GET, HEAD'})
+        try:
+            media = MediaFile(root, path)
+        except Http404:
+            return await self._respond(send, 404, {})
+
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        reply = media.reply(scope['method'], headers)
+        await send({'type': 'http.response.start', 'status': reply.status, 'headers': _encode(reply.headers)})
+        if not reply.parts:
+            media.close()
+        elif ZEROCOPY in scope.get('extensions', {}):
+            with media.file:
+                for part in reply.parts:
+                    if isinstance(part, bytes):
+                        await send({'type': 'http.response.body', 'body': part, 'more_body': True})
+                    else:
+                        start, length = part
+                        await send({
+                            'type': ZEROCOPY, 'file': media.file, 'offset': start, 'count': length, 'more_body': True,
+                        })
+        else:
+            flow = FlowControl.attach(send)
+            try:
+                async for chunk in media.achunks(reply.parts):
+                    if flow is not None and not await flow.wait():
+                        break
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            finally:
+                if flow is not None:
+                    flow.close()
+        await send({'type': 'http.response.body', 'body': b''})
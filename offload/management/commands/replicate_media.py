@@ -0,0 +1,33 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from offload.models import StoredFile
+from offload.storage import OffloadStorage
+
+
+class Command(BaseCommand):
+    help = "Copy staged media that has not reached the remote backend yet, e.g. after a crash or repeated failures."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failed-only', action='store_true',
+                            help="Only retry files whose replication gave up.")
+
+    def handle(self, *args, **options):
+        storage = default_storage._wrapped if hasattr(default_storage, '_wrapped') else default_storage
+        if not isinstance(storage, OffloadStorage):
+            storage = OffloadStorage()
+        statuses = [StoredFile.Status.FAILED] if options['failed_only'] else [StoredFile.Status.PENDING, StoredFile.Status.FAILED]
+        names = StoredFile.objects.filter(status__in=statuses).values_list('name', flat=True)
+
+        done = failed = missing = 0
+        for name in names.iterator():
+            if not storage.local.exists(name):
+                missing += 1  # staged on another host, or lost
+                continue
+            if storage.replicate(name):
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Replicated {done} files; {failed} still failing; {missing} not staged on this host."
+        ))
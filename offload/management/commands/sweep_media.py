@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from offload.models import StoredFile
+from offload.storage import OffloadStorage, referenced
+
+
+class Command(BaseCommand):
+    help = "Delete stored media that no row references any more; deleting a row leaves its file for this sweep."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help="Leave files saved more recently than this, whose rows may not be committed yet.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Number of stored names checked per batch.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report what would be deleted.")
+
+    def handle(self, *args, **options):
+        storage = default_storage._wrapped if hasattr(default_storage, '_wrapped') else default_storage
+        if not isinstance(storage, OffloadStorage):
+            storage = OffloadStorage()
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        names = StoredFile.objects.filter(created_at__lt=cutoff).order_by('pk').values_list('pk', 'name')
+
+        checked = deleted = 0
+        last_id = 0
+        while True:
+            batch = list(names.filter(pk__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            batch = [name for _, name in batch]
+            checked += len(batch)
+            for name in sorted(set(batch) - referenced(batch)):
+                if not options['dry_run']:
+                    storage.purge(name)
+                deleted += 1
+
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} of {checked} stored files."))
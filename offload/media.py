@@ -0,0 +1,250 @@
+"""
+Serving locally stored media files.
+
+MediaFile answers GET and HEAD for one file under a document root the way
+browsers and video players expect from a file server: a strong ETag and
+Last-Modified (with 304s for them), `Accept-Ranges: bytes`, and single and
+multiple byte ranges (206, multipart/byteranges for several, 416 when none
+can be satisfied), so scrubbing a video fetches only the part played.
+
+No response body is ever read into memory as a whole:
+
+* under WSGI a single range or the whole file is a FileResponse over a
+  FileSlice, which servers offering `wsgi.file_wrapper` (gunicorn) send with
+  os.sendfile() straight from the page cache;
+* under ASGI the body is an async iterator of blocks sliced from a
+  memory-mapped file, which Django streams as it goes instead of buffering
+  the sync iterators FileResponse uses. offload.asgi.MediaFiles serves the
+  same files ahead of Django and hands file slices to servers offering the
+  zero-copy send extension.
+
+mounts() lists what is served: the offload staging directory at
+MEDIA_OFFLOAD_PENDING_URL, and MEDIA_ROOT at MEDIA_URL when
+MEDIA_SERVE_LOCAL is set.
+"""
+import mimetypes
+import mmap
+import os
+import re
+import secrets
+import stat
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+from .storage import pending_url, staging_dir
+
+BLOCK_SIZE = 256 * 1024
+# a request for more ranges than this (after merging) gets the whole file
+MAX_RANGES = 16
+RANGE_SPEC = re.compile(r'^(\d*)-(\d*)$', re.ASCII)
+
+Reply = namedtuple('Reply', 'status headers parts')
+
+
+def serve_local():
+    return getattr(settings, 'MEDIA_SERVE_LOCAL', False)
+
+
+def mounts():
+    """[(url prefix, document root)] of the directories served as media, most specific first."""
+    served = [(pending_url(), staging_dir())]
+    if serve_local():
+        served.append((settings.MEDIA_URL, str(settings.MEDIA_ROOT)))
+    return served
+
+
+def parse_ranges(header, size):
+    """
+    The sorted, merged [(start, stop)] byte ranges a Range header asks for in
+    a `size`-byte file: [] if none of them is satisfiable, None if the header
+    is to be ignored (not bytes, malformed, or too many ranges).
+    """
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    ranges = []
+    for spec in specs.split(','):
+        if not spec.strip():
+            continue
+        match = RANGE_SPEC.match(spec.strip())
+        if match is None or match.groups() == ('', ''):
+            return None
+        first, last = match.groups()
+        if not first:
+            # "-n" is the last n bytes
+            if int(last):
+                ranges.append((max(size - int(last), 0), size))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < size:
+            ranges.append((start, min(int(last) + 1, size) if last else size))
+
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged if len(merged) <= MAX_RANGES else None
+
+
+class FileSlice:
+    """
+    `length` bytes of an open file from `start`, for FileResponse. The file is
+    positioned at `start` and reads stop after `length` bytes, so
+    wsgi.file_wrapper servers sendfile() exactly the slice from fileno().
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class MediaFile:
+    def __init__(self, root, path):
+        """Open `path` under `root`; raises Http404 unless it is a regular file there."""
+        try:
+            self.file = open(safe_join(root, path), 'rb')
+        except (SuspiciousFileOperation, OSError, ValueError):
+            raise Http404("No such media file.")
+        # the validators describe the file actually opened, even if the name is replaced meanwhile
+        info = os.fstat(self.file.fileno())
+        if not stat.S_ISREG(info.st_mode):
+            self.file.close()
+            raise Http404("No such media file.")
+        self.size = info.st_size
+        self.mtime = int(info.st_mtime)
+        self.etag = f'"{info.st_size:x}-{info.st_mtime_ns:x}"'
+        self.last_modified = http_date(info.st_mtime)
+        content_type, encoding = mimetypes.guess_type(path)
+        # a .gz served as gzip-encoded would be unpacked by the browser
+        self.content_type = content_type if content_type and not encoding else 'application/octet-stream'
+
+    def close(self):
+        self.file.close()
+
+    def _not_modified(self, headers):
+        if_none_match = headers.get('if-none-match')
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            return '*' in tags or self.etag in tags
+        since = parse_http_date_safe(headers.get('if-modified-since') or '')
+        return since is not None and self.mtime <= since
+
+    def _range_applies(self, if_range):
+        if if_range is None:
+            return True
+        if if_range.strip().startswith(('"', 'W/')):
+            # If-Range takes strong comparison only
+            return if_range.strip() == self.etag
+        return if_range.strip() == self.last_modified
+
+    def reply(self, method, headers):
+        """
+        The Reply to a GET or HEAD with request `headers`, a mapping looked up
+        by lower-case name. Its parts are bytes and (start, length) slices of
+        the file, in order; a HEAD gets the GET's headers and no parts.
+        """
+        response_headers = {'Accept-Ranges': 'bytes', 'ETag': self.etag, 'Last-Modified': self.last_modified}
+        if self._not_modified(headers):
+            return Reply(304, response_headers, [])
+
+        ranges = None
+        if method == 'GET' and headers.get('range') and self._range_applies(headers.get('if-range')):
+            ranges = parse_ranges(headers.get('range'), self.size)
+        if ranges == []:
+            response_headers.update({'Content-Range': f'bytes */{self.size}', 'Content-Length': '0'})
+            return Reply(416, response_headers, [])
+
+        if ranges is None:
+            status, content_type, parts = 200, self.content_type, [(0, self.size)]
+        elif len(ranges) == 1:
+            (start, stop), = ranges
+            status, content_type, parts = 206, self.content_type, [(start, stop - start)]
+            response_headers['Content-Range'] = f'bytes {start}-{stop - 1}/{self.size}'
+        else:
+            boundary = secrets.token_hex(16)
+            status, content_type, parts = 206, f'multipart/byteranges; boundary={boundary}', []
+            for start, stop in ranges:
+                parts.append((
+                    f'\r\n--{boundary}\r\nContent-Type: {self.content_type}\r\n'
+                    f'Content-Range: bytes {start}-{stop - 1}/{self.size}\r\n\r\n'
+                ).encode('latin-1'))
+                parts.append((start, stop - start))
+            parts.append(f'\r\n--{boundary}--\r\n'.encode('latin-1'))
+        response_headers['Content-Type'] = content_type
+        response_headers['Content-Length'] = str(sum(
+            len(part) if isinstance(part, bytes) else part[1] for part in parts
+        ))
+        return Reply(status, response_headers, parts if method == 'GET' else [])
+
+    def chunks(self, parts):
+        """The bytes of a reply's `parts`, file slices a block at a time from a memory map. Closes the file."""
+        with self.file:
+            # a zero-length file cannot be mapped, and has no slices to send
+            mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+            try:
+                for part in parts:
+                    if isinstance(part, bytes):
+                        yield part
+                        continue
+                    start, length = part
+                    for offset in range(start, start + length, BLOCK_SIZE):
+                        yield mapped[offset:min(offset + BLOCK_SIZE, start + length)]
+            finally:
+                if self.size:
+                    mapped.close()
+
+    async def achunks(self, parts):
+        chunks = self.chunks(parts)
+        try:
+            for chunk in chunks:
+                yield chunk
+        finally:
+            chunks.close()
+
+
+def serve(request, path, document_root):
+    """
+    Serve `path` under `document_root`; django.views.static.serve with
+    validators, byte ranges and sendfile/memory-mapped bodies.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    media = MediaFile(document_root, path)
+    reply = media.reply(request.method, request.headers)
+    if not reply.parts:
+        media.close()
+        response = HttpResponse(status=reply.status)
+    elif isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(media.achunks(reply.parts), status=reply.status)
+    elif len(reply.parts) == 1:
+        start, length = reply.parts[0]
+        response = FileResponse(FileSlice(media.file, start, length), status=reply.status)
+        response.block_size = BLOCK_SIZE
+    else:
+        response = StreamingHttpResponse(media.chunks(reply.parts), status=reply.status)
+    for header, value in reply.headers.items():
+        response[header] = value
+    return response
@@ -0,0 +1,28 @@
+from django.db import models
+from django.utils import timezone
+
+
+class StoredFile(models.Model):
+    """
+    A file saved through offload.storage.OffloadStorage. `name` is the
+    content-addressed name handed back to the model field; the file sits in
+    the local staging area until it has been copied to the remote backend,
+    which knows it as `remote_name`.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        DONE = 'done'
+        FAILED = 'failed'
+
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    remote_name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
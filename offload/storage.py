@@ -0,0 +1,323 @@
+"""
+Media storage that keeps remote uploads off the request path.
+
+OffloadStorage writes every saved file to a local staging directory and
+returns straight away; a pool of MEDIA_OFFLOAD_WORKERS threads then copies
+it to the remote backend (MEDIA_OFFLOAD_REMOTE, Cloudinary in production),
+retrying with exponential backoff, and removes the staged copy once the
+remote one is recorded.
+
+Files are named after the SHA-256 of their content, so saving the same
+bytes twice yields one name, one staged file and at most one remote upload;
+content already on the remote under another name is not uploaded again.
+
+Until a file is replicated its URL points at MEDIA_OFFLOAD_PENDING_URL,
+which offload.urls serves from the staging directory. Files stored before
+this storage existed have plain names and are passed to the remote as is.
+Where a name lives is looked up in StoredFile; renders resolve all of
+theirs in one query with `prime()`, and the answers for replicated files,
+which never change, are kept in a bounded LRU.
+
+Staging is local disk: every process serving pending URLs must see the
+same MEDIA_OFFLOAD_STAGING_DIR. `replicate_media` re-queues files a crash
+or a run of failures left behind.
+
+Deleting a name through the storage removes nothing, since other rows may
+hold the same name; `sweep_media` purges the names no file field
+references any more.
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.db import IntegrityError, connection, models, transaction
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DIGEST_LENGTH = 40
+# remote names remembered per process
+REMOTE_NAMES_CACHED = 10000
+HASHED_NAME = re.compile(rf'^[0-9a-f]{{{DIGEST_LENGTH}}}(\.[^/]*)?$')
+INCOMING = '.incoming'
+
+
+def staging_dir():
+    return getattr(settings, 'MEDIA_OFFLOAD_STAGING_DIR', os.path.join(settings.BASE_DIR, 'var', 'staging'))
+
+
+def pending_url():
+    return getattr(settings, 'MEDIA_OFFLOAD_PENDING_URL', '/media/pending/')
+
+
+def workers():
+    return getattr(settings, 'MEDIA_OFFLOAD_WORKERS', 4)
+
+
+def retries():
+    return getattr(settings, 'MEDIA_OFFLOAD_RETRIES', 5)
+
+
+def retry_delay():
+    return getattr(settings, 'MEDIA_OFFLOAD_RETRY_DELAY', 1.0)
+
+
+def remote_storage():
+    config = getattr(settings, 'MEDIA_OFFLOAD_REMOTE', {
+        'BACKEND': 'cloudinary_storage.storage.MediaCloudinaryStorage',
+    })
+    return import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _submit(function, *args):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(workers(), thread_name_prefix='media-offload')
+    _pool.submit(function, *args)
+
+
+class LRU:
+    """A thread-safe mapping that forgets its least recently used entries beyond `size`."""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+@deconstructible
+class OffloadStorage(Storage):
+    def __init__(self, location=None, base_url=None):
+        self.location = location
+        self.base_url = base_url
+        # remote names of replicated (and of untracked) files; content-addressed names never change
+        self._remote_names = LRU(REMOTE_NAMES_CACHED)
+
+    @cached_property
+    def local(self):
+        return FileSystemStorage(location=self.location or staging_dir(), base_url=self.base_url or pending_url())
+
+    @cached_property
+    def remote(self):
+        return remote_storage()
+
+    def get_available_name(self, name, max_length=None):
+        # the final name is chosen from the content in _save; equal names mean equal files
+        return name
+
+    def _save(self, name, content):
+        from .models import StoredFile
+
+        incoming = self.local.path(posixpath.join(INCOMING, uuid.uuid4().hex))
+        os.makedirs(os.path.dirname(incoming), exist_ok=True)
+        digest, size = hashlib.sha256(), 0
+        with open(incoming, 'wb') as staged:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks():
+                staged.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+        digest = digest.hexdigest()
+
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        name = posixpath.join(directory, digest[:DIGEST_LENGTH] + os.path.splitext(filename)[1].lower())
+        try:
+            with transaction.atomic():
+                record, created = StoredFile.objects.get_or_create(
+                    name=name, defaults={'digest': digest, 'size': size}
+                )
+        except IntegrityError:
+            record, created = StoredFile.objects.get(name=name), False
+
+        if not created and (record.status == StoredFile.Status.DONE or self.local.exists(name)):
+            os.remove(incoming)
+            if record.status == StoredFile.Status.FAILED:
+                transaction.on_commit(lambda: self.enqueue(name))
+            return name
+        target = self.local.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(incoming, target)
+        transaction.on_commit(lambda: self.enqueue(name))
+        return name
+
+    def enqueue(self, name):
+        if not workers():
+            self.replicate(name)
+            return
+        _submit(self._replicate_in_thread, name)
+
+    def _replicate_in_thread(self, name):
+        try:
+            self.replicate(name)
+        finally:
+            connection.close()
+
+    def replicate(self, name):
+        """
+        Copy a staged file to the remote backend, retrying with backoff, then
+        drop the staged copy. Returns whether the file is now remote.
+        """
+        from .models import StoredFile
+
+        record = StoredFile.objects.filter(name=name).first()
+        if record is None or record.status == StoredFile.Status.DONE:
+            return record is not None
+        twin = (
+            StoredFile.objects.filter(digest=record.digest, status=StoredFile.Status.DONE)
+            .exclude(pk=record.pk).values_list('remote_name', flat=True).first()
+        )
+        remote_name, error = twin, ''
+        attempt = 0
+        while remote_name is None and attempt < max(retries(), 1):
+            if attempt:
+                time.sleep(retry_delay() * 2 ** (attempt - 1))
+            attempt += 1
+            try:
+                with self.local.open(name, 'rb') as staged:
+                    remote_name = self.remote.save(name, File(staged, posixpath.basename(name)))
+            except Exception as exc:
+                logger.warning("Replicating %s failed (attempt %d): %s", name, attempt, exc)
+                error = str(exc)[:255]
+
+        if remote_name is None:
+            StoredFile.objects.filter(pk=record.pk).update(
+                status=StoredFile.Status.FAILED, attempts=record.attempts + attempt, error=error
+            )
+            logger.error("Giving up replicating %s after %d attempts; it stays staged", name, attempt)
+            return False
+        StoredFile.objects.filter(pk=record.pk).update(
+            status=StoredFile.Status.DONE, remote_name=remote_name, attempts=record.attempts + attempt, error=''
+        )
+        self._remote_names.set(name, remote_name)
+        self.local.delete(name)
+        return True
+
+    def prime(self, names):
+        """Resolve every name in `names` not known yet with one query, ahead of rendering their URLs."""
+        from .models import StoredFile
+
+        missing = {
+            name for name in names
+            if name and HASHED_NAME.match(posixpath.basename(name)) and self._remote_names.get(name) is None
+        }
+        if not missing:
+            return
+        rows = StoredFile.objects.filter(name__in=missing).values_list('name', 'status', 'remote_name')
+        for name, status, remote_name in rows:
+            missing.discard(name)
+            if status == StoredFile.Status.DONE:
+                self._remote_names.set(name, remote_name)
+        # not tracked at all: stored under the remote's own name
+        for name in missing:
+            self._remote_names.set(name, name)
+
+    def _remote_name(self, name):
+        """(staged, remote name): where a file is right now."""
+        from .models import StoredFile
+
+        if not HASHED_NAME.match(posixpath.basename(name)):
+            return False, name  # stored before offloading, under the remote's own name
+        remote_name = self._remote_names.get(name)
+        if remote_name is not None:
+            return False, remote_name
+        row = StoredFile.objects.filter(name=name).values_list('status', 'remote_name').first()
+        if row is None:
+            self._remote_names.set(name, name)
+            return False, name
+        if row[0] == StoredFile.Status.DONE:
+            self._remote_names.set(name, row[1])
+            return False, row[1]
+        return True, name
+
+    def _open(self, name, mode='rb'):
+        staged, remote_name = self._remote_name(name)
+        if staged or self.local.exists(name):
+            return self.local.open(name, mode)
+        return self.remote.open(remote_name, mode)
+
+    def url(self, name):
+        staged, remote_name = self._remote_name(name)
+        return self.local.url(name) if staged else self.remote.url(remote_name)
+
+    def exists(self, name):
+        staged, remote_name = self._remote_name(name)
+        return self.local.exists(name) or (not staged and self.remote.exists(remote_name))
+
+    def size(self, name):
+        staged, remote_name = self._remote_name(name)
+        return self.local.size(name) if staged else self.remote.size(remote_name)
+
+    def delete(self, name):
+        """
+        Remove nothing. Names follow content, so rows that never shared a
+        file can still hold the same name, and the row asking for the delete
+        still holds it too. sweep_media purges names no row references.
+        """
+
+    def purge(self, name):
+        """Remove `name` from staging and, unless another name shares its copy, from the remote."""
+        from .models import StoredFile
+
+        staged, remote_name = self._remote_name(name)
+        self.local.delete(name)
+        # content-hash dedup may have pointed other names at the same remote file
+        shared = StoredFile.objects.filter(remote_name=remote_name).exclude(name=name).exists()
+        if not staged and not shared:
+            self.remote.delete(remote_name)
+        StoredFile.objects.filter(name=name).delete()
+        self._remote_names.pop(name)
+
+
+def file_fields():
+    """(model, field name) of every file field saved through an OffloadStorage."""
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, models.FileField) and isinstance(field.storage, OffloadStorage)
+    ]
+
+
+def referenced(names):
+    """The subset of `names` that some row's file field still holds."""
+    found = set()
+    for model, field in file_fields():
+        found.update(model._default_manager.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+    return found
@@ -0,0 +1,230 @@
+import asyncio
+import os
+import tempfile
+from datetime import timedelta
+from functools import partial
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.http import Http404
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from pins.models import ImageVariant
+
+from .asgi import FlowControl, MediaFiles
+from .media import BLOCK_SIZE, MAX_RANGES, MediaFile, parse_ranges
+from .models import StoredFile
+from .storage import LRU, OffloadStorage
+
+
+class OffloadStorageTests(TestCase):
+    def setUp(self):
+        self.storage = OffloadStorage()
+
+    def save(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.storage.save(name, ContentFile(content))
+
+    def test_names_follow_content(self):
+        first = self.save('pins/images/a.JPG', b'same bytes')
+        second = self.save('pins/images/b.jpg', b'same bytes')
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^pins/images/[0-9a-f]{40}\.jpg$')
+        self.assertEqual(StoredFile.objects.count(), 1)
+
+    def test_replicates_and_drops_the_staged_copy(self):
+        name = self.save('pins/images/a.png', b'png bytes')
+        record = StoredFile.objects.get(name=name)
+        self.assertEqual(record.status, StoredFile.Status.DONE)
+        self.assertFalse(self.storage.local.exists(name))
+        self.assertTrue(self.storage.remote.exists(record.remote_name))
+        self.assertEqual(self.storage.url(name), self.storage.remote.url(record.remote_name))
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'png bytes')
+
+    def test_failed_uploads_stay_staged_and_served_locally(self):
+        with mock.patch.object(self.storage.remote, 'save', side_effect=OSError('down')), \
+                self.assertLogs('offload.storage', 'WARNING'):
+            name = self.save('pins/images/a.png', b'unlucky')
+        self.assertEqual(StoredFile.objects.get(name=name).status, StoredFile.Status.FAILED)
+        self.assertTrue(self.storage.url(name).startswith('/media/pending/'))
+        self.assertTrue(self.storage.replicate(name))
+        self.assertFalse(self.storage.url(name).startswith('/media/pending/'))
+
+    def test_prime_resolves_a_batch_in_one_query(self):
+        names = [self.save(f'pins/images/{i}.png', f'image {i}'.encode()) for i in range(5)]
+        storage = OffloadStorage()
+        with self.assertNumQueries(1):
+            storage.prime(names + ['legacy/plain-name.png'])
+        with self.assertNumQueries(0):
+            urls = [storage.url(name) for name in names]
+        self.assertEqual(urls, [self.storage.url(name) for name in names])
+
+    def test_delete_leaves_shared_files(self):
+        name = self.save('pins/images/a.png', b'shared bytes')
+        # a second row saving the same bytes gets the same name
+        self.assertEqual(self.save('pins/images/b.png', b'shared bytes'), name)
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_purge_forgets_the_name(self):
+        name = self.save('pins/images/a.png', b'short lived')
+        remote_name = StoredFile.objects.get(name=name).remote_name
+        self.storage.url(name)
+        self.storage.purge(name)
+        self.assertFalse(self.storage.remote.exists(remote_name))
+        self.assertFalse(self.storage.exists(name))
+
+    def test_sweep_deletes_only_unreferenced_files(self):
+        kept, dropped, recent = (self.save(f'pins/images/{i}.png', f'swept {i}'.encode()) for i in range(3))
+        ImageVariant.objects.create(source='pins/images/x.png', format='webp', width=10, height=10, file=kept)
+        StoredFile.objects.exclude(name=recent).update(created_at=timezone.now() - timedelta(days=2))
+        out = StringIO()
+        with mock.patch('offload.management.commands.sweep_media.default_storage', self.storage):
+            call_command('sweep_media', stdout=out)
+        self.assertIn('Deleted 1 of 2', out.getvalue())
+        self.assertEqual(set(StoredFile.objects.values_list('name', flat=True)), {kept, recent})
+        self.assertTrue(self.storage.exists(kept))
+        self.assertFalse(self.storage.exists(dropped))
+
+    def test_default_storage_is_offloaded(self):
+        self.assertTrue(hasattr(default_storage, 'prime'))
+
+
+class LRUTests(TestCase):
+    def test_forgets_least_recently_used(self):
+        names = LRU(2)
+        names.set('a', 1)
+        names.set('b', 2)
+        names.get('a')
+        names.set('c', 3)
+        self.assertEqual((names.get('a'), names.get('b'), names.get('c')), (1, None, 3))
+        names.pop('a')
+        self.assertIsNone(names.get('a'))
+
+
+class RangeParsingTests(SimpleTestCase):
+    def test_single_and_suffix_ranges(self):
+        self.assertEqual(parse_ranges('bytes=0-9', 100), [(0, 10)])
+        self.assertEqual(parse_ranges('bytes=90-', 100), [(90, 100)])
+        self.assertEqual(parse_ranges('bytes=-10', 100), [(90, 100)])
+        self.assertEqual(parse_ranges('bytes=50-500', 100), [(50, 100)])
+
+    def test_overlapping_ranges_merge(self):
+        self.assertEqual(parse_ranges('bytes=0-9, 5-19, 40-49', 100), [(0, 20), (40, 50)])
+        self.assertEqual(parse_ranges('bytes=10-19,0-9', 100), [(0, 20)])
+
+    def test_unsatisfiable_and_ignored(self):
+        self.assertEqual(parse_ranges('bytes=100-', 100), [])
+        self.assertEqual(parse_ranges('bytes=-0', 100), [])
+        self.assertIsNone(parse_ranges('items=0-1', 100))
+        self.assertIsNone(parse_ranges('bytes=9-0', 100))
+        self.assertIsNone(parse_ranges('bytes=a-b', 100))
+        self.assertIsNone(parse_ranges('bytes=' + ','.join(f'{i * 2}-{i * 2}' for i in range(MAX_RANGES + 1)), 100))
+
+
+class MediaFileTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.data = bytes(range(256)) * 4
+        with open(os.path.join(self.root, 'clip.mp4'), 'wb') as clip:
+            clip.write(self.data)
+
+    def reply(self, method='GET', **headers):
+        media = MediaFile(self.root, 'clip.mp4')
+        reply = media.reply(method, headers)
+        return reply, b''.join(media.chunks(reply.parts))
+
+    def test_whole_file(self):
+        reply, body = self.reply()
+        self.assertEqual((reply.status, body), (200, self.data))
+        self.assertEqual(reply.headers['Content-Length'], str(len(self.data)))
+        self.assertEqual(reply.headers['Content-Type'], 'video/mp4')
+
+    def test_single_range(self):
+        reply, body = self.reply(range='bytes=10-19')
+        self.assertEqual((reply.status, body), (206, self.data[10:20]))
+        self.assertEqual(reply.headers['Content-Range'], f'bytes 10-19/{len(self.data)}')
+
+    def test_multiple_ranges(self):
+        reply, body = self.reply(range='bytes=0-1,100-101')
+        self.assertEqual(reply.status, 206)
+        self.assertTrue(reply.headers['Content-Type'].startswith('multipart/byteranges; boundary='))
+        self.assertIn(self.data[0:2], body)
+        self.assertIn(self.data[100:102], body)
+        self.assertEqual(reply.headers['Content-Length'], str(len(body)))
+
+    def test_unsatisfiable_range(self):
+        reply, body = self.reply(range='bytes=5000-')
+        self.assertEqual((reply.status, body), (416, b''))
+
+    def test_validators(self):
+        etag = self.reply()[0].headers['ETag']
+        self.assertEqual(self.reply(**{'if-none-match': etag})[0].status, 304)
+        self.assertEqual(self.reply(range='bytes=0-0', **{'if-range': '"stale"'})[0].status, 200)
+        self.assertEqual(self.reply(range='bytes=0-0', **{'if-range': etag})[0].status, 206)
+
+    def test_head_has_no_body(self):
+        reply, body = self.reply('HEAD')
+        self.assertEqual((reply.status, body), (200, b''))
+        self.assertEqual(reply.headers['Content-Length'], str(len(self.data)))
+
+    def test_stays_under_the_root(self):
+        with self.assertRaises(Http404):
+            MediaFile(self.root, '../clip.mp4')
+        with self.assertRaises(Http404):
+            MediaFile(self.root, '')
+
+
+class MediaFilesASGITests(SimpleTestCase):
+    def setUp(self):
+        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+        # three blocks, so a paused send holds the rest back
+        self.data = b'0123456789' * (BLOCK_SIZE // 5 + 1)
+        with open(os.path.join(settings.MEDIA_ROOT, 'asgi.txt'), 'wb') as media:
+            media.write(self.data)
+        self.app = MediaFiles(mock.AsyncMock())
+
+    async def get(self, send, **headers):
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/media/asgi.txt',
+            'headers': [(name.encode(), value.encode()) for name, value in headers.items()],
+        }
+        await self.app(scope, mock.AsyncMock(), send)
+
+    async def test_serves_ranges_ahead_of_django(self):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        with self.assertLogs('offload.asgi', 'WARNING'):
+            FlowControl.warned = False
+            await self.get(send, range='bytes=10-29')
+        self.assertEqual(messages[0]['status'], 206)
+        self.assertEqual(b''.join(message.get('body', b'') for message in messages[1:]), self.data[10:30])
+        self.app.application.assert_not_called()
+
+    async def test_pauses_while_daphne_is_backed_up(self):
+        request = mock.Mock(channel=object(), producer=None)
+        request.registerProducer.side_effect = lambda producer, streaming: setattr(request, 'producer', producer)
+        sent = []
+
+        async def handle_reply(request, message):
+            sent.append(message)
+            if message['type'] == 'http.response.body' and message.get('more_body'):
+                request.producer.pauseProducing()
+
+        serving = asyncio.ensure_future(self.get(partial(handle_reply, request)))
+        for _ in range(2):
+            await asyncio.sleep(0.05)
+            self.assertFalse(serving.done())
+            request.producer.resumeProducing()
+        await asyncio.wait_for(serving, 2)
+        self.assertEqual(b''.join(message.get('body', b'') for message in sent[1:]), self.data)
+        request.unregisterProducer.assert_called_once()
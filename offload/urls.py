@@ -0,0 +1,11 @@
+import re
+
+from django.urls import re_path
+
+from .media import mounts, serve
+
+# files waiting to be replicated, and MEDIA_ROOT when MEDIA_SERVE_LOCAL is set
+urlpatterns = [
+    re_path(rf'^{re.escape(prefix.strip("/"))}/(?P<path>.*)$', serve, {'document_root': root}, name=name)
+    for (prefix, root), name in zip(mounts(), ['pending-media', 'local-media'])
+]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Pin, Comment, CommentReplies, SavePins, LikePins
+from .models import Pin, Comment, CommentReplies, SavePins, LikePins, FeedItem, ImageVariant, VideoUpload
 # Register your models here.
 
 admin.site.register(Pin)
@@ -7,3 +7,6 @@ admin.site.register(Comment)
 admin.site.register(CommentReplies)
 admin.site.register(SavePins)
 admin.site.register(LikePins)
+admin.site.register(FeedItem)
+admin.site.register(ImageVariant)
+admin.site.register(VideoUpload)
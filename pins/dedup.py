@@ -0,0 +1,136 @@
+"""
+Near-duplicate pin images.
+
+Every uploaded image gets a 64-bit difference hash (dHash): the image is
+shrunk to 9x8 greys and each bit says whether a pixel is brighter than its
+right-hand neighbour, so re-encodes, resizes and light edits of one picture
+land a few bits apart.
+
+Hashes are searched with multi-index hashing: the hash is also stored as
+four 16-bit chunks, each in its own indexed column. Two hashes within
+Hamming distance d have at least one chunk within d // 4 bits of each other,
+so the candidates are the pins matching one of the few chunk values near the
+query's, found with indexed IN lookups instead of a scan of every hash, and
+only those are compared bit by bit.
+"""
+from itertools import combinations
+
+from django.conf import settings
+from django.db.models import Q
+from PIL import Image
+
+from .models import Pin
+
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+# beyond this, the chunk neighbourhoods get too wide for an IN lookup to beat a scan
+MAX_DISTANCE = 11
+DESCRIBED_FIELDS = [
+    'width', 'height', 'dominant_color', 'blurhash', 'image_hash',
+    *(f'image_hash_{i}' for i in range(CHUNKS)),
+]
+
+
+def duplicate_distance():
+    return getattr(settings, 'PIN_DUPLICATE_DISTANCE', 6)
+
+
+def upload_dedup():
+    return getattr(settings, 'PIN_UPLOAD_DEDUP', False)
+
+
+def upload_dedup_distance():
+    return getattr(settings, 'PIN_UPLOAD_DEDUP_DISTANCE', 2)
+
+
+def dhash(image):
+    """The unsigned 64-bit difference hash of a Pillow image."""
+    grey = image.convert('L').resize((9, 8), Image.LANCZOS).tobytes()
+    value = 0
+    for row in range(8):
+        for x in range(8):
+            value = (value << 1) | (grey[row * 9 + x] > grey[row * 9 + x + 1])
+    return value
+
+
+def chunks(value):
+    return [(value >> (CHUNK_BITS * i)) & ((1 << CHUNK_BITS) - 1) for i in range(CHUNKS)]
+
+
+def hash_fields(value):
+    """The Pin column values for an unsigned hash; image_hash is stored as a signed bigint."""
+    fields = {'image_hash': value - (1 << 64) if value >= 1 << 63 else value}
+    fields.update({f'image_hash_{i}': chunk for i, chunk in enumerate(chunks(value))})
+    return fields
+
+
+def unsigned(stored):
+    return stored + (1 << 64) if stored < 0 else stored
+
+
+def distance(a, b):
+    return bin(unsigned(a) ^ unsigned(b)).count('1')
+
+
+def _neighbours(chunk, radius):
+    """Every CHUNK_BITS-bit value within `radius` bits of `chunk`."""
+    values = []
+    for flipped in range(radius + 1):
+        for bits in combinations(range(CHUNK_BITS), flipped):
+            value = chunk
+            for bit in bits:
+                value ^= 1 << bit
+            values.append(value)
+    return values
+
+
+def near(stored_hash, max_distance, queryset=None):
+    """
+    [(pin_id, distance)] of pins in `queryset` whose image hash is within
+    `max_distance` of `stored_hash`, nearest first.
+    """
+    max_distance = min(max_distance, MAX_DISTANCE)
+    radius = max_distance // CHUNKS
+    condition = Q()
+    for i, chunk in enumerate(chunks(unsigned(stored_hash))):
+        condition |= Q(**{f'image_hash_{i}__in': _neighbours(chunk, radius)})
+    queryset = Pin.objects.all() if queryset is None else queryset
+    matches = [
+        (pin_id, distance(stored_hash, other))
+        for pin_id, other in queryset.filter(condition).values_list('pk', 'image_hash')
+    ]
+    return sorted([match for match in matches if match[1] <= max_distance], key=lambda match: (match[1], match[0]))
+
+
+def duplicates_of(pin, max_distance=None):
+    """[(pin_id, distance)] of the other pins whose image looks like `pin`'s."""
+    if pin.image_hash is None:
+        return []
+    max_distance = duplicate_distance() if max_distance is None else max_distance
+    return near(pin.image_hash, max_distance, Pin.objects.exclude(pk=pin.pk))
+
+
+def reuse_duplicate(pin):
+    """
+    Point an uploading pin at the stored file of an existing near-identical
+    image, so the same picture is not stored again. Only a copy at least as
+    wide as the upload is reused. Returns whether the upload was replaced.
+    """
+    if pin.image_hash is None:
+        return False
+    others = Pin.objects.exclude(image='')
+    if pin.pk is not None:
+        others = others.exclude(pk=pin.pk)
+    matches = near(pin.image_hash, upload_dedup_distance(), others)
+    if not matches:
+        return False
+    candidates = Pin.objects.filter(pk__in=[pin_id for pin_id, _ in matches], width__gte=pin.width or 0)
+    found = {row['pk']: row for row in candidates.values('pk', 'image', *DESCRIBED_FIELDS)}
+    for pin_id, _ in matches:
+        if pin_id in found:
+            # take the stored copy's own description along with its file
+            for field, value in found[pin_id].items():
+                if field != 'pk':
+                    setattr(pin, field, value)
+            return True
+    return False
@@ -0,0 +1,106 @@
+"""
+Home feed maintenance.
+
+Pins are fanned out on write into each follower's FeedItem rows. Authors
+with more than FEED_FANOUT_LIMIT followers are skipped on write; their pins
+are merged in on read straight from the pin table instead, so one upload
+never turns into millions of inserts.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+
+from accounts.models import Follow, User
+from .models import FeedItem, Pin
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def fanout_limit():
+    return getattr(settings, 'FEED_FANOUT_LIMIT', 10000)
+
+
+def backfill_size():
+    return getattr(settings, 'FEED_BACKFILL_SIZE', 50)
+
+
+def _followers_count(user_id):
+    # read fresh: in-memory instances miss the F() updates from accounts.signals
+    return User.objects.filter(pk=user_id).values_list('followers_count', flat=True).first() or 0
+
+
+def _insert(user_ids, pins):
+    rows = (
+        FeedItem(user_id=user_id, pin_id=pin.pk, date_created=pin.date_created)
+        for user_id in user_ids for pin in pins
+    )
+    while True:
+        batch = list(islice(rows, FANOUT_BATCH_SIZE))
+        if not batch:
+            break
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(pin):
+    """Push a new pin into its author's feed and, for regular accounts, every follower's."""
+    user_ids = [pin.user_id]
+    if _followers_count(pin.user_id) <= fanout_limit():
+        followers = Follow.objects.filter(followed_user_id=pin.user_id)
+        user_ids.extend(followers.values_list('follower_id', flat=True).iterator(chunk_size=FANOUT_BATCH_SIZE))
+    _insert(user_ids, [pin])
+
+
+def follow(follower_id, followed_user_id):
+    """Seed a new follower's feed with the followed account's latest pins."""
+    if _followers_count(followed_user_id) > fanout_limit():
+        return
+    pins = Pin.objects.filter(user_id=followed_user_id).only('pk', 'date_created')
+    _insert([follower_id], list(pins.order_by('-date_created', '-id')[:backfill_size()]))
+
+
+def unfollow(follower_id, followed_user_id):
+    FeedItem.objects.filter(user_id=follower_id, pin__user_id=followed_user_id).delete()
+
+
+def _after(date_field, id_field, position):
+    if position is None:
+        return Q()
+    created, pk = position
+    return Q(**{f'{date_field}__lt': created}) | Q(**{date_field: created, f'{id_field}__lt': pk})
+
+
+def read(user, position=None, limit=20):
+    """
+    Return up to `limit` (date_created, pin_id) pairs of `user`'s feed, newest
+    first, strictly after `position`.
+    """
+    materialized = (
+        FeedItem.objects.filter(user=user)
+        .filter(_after('date_created', 'pin_id', position))
+        .order_by('-date_created', '-pin_id')
+        .values_list('date_created', 'pin_id')[:limit]
+    )
+    streams = [list(materialized)]
+
+    celebrities = Follow.objects.filter(
+        follower=user, followed_user__followers_count__gt=fanout_limit()
+    ).values('followed_user')
+    if celebrities.exists():
+        pulled = (
+            Pin.objects.filter(user__in=celebrities)
+            .filter(_after('date_created', 'id', position))
+            .order_by('-date_created', '-id')
+            .values_list('date_created', 'id')[:limit]
+        )
+        streams.append(list(pulled))
+
+    entries, seen = [], set()
+    for created, pin_id in heapq.merge(*streams, reverse=True):
+        if pin_id not in seen:
+            seen.add(pin_id)
+            entries.append((created, pin_id))
+        if len(entries) == limit:
+            break
+    return entries
@@ -1,11 +1,21 @@
 from django_filters import rest_framework as filters
 from .models import Pin, Board
+from .search import search_pins
 
 class PinFilter(filters.FilterSet):
-    title = filters.CharFilter(field_name='title', lookup_expr='icontains')
-    # description = filters.CharFilter(field_name='description', lookup_expr='icontains')
+    title = filters.CharFilter(method='search_title')
+    description = filters.CharFilter(method='search_description')
+    search = filters.CharFilter(method='search_all')
     
     class Meta:
         model = Pin
-        fields = ['title']
+        fields = ['title', 'description', 'search']
 
+    def search_title(self, queryset, name, value):
+        return search_pins(queryset, value, fields=('title',))
+
+    def search_description(self, queryset, name, value):
+        return search_pins(queryset, value, fields=('description',))
+
+    def search_all(self, queryset, name, value):
+        return search_pins(queryset, value)
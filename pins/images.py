@@ -0,0 +1,356 @@
+"""
+Responsive image variants.
+
+When a Pin.image or Board.cover is uploaded, the original is re-encoded as
+WebP and JPEG at each width in IMAGE_VARIANT_WIDTHS that is narrower than
+the original (the original's own width is used when it is narrower than all
+of them). EXIF orientation is applied and all metadata is dropped. Every
+variant is saved next to the original under `variants/` and recorded as an
+ImageVariant row.
+
+Decoding and resizing run in a process pool of IMAGE_VARIANT_WORKERS
+processes after the upload's transaction commits, so the request never waits
+on Pillow. Storing the results happens on a small thread pool in the web
+process. With IMAGE_VARIANT_WORKERS = 0 everything runs inline, which is
+what the tests and management commands use.
+
+`describe` reads the layout hints stored on Pin itself (oriented size,
+dominant colour, a BlurHash placeholder and the dHash of pins.dedup) from a
+draft-mode decode. An upload is described while it is being saved, on the
+request thread, because upload dedup needs its dHash before the file is
+stored. That is only cheap for a JPEG, whose draft decode skips most of the
+work, or a small image. When even the draft decode would exceed
+IMAGE_DESCRIBE_MAX_PIXELS, only the oriented size is read from the header
+then. The rest is computed after commit, in the same pools as the variants,
+and that upload skips dedup.
+"""
+import functools
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import ExifTags, Image, ImageOps
+from rest_framework import serializers
+
+from boards.models import Board
+from DreamBoard.cache import bump_version
+from . import blurhash, dedup, signals, similar
+from .models import ImageVariant, Pin
+
+logger = logging.getLogger(__name__)
+
+FORMATS = (('webp', 'WEBP', 'image/webp'), ('jpeg', 'JPEG', 'image/jpeg'))
+QUALITY = 80
+# side of the thumbnail the dominant colour and BlurHash are computed from
+SAMPLE_SIZE = 32
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def widths():
+    return tuple(getattr(settings, 'IMAGE_VARIANT_WIDTHS', (236, 474, 736, 1200)))
+
+
+def workers():
+    return getattr(settings, 'IMAGE_VARIANT_WORKERS', 2)
+
+
+def describe_max_pixels():
+    return getattr(settings, 'IMAGE_DESCRIBE_MAX_PIXELS', 4000000)
+
+
+def _pool(kind):
+    with _pools_lock:
+        if kind not in _pools:
+            _pools[kind] = ProcessPoolExecutor(workers()) if kind == 'render' else ThreadPoolExecutor(2)
+        return _pools[kind]
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _flatten(image):
+    """`image` as RGB, with any transparency laid over white."""
+    if image.mode == 'RGB':
+        return image
+    if not _has_alpha(image):
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    flat = Image.new('RGB', image.size, 'white')
+    flat.paste(image, mask=image.getchannel('A'))
+    return flat
+
+
+def render_variants(data, ladder):
+    """
+    Decode image bytes and return [(format, width, height, bytes)] for every
+    rung of `ladder`. Pure function of its arguments, so it can run in a
+    worker process.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+
+    rungs = [width for width in ladder if width < image.width] or [image.width]
+    results = []
+    for width in rungs:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+        for name, pillow_format, _ in FORMATS:
+            frame = _flatten(resized) if pillow_format == 'JPEG' else resized
+            out = io.BytesIO()
+            # no exif= or icc_profile= arguments, so nothing but pixels is written
+            if pillow_format == 'JPEG':
+                frame.save(out, 'JPEG', quality=QUALITY, optimize=True, progressive=True)
+            else:
+                frame.save(out, 'WEBP', quality=QUALITY, method=4)
+            results.append((name, width, height, out.getvalue()))
+    return results
+
+
+def load_sample(data, max_pixels=None):
+    """
+    (width, height, sample) of image bytes or an open file: the size as
+    displayed (after EXIF orientation) and an RGB thumbnail at most
+    SAMPLE_SIZE a side. JPEGs are decoded in draft mode, at an eighth of
+    their size or less; other formats are decoded whole. If that decode
+    would exceed `max_pixels`, only the header is read and sample is None.
+    """
+    with Image.open(io.BytesIO(data) if isinstance(data, bytes) else data) as original:
+        width, height = original.size
+        if original.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+            width, height = height, width
+        original.draft('RGB', (SAMPLE_SIZE * 2, SAMPLE_SIZE * 2))
+        if max_pixels is not None and original.size[0] * original.size[1] > max_pixels:
+            return width, height, None
+        sample = _flatten(ImageOps.exif_transpose(original))
+    sample.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+    return width, height, sample
+
+
+def describe_sample(width, height, sample):
+    """The Pin columns {'width', 'height', 'dominant_color', 'blurhash', 'image_hash', ...} of a sample."""
+    quantized = sample.quantize(colors=5)
+    _, index = max(quantized.getcolors())
+    r, g, b = quantized.getpalette()[index * 3:index * 3 + 3]
+    return {
+        'width': width,
+        'height': height,
+        'dominant_color': f'#{r:02x}{g:02x}{b:02x}',
+        'blurhash': blurhash.encode(sample),
+        **dedup.hash_fields(dedup.dhash(sample)),
+    }
+
+
+def describe(data):
+    """describe_sample of image bytes. Pure function, like render_variants."""
+    return describe_sample(*load_sample(data))
+
+
+def image_vector(data):
+    """The pins.similar feature vector of image bytes. Pure function, like render_variants."""
+    return similar.features(load_sample(data)[2])
+
+
+def analyse(data):
+    """(describe, image_vector) of image bytes from a single decode. Pure function, like render_variants."""
+    width, height, sample = load_sample(data)
+    return describe_sample(width, height, sample), similar.features(sample)
+
+
+def read_bytes(fieldfile):
+    """The stored file's content, or None if it cannot be read."""
+    try:
+        with fieldfile.open('rb') as f:
+            return f.read()
+    except Exception:
+        return None
+
+
+def describe_pin(pin):
+    """
+    Set the layout hints of `pin` from its image file, without saving it, and
+    keep its similarity vector on `pin.image_vector` for pins.signals to index.
+    The upload is read in place, not copied. An image too large to sample
+    within describe_max_pixels() gets only its size, and
+    `pin.describe_later` is set so that pins.signals schedules
+    describe_later() for the rest.
+    """
+    try:
+        pin.image.open('rb')
+        width, height, sample = load_sample(pin.image, describe_max_pixels())
+        pin.image.seek(0)
+        pin.width, pin.height = width, height
+        if sample is None:
+            pin.describe_later = True
+            return
+        for field, value in describe_sample(width, height, sample).items():
+            setattr(pin, field, value)
+        pin.image_vector = similar.features(sample)
+    except Exception:
+        logger.exception("Could not read the dimensions of %s", pin.image.name)
+
+
+def store_description(pin_id, source, analysed):
+    """Save analyse()'s hints and vector for `pin_id`, unless its image has been replaced since."""
+    fields, vector = analysed
+    with transaction.atomic():
+        if not Pin.objects.filter(pk=pin_id, image=source).update(**fields, updated_at=timezone.now()):
+            return
+        signals.invalidate_pins(pin_id)
+    similar.get_index().append([(pin_id, vector)])
+
+
+def describe_later(pin_id, fieldfile):
+    """Finish describing a large upload, in the process pool unless it is disabled."""
+    _offload(fieldfile, analyse, functools.partial(store_description, pin_id), "describe")
+
+
+def variant_name(source, width, fmt):
+    directory, filename = os.path.split(source)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', f'{stem}_{width}w.{fmt}').replace(os.sep, '/')
+
+
+def store_variants(fieldfile, source, rendered):
+    """Save rendered variants of `source` to `fieldfile`'s storage and replace its ImageVariant rows."""
+    storage = fieldfile.storage
+    rows = []
+    for fmt, width, height, data in rendered:
+        name = storage.save(variant_name(source, width, fmt), ContentFile(data))
+        rows.append(ImageVariant(source=source, format=fmt, width=width, height=height, file=name))
+    with transaction.atomic():
+        ImageVariant.objects.filter(source=source).delete()
+        ImageVariant.objects.bulk_create(rows)
+    # cached renders of whatever shows this image were made without its variants
+    signals.invalidate_pins(*Pin.objects.filter(image=source).values_list('pk', flat=True))
+    bump_version('board', *Board.objects.filter(cover=source).values_list('pk', flat=True))
+
+
+def _offload(fieldfile, render, store, task):
+    """
+    Read `fieldfile`, run `render(data)` in the process pool and hand the
+    result to `store(source, result)` on the store thread pool; both run
+    inline when IMAGE_VARIANT_WORKERS is 0. Failures are logged as "Could
+    not <task> <source>".
+    """
+    source = fieldfile.name
+    try:
+        with fieldfile.open('rb') as f:
+            data = f.read()
+        if not workers():
+            store(source, render(data))
+            return
+    except Exception:
+        # a missing or undecodable upload keeps serving what it has
+        logger.exception("Could not %s %s", task, source)
+        return
+
+    def rendered(future):
+        def run():
+            try:
+                store(source, future.result())
+            except Exception:
+                logger.exception("Could not %s %s", task, source)
+            finally:
+                connection.close()
+        _pool('store').submit(run)
+
+    _pool('render').submit(render, data).add_done_callback(rendered)
+
+
+def generate_variants(fieldfile):
+    """Build the variant ladder for an uploaded image, in the process pool unless it is disabled."""
+    render = functools.partial(render_variants, ladder=widths())
+    _offload(fieldfile, render, functools.partial(store_variants, fieldfile), "build image variants for")
+
+
+def schedule_variants(fieldfile):
+    """Build variants for `fieldfile` once the current transaction commits, unless they exist already."""
+    if not fieldfile or ImageVariant.objects.filter(source=fieldfile.name).exists():
+        return
+    transaction.on_commit(lambda: generate_variants(fieldfile))
+
+
+class VariantIndex:
+    """
+    ImageVariant rows by source, loaded with one IN query per batch of
+    images. Storages that look file locations up (offload.storage) get the
+    batch's file names in one `prime()` call too, so rendering their URLs
+    costs no query per file.
+    """
+
+    def __init__(self):
+        self.by_source = {}
+        self.files = set()
+
+    def prime(self, sources):
+        missing = {source for source in sources if source and source not in self.by_source}
+        if not missing:
+            return
+        for source in missing:
+            self.by_source[source] = []
+        names = list(missing)
+        for variant in ImageVariant.objects.filter(source__in=missing).order_by('width'):
+            self.by_source[variant.source].append(variant)
+            names.append(variant.file.name)
+        self.prime_files(names)
+
+    def prime_files(self, names):
+        """Resolve the storage locations of `names` not seen by this render yet."""
+        missing = {name for name in names if name and name not in self.files}
+        if not missing:
+            return
+        self.files |= missing
+        storage = ImageVariant._meta.get_field('file').storage
+        if hasattr(storage, 'prime'):
+            storage.prime(missing)
+
+    def get(self, source):
+        self.prime([source])
+        return self.by_source[source]
+
+
+def variant_index_for(context):
+    """The VariantIndex shared by every serializer of one render."""
+    if 'image_variants' not in context:
+        context['image_variants'] = VariantIndex()
+    return context['image_variants']
+
+
+class ImageSetField(serializers.Field):
+    """
+    Renders an image field as `srcset` strings per format, e.g.
+    {"webp": "https://.../a_236w.webp 236w, https://.../a_474w.webp 474w", "jpeg": "...",
+     "sizes": [[236, 354], [474, 711]]}, or None until the variants are built.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        variants = variant_index_for(self.context).get(value.name)
+        if not variants:
+            return None
+        request = self.context.get('request')
+        url = value.storage.url
+        if request is not None:
+            url = lambda name: request.build_absolute_uri(value.storage.url(name))
+        images = {
+            fmt: ', '.join(f'{url(v.file.name)} {v.width}w' for v in variants if v.format == fmt)
+            for fmt, _, _ in FORMATS
+        }
+        images['sizes'] = sorted({(v.width, v.height) for v in variants})
+        return images
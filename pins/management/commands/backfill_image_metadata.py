@@ -0,0 +1,73 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from pins import images, signals
+from pins.dedup import DESCRIBED_FIELDS
+from pins.models import Pin
+
+
+def _safe_describe(data):
+    try:
+        return images.describe(data)
+    except Exception:
+        return None
+
+
+class Command(BaseCommand):
+    help = "Store the size, dominant colour, BlurHash and dHash of pin images uploaded before they were recorded."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help="Number of pins read, described and written per batch.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Processes decoding images (default: one per CPU; 0 decodes inline).")
+        parser.add_argument('--all', action='store_true',
+                            help="Recompute pins that already have metadata too.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pins = Pin.objects.exclude(image='').order_by('pk').only('pk', 'image')
+        if not options['all']:
+            pins = pins.filter(Q(width__isnull=True) | Q(image_hash__isnull=True))
+
+        workers = options['workers']
+        pool = ProcessPoolExecutor(workers) if workers != 0 else None
+        readers = ThreadPoolExecutor(8)
+        describe = pool.map if pool is not None else map
+        updated = failed = 0
+        last_id = 0
+        try:
+            while True:
+                batch = list(pins.filter(pk__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                last_id = batch[-1].pk
+
+                # storage reads are I/O bound and decoding is CPU bound, so each gets its own pool
+                loaded = [(pin, data) for pin, data in zip(batch, readers.map(images.read_bytes, [pin.image for pin in batch])) if data is not None]
+                failed += len(batch) - len(loaded)
+                described = []
+                for (pin, _), metadata in zip(loaded, describe(_safe_describe, [data for _, data in loaded])):
+                    if metadata is None:
+                        failed += 1
+                        continue
+                    for field, value in metadata.items():
+                        setattr(pin, field, value)
+                    pin.updated_at = timezone.now()
+                    described.append(pin)
+
+                with transaction.atomic():
+                    Pin.objects.bulk_update(described, DESCRIBED_FIELDS + ['updated_at'])
+                    signals.invalidate_pins(*(pin.pk for pin in described))
+                updated += len(described)
+                self.stdout.write(f"Described {updated} pins so far.")
+        finally:
+            readers.shutdown()
+            if pool is not None:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f"Stored image metadata on {updated} pins ({failed} unreadable)."))
@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from pins import images, similar
+from pins.models import Pin
+
+
+def _safe_vector(data):
+    try:
+        return images.image_vector(data)
+    except Exception:
+        return None
+
+
+class Command(BaseCommand):
+    help = "Rebuild the memory-mapped image vector index behind /api/pins/<id>/similar/ from the stored images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Number of pins read and described per batch.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Processes decoding images (default: one per CPU; 0 decodes inline).")
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.indexed = self.failed = 0
+        workers = options['workers']
+        pool = ProcessPoolExecutor(workers) if workers != 0 else None
+        readers = ThreadPoolExecutor(8)
+        try:
+            similar.get_index().rebuild(self.vectors(pool.map if pool is not None else map, readers))
+        finally:
+            readers.shutdown()
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {self.indexed} pin images ({self.failed} unreadable)."))
+
+    def vectors(self, describe, readers):
+        pins = Pin.objects.exclude(image='').order_by('pk').only('pk', 'image')
+        last_id = 0
+        while True:
+            batch = list(pins.filter(pk__gt=last_id)[:self.batch_size])
+            if not batch:
+                return
+            last_id = batch[-1].pk
+            # storage reads are I/O bound and decoding is CPU bound, so each gets its own pool
+            contents = list(readers.map(images.read_bytes, [pin.image for pin in batch]))
+            loaded = [(pin, data) for pin, data in zip(batch, contents) if data is not None]
+            for (pin, _), vector in zip(loaded, describe(_safe_vector, [data for _, data in loaded])):
+                if vector is None:
+                    self.failed += 1
+                    continue
+                self.indexed += 1
+                yield pin.pk, vector
+            self.failed += len(batch) - len(loaded)
+            self.stdout.write(f"Indexed {self.indexed} pins so far.")
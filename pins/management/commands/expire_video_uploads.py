@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from pins import uploads
+
+
+class Command(BaseCommand):
+    help = "Delete resumable video uploads left unfinished, with their staged chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24,
+                            help="Expire uploads that have not received data for this many hours.")
+
+    def handle(self, *args, **options):
+        expired = uploads.expire(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} video uploads."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from DreamBoard.counters import count_for
+from pins.models import Pin, Comment, SavePins
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized likes/saves/comments counters on pins to repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Number of pin ids recomputed per UPDATE statement.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Pin.objects.aggregate(last=Max('pk'))['last'] or 0
+        updated = 0
+
+        for start in range(0, last_id + 1, batch_size):
+            with transaction.atomic():
+                updated += Pin.objects.filter(pk__gte=start, pk__lt=start + batch_size).update(
+                    likes_count=count_for(Pin.likes.through, 'pin'),
+                    saves_count=count_for(SavePins, 'pin'),
+                    comments_count=count_for(Comment, 'pin'),
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled counters on {updated} pins."))
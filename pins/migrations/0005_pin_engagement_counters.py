@@ -0,0 +1,47 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:23
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Pin = apps.get_model('pins', 'Pin')
+    Comment = apps.get_model('pins', 'Comment')
+    SavePins = apps.get_model('pins', 'SavePins')
+
+    def count_for(model):
+        rows = model.objects.filter(pin=OuterRef('pk')).order_by().values('pin')
+        return Coalesce(Subquery(rows.annotate(total=Count('pk')).values('total')), Value(0))
+
+    Pin.objects.update(
+        likes_count=count_for(Pin.likes.through),
+        saves_count=count_for(SavePins),
+        comments_count=count_for(Comment),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pins', '0004_alter_pin_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pin',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='saves_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0003_board_date_created_board_board_date_created_id_idx'),
+        ('pins', '0005_pin_engagement_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['pin', 'created_date', 'id'], name='comment_pin_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['date_created', 'id'], name='pin_date_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0003_board_date_created_board_board_date_created_id_idx'),
+        ('pins', '0006_comment_comment_pin_created_id_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['user', 'date_created', 'id'], name='pin_user_date_created_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='feeditem',
+            name='pin',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='pins.pin'),
+        ),
+        migrations.AddField(
+            model_name='feeditem',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', 'date_created', 'pin'], name='feeditem_user_date_pin_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='feeditem',
+            unique_together={('user', 'pin')},
+        ),
+    ]
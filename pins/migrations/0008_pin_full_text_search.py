@@ -0,0 +1,73 @@
+from django.db import migrations
+
+from ._fts import create_sqlite_triggers, drop_sqlite_triggers
+
+POSTGRES_FORWARDS = [
+    "ALTER TABLE pins_pin ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION pins_pin_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER pins_pin_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON pins_pin
+    FOR EACH ROW EXECUTE FUNCTION pins_pin_search_vector_update()
+    """,
+    """
+    UPDATE pins_pin SET search_vector =
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    """,
+    "CREATE INDEX pins_pin_search_vector_idx ON pins_pin USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS pins_pin_search_vector_trigger ON pins_pin",
+    "DROP FUNCTION IF EXISTS pins_pin_search_vector_update()",
+    "ALTER TABLE pins_pin DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARDS = [
+    """
+    CREATE VIRTUAL TABLE pins_pin_fts USING fts5(
+        title, description, content='pins_pin', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TABLE IF EXISTS pins_pin_fts",
+]
+
+
+FORWARDS = {'postgresql': POSTGRES_FORWARDS, 'sqlite': SQLITE_FORWARDS}
+BACKWARDS = {'postgresql': POSTGRES_BACKWARDS, 'sqlite': SQLITE_BACKWARDS}
+
+
+def forwards(apps, schema_editor):
+    for statement in FORWARDS.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+    create_sqlite_triggers(schema_editor)
+
+
+def backwards(apps, schema_editor):
+    drop_sqlite_triggers(schema_editor)
+    for statement in BACKWARDS.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pins', '0007_feeditem_pin_pin_user_date_created_id_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pins', '0008_pin_full_text_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0006_boardpin'),
+        ('pins', '0009_comment_updated_at_pin_updated_at'),
+    ]
+
+    operations = [
+        # Pin.board has been folded into boards.BoardPin by boards/0006
+        migrations.RemoveField(
+            model_name='pin',
+            name='board',
+        ),
+    ]
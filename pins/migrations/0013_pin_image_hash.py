@@ -0,0 +1,56 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pins', '0012_pin_image_metadata'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pin',
+            name='image_hash',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='image_hash_0',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='image_hash_1',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='image_hash_2',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='image_hash_3',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['image_hash_0'], name='pin_image_hash_0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['image_hash_1'], name='pin_image_hash_1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['image_hash_2'], name='pin_image_hash_2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['image_hash_3'], name='pin_image_hash_3_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+from ._fts import create_sqlite_triggers
+
+
+def forwards(apps, schema_editor):
+    # 0009 and 0010 rebuilt pins_pin on SQLite, which dropped the FTS triggers 0008 created
+    create_sqlite_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pins', '0014_videoupload'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+"""
+SQLite FTS5 sync triggers for pins_pin_fts, shared by the migrations that
+need them.
+
+SQLite cannot alter most columns in place, so Django rebuilds pins_pin for
+those changes, and the rebuild drops every trigger on the table. Any
+migration that rebuilds pins_pin on SQLite must finish with
+create_sqlite_triggers().
+
+The migration loader skips modules starting with an underscore, so this is
+not a migration itself. It is frozen with the migrations: it must not
+import application code.
+"""
+
+SQLITE_TRIGGERS = {
+    'pins_pin_fts_insert': """
+    CREATE TRIGGER pins_pin_fts_insert AFTER INSERT ON pins_pin BEGIN
+        INSERT INTO pins_pin_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    'pins_pin_fts_delete': """
+    CREATE TRIGGER pins_pin_fts_delete AFTER DELETE ON pins_pin BEGIN
+        INSERT INTO pins_pin_fts(pins_pin_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    'pins_pin_fts_update': """
+    CREATE TRIGGER pins_pin_fts_update AFTER UPDATE OF title, description ON pins_pin BEGIN
+        INSERT INTO pins_pin_fts(pins_pin_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO pins_pin_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+}
+
+
+def create_sqlite_triggers(schema_editor):
+    """(Re)create the FTS sync triggers and rebuild the index from pins_pin; no-op off SQLite."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, statement in SQLITE_TRIGGERS.items():
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        schema_editor.execute(statement)
+    # pins written while the triggers were missing are not in the index yet
+    schema_editor.execute("INSERT INTO pins_pin_fts(pins_pin_fts) VALUES ('rebuild')")
+
+
+def drop_sqlite_triggers(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in SQLITE_TRIGGERS:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
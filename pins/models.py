@@ -5,6 +5,7 @@ from django.utils import timezone
 from boards.models import Board
 from accounts.models import User
 from mimetypes import guess_type
+import uuid
 from django.core.exceptions import ValidationError
 
 
@@ -13,20 +14,41 @@ class Pin(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='pin_user'
     )
-    board = models.ForeignKey(
-        Board, on_delete=models.CASCADE, related_name='pins_set',
-        blank=True,
-        null=True
-    )
     image = models.ImageField(upload_to='pins/images', null=False, blank=True)
     video = models.FileField(upload_to='pins/videos', null=False, blank=True)
+    # layout hints read off the image by pins.images.describe when it is uploaded
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    dominant_color = models.CharField(max_length=7, blank=True, editable=False)
+    blurhash = models.CharField(max_length=64, blank=True, editable=False)
+    # 64-bit dHash of the image (signed) and its four 16-bit chunks, searched by pins.dedup
+    image_hash = models.BigIntegerField(null=True, blank=True, editable=False)
+    image_hash_0 = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_hash_1 = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_hash_2 = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_hash_3 = models.PositiveIntegerField(null=True, blank=True, editable=False)
     title = models.CharField(max_length=250)
     link = models.CharField(max_length=250, null=True, blank=True)
     description = models.TextField()
     date_created = models.DateTimeField(default=timezone.now)
+    # also touched by pins.signals whenever the counters, comments or replies change
+    updated_at = models.DateTimeField(auto_now=True)
     likes = models.ManyToManyField(User, related_name='liked_pins', blank=True)
-    
+    # denormalized engagement counters, kept in sync by pins.signals
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    saves_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
 
+    class Meta:
+        ordering = ['-date_created']
+        indexes = [
+            models.Index(fields=['date_created', 'id'], name='pin_date_created_id_idx'),
+            models.Index(fields=['user', 'date_created', 'id'], name='pin_user_date_created_id_idx'),
+            models.Index(fields=['image_hash_0'], name='pin_image_hash_0_idx'),
+            models.Index(fields=['image_hash_1'], name='pin_image_hash_1_idx'),
+            models.Index(fields=['image_hash_2'], name='pin_image_hash_2_idx'),
+            models.Index(fields=['image_hash_3'], name='pin_image_hash_3_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -69,6 +91,12 @@ class Comment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField(max_length=255, null=False, default='comment on this')
     created_date = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['pin', 'created_date', 'id'], name='comment_pin_created_id_idx'),
+        ]
 
     def __str__(self):
         return f'Comment by {self.user.username} on {self.pin}'
@@ -83,4 +111,70 @@ class CommentReplies(models.Model):
     def __str__(self):
         return f'Reply by {self.user.username} to {self.comment}'
 
-    
+
+class FeedItem(models.Model):
+    """
+    One pin in one user's materialized home feed. `date_created` is copied
+    from the pin so a feed page is a single range scan over
+    (user, date_created, pin).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_items')
+    pin = models.ForeignKey(Pin, on_delete=models.CASCADE, related_name='feed_items')
+    date_created = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'pin')
+        indexes = [
+            models.Index(fields=['user', 'date_created', 'pin'], name='feeditem_user_date_pin_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.pin} in {self.user.username} feed'
+
+
+class ImageVariant(models.Model):
+    """
+    One resized, re-encoded copy of an uploaded image, made by pins.images.
+    Keyed by the original's storage name, so Pin.image and Board.cover share
+    the table and variants follow the file rather than the row.
+    """
+    source = models.CharField(max_length=255)
+    format = models.CharField(max_length=8)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.FileField(max_length=255)
+
+    class Meta:
+        unique_together = ('source', 'format', 'width')
+
+    def __str__(self):
+        return f'{self.source} {self.width}w {self.format}'
+
+
+class VideoUpload(models.Model):
+    """
+    A resumable upload of a pin video. pins.uploads writes its chunks into
+    one staging file at their offsets and, once it is finalized, hands the
+    file to storage and creates the Pin from `pin_data` in the background.
+    """
+    class Status(models.TextChoices):
+        UPLOADING = 'uploading'
+        PROCESSING = 'processing'
+        DONE = 'done'
+        FAILED = 'failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='video_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.UPLOADING)
+    # validated PinSerializer fields, kept from finalize until the pin is created
+    pin_data = models.JSONField(default=dict, blank=True)
+    pin = models.ForeignKey(Pin, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.filename} by {self.user.username} ({self.status})'
@@ -0,0 +1,48 @@
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+
+from DreamBoard.pagination import KeysetPagination
+from . import feed
+
+
+class CommentPagination(KeysetPagination):
+    # comment threads read oldest first
+    ordering = ('created_date', 'id')
+
+    @classmethod
+    def link_after(cls, request, url, instance=None):
+        """Absolute link to the page of `url` that follows `instance`, or to its first page."""
+        paginator = cls()
+        paginator.base_url = request.build_absolute_uri(url)
+        if instance is None:
+            return paginator.base_url
+        return paginator._link(instance, reverse=False)
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Pages through the home feed in pins.feed rather than the queryset
+    itself; the queryset is only used to load and render the chosen pins.
+    Feeds are read forward only, so there is no previous link.
+    """
+    ordering = ('-date_created', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        position = None
+        if self.cursor is not None and self.cursor.position is not None:
+            position = self._decode_position()
+
+        try:
+            entries = feed.read(request.user, position, self.page_size + 1)
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        pin_ids = [pin_id for _, pin_id in entries[:self.page_size]]
+        pins = queryset.in_bulk(pin_ids)
+        self.page = [pins[pin_id] for pin_id in pin_ids if pin_id in pins]
+        self.has_next, self.has_previous = len(entries) > self.page_size, False
+        return self.page
@@ -0,0 +1,79 @@
+"""
+Ranked full-text search over pin titles and descriptions.
+
+PostgreSQL keeps a weighted `search_vector` tsvector column on pins_pin
+(title 'A', description 'B') up to date with a trigger and serves it from a
+GIN index. SQLite keeps an external-content FTS5 table, pins_pin_fts, in
+sync with triggers. Both are created by migration 0008. Any other backend
+falls back to icontains.
+
+Every search term is matched as a prefix so results narrow as the user
+types. Relevance is exposed as an integer `search_rank` annotation so it
+can take part in keyset pagination.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BigIntegerField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Pin
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'pins_pin_fts'
+WEIGHTS = {'title': 'A', 'description': 'B'}
+RANK_SCALE = 1000000
+
+
+def _terms(query):
+    return re.findall(r'[^\W_]+', query or '')
+
+
+def _postgres(terms, fields):
+    weights = ''.join(WEIGHTS[field] for field in fields)
+    tsquery = ' & '.join(f'{term}:*{weights}' for term in terms)
+    table = Pin._meta.db_table
+    match = RawSQL(
+        f'SELECT id FROM "{table}" WHERE search_vector @@ to_tsquery(%s, %s)',
+        (SEARCH_CONFIG, tsquery),
+    )
+    rank = RawSQL(
+        f'(ts_rank("{table}".search_vector, to_tsquery(%s, %s)) * {RANK_SCALE})::bigint',
+        (SEARCH_CONFIG, tsquery),
+        output_field=BigIntegerField(),
+    )
+    return Q(pk__in=match), rank
+
+
+def _sqlite(terms, fields):
+    expression = ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+    expression = '{%s} : (%s)' % (' '.join(fields), expression)
+    table = Pin._meta.db_table
+    match = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (expression,))
+    rank = RawSQL(
+        f'(SELECT CAST(-bm25({FTS_TABLE}, 10.0, 5.0) * {RANK_SCALE} AS INTEGER) '
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = "{table}".id)',
+        (expression,),
+        output_field=BigIntegerField(),
+    )
+    return Q(pk__in=match), rank
+
+
+def search_pins(queryset, query, fields=('title', 'description')):
+    """Filter `queryset` to pins matching every term of `query`, best matches first."""
+    terms = _terms(query)
+    if not terms:
+        return queryset
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        match, rank = _postgres(terms, fields)
+    elif vendor == 'sqlite':
+        match, rank = _sqlite(terms, fields)
+    else:
+        match = Q()
+        for term in terms:
+            match &= Q(*[Q(**{f'{field}__icontains': term}) for field in fields], _connector=Q.OR)
+        return queryset.filter(match)
+
+    return queryset.filter(match).annotate(search_rank=rank).order_by('-search_rank', '-date_created', '-id')
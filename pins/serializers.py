@@ -1,6 +1,19 @@
+from django.db.models import Prefetch, prefetch_related_objects
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Pin, Comment, CommentReplies, LikePins, SavePins
+from .models import Pin, Comment, CommentReplies, LikePins, SavePins, VideoUpload
 from accounts.serializers import UserSerializer
+from boards.membership import change_pins
+from boards.models import Board
+from DreamBoard.counters import count_for
+from DreamBoard.serializers import DynamicFieldsMixin
+from .pagination import CommentPagination
+from .threads import ReplyThread, max_depth, reply_prefetches
+from .uploads import max_size
+from .images import ImageSetField, variant_index_for
+from .viewer import viewer_state_for
+
 
 class LikePinsSerializer(serializers.ModelSerializer):
     class Meta:
@@ -28,16 +41,44 @@ class SavePinsSerializer(serializers.ModelSerializer):
 class CommentRepliesSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     replies = serializers.SerializerMethodField()
+    replies_count = serializers.SerializerMethodField()
+    more_replies = serializers.SerializerMethodField()
 
     class Meta:
         model = CommentReplies
-        fields = ['id', 'comment', 'user', 'content', 'created_date', 'parent_reply', 'replies']
+        fields = [
+            'id', 'comment', 'user', 'content', 'created_date', 'parent_reply',
+            'replies', 'replies_count', 'more_replies'
+        ]
+        read_only_fields = ['comment']
+
+    def setup_eager_loading(self, queryset):
+        if isinstance(self.fields.get('user'), UserSerializer):
+            queryset = queryset.select_related('user')
+        if 'replies_count' in self.fields or 'more_replies' in self.fields:
+            # only the first replies of each node are loaded, so the totals are counted
+            queryset = queryset.annotate(children_count=count_for(CommentReplies, 'parent_reply'))
+        return queryset.order_by('created_date', 'id')
+
+    # replies render from the ReplyThread attached by the view or CommentSerializer;
+    # a reply without one (e.g. one just created) has nothing loaded below it
 
-    # def get_replies(self, obj):
-    #     return CommentRepliesSerializer(obj.replies.all(), many=True).data
-    
     def get_replies(self, obj):
-        return []
+        thread = getattr(obj, 'thread', None)
+        if thread is None:
+            return []
+        return [self.to_representation(child) for child in thread.shown_children(obj.pk)]
+
+    def get_replies_count(self, obj):
+        thread = getattr(obj, 'thread', None)
+        return thread.count(obj.pk) if thread is not None else 0
+
+    def get_more_replies(self, obj):
+        thread = getattr(obj, 'thread', None)
+        if thread is None:
+            return None
+        return thread.more_link(self.context.get('request'), obj.pk)
+
     def create(self, validated_data):
         request = self.context.get('request', None)
         if request:
@@ -46,15 +87,38 @@ class CommentRepliesSerializer(serializers.ModelSerializer):
 
 class CommentSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    replies = CommentRepliesSerializer(many=True, read_only=True)
+    replies = CommentRepliesSerializer(source='reply_roots', many=True, read_only=True)
     replies_count = serializers.SerializerMethodField()
+    more_replies = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
-        fields = ['id', 'pin', 'user', 'content', 'created_date', 'replies', 'replies_count']
+        fields = ['id', 'pin', 'user', 'content', 'created_date', 'replies', 'replies_count', 'more_replies']
+        read_only_fields = ['pin']
+
+    def setup_eager_loading(self, queryset):
+        if isinstance(self.fields.get('user'), UserSerializer):
+            queryset = queryset.select_related('user')
+        if 'replies_count' in self.fields:
+            queryset = queryset.annotate(replies_count=count_for(CommentReplies, 'comment'))
+        if 'replies' in self.fields or 'more_replies' in self.fields:
+            # the rendered part of each thread, one query per depth for the page of comments
+            queryset = queryset.prefetch_related(*self._reply_prefetches())
+        return queryset
+
+    def _reply_prefetches(self):
+        child = self.fields['replies'].child if 'replies' in self.fields else CommentRepliesSerializer()
+        replies = child.setup_eager_loading(CommentReplies.objects.all())
+        return reply_prefetches(replies, max_depth(), first=replies.filter(parent_reply=None))
         
     def get_replies_count(self, obj):
+        if hasattr(obj, 'replies_count'):
+            return obj.replies_count
         return obj.replies.count()
+
+    def get_more_replies(self, obj):
+        return obj.reply_thread.more_link(self.context.get('request'), None)
+
     def create(self, validated_data):
         request = self.context.get('request', None)
         if request:
@@ -62,39 +126,156 @@ class CommentSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
     def to_representation(self, instance):
-        data = super().to_representation(instance)
-        if not data['replies']:
-            data['replies'] = []  # If there are no replies, return an empty list
-        return data
+        if 'replies' in self.fields or 'more_replies' in self.fields:
+            if not hasattr(instance, 'loaded_replies'):
+                prefetch_related_objects([instance], *self._reply_prefetches())
+            instance.reply_thread = ReplyThread(instance.pin_id, instance.pk, instance.loaded_replies)
+            instance.reply_roots = instance.reply_thread.shown_children(None)
+        return super().to_representation(instance)
+
+
+class PinListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        pins = list(data.all() if hasattr(data, 'all') else data)
+        state = viewer_state_for(self.context)
+        if state is not None and ('is_liked' in self.child.fields or 'is_saved' in self.child.fields):
+            state.prime([pin.pk for pin in pins])
+        index = variant_index_for(self.context)
+        if 'images' in self.child.fields:
+            index.prime([pin.image.name for pin in pins])
+        # the originals' URLs too, for `image` and `video`
+        index.prime_files([pin.image.name for pin in pins] + [pin.video.name for pin in pins])
+        return super().to_representation(pins)
+
 
+def comments_preview_size():
+    return getattr(settings, 'PIN_COMMENTS_PREVIEW_SIZE', 10)
 
-class PinSerializer(serializers.ModelSerializer):
+
+class PinSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
-    comments_count = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
-    saves_count = serializers.SerializerMethodField()
+    comments = CommentSerializer(source='comments_preview', many=True, read_only=True)
+    comments_next = serializers.SerializerMethodField()
+    is_liked = serializers.SerializerMethodField()
+    is_saved = serializers.SerializerMethodField()
+    images = ImageSetField(source='image')
+    # write-only: pins belong to boards through boards.BoardPin, this just appends to one
+    board = serializers.PrimaryKeyRelatedField(
+        queryset=Board.objects.all(), required=False, allow_null=True, write_only=True
+    )
+    expandable_fields = ('user', 'comments')
+
     class Meta:
         model = Pin
         fields = [
-            'id', 'title', 'user', 'description', 'link', 'board', 'image', 'video', 'date_created',
-             'comments', 'comments_count', 'likes_count', 'saves_count'
+            'id', 'title', 'user', 'description', 'link', 'board', 'image', 'images', 'video', 'date_created',
+             'width', 'height', 'dominant_color', 'blurhash',
+             'comments', 'comments_next', 'comments_count', 'likes_count', 'saves_count',
+             'is_liked', 'is_saved'
         ]
+        list_serializer_class = PinListSerializer
     def create(self, validated_data):
         request = self.context.get('request', None)
         if request:
             validated_data['user'] = request.user
+        board = validated_data.pop('board', None)
+        pin = super().create(validated_data)
+        if board is not None:
+            change_pins(board, add=[pin.pk])
+        return pin
+
+    def update(self, instance, validated_data):
+        board = validated_data.pop('board', None)
+        pin = super().update(instance, validated_data)
+        if board is not None:
+            change_pins(board, add=[pin.pk])
+        return pin
+
+    def setup_eager_loading(self, queryset):
+        """
+        Plan the serializer tree up front: every nested relation that will be
+        rendered is joined or prefetched, and nothing else is, so a page costs
+        the same number of queries however many pins and comments it holds.
+        The pin counters are stored columns. Only the first
+        PIN_COMMENTS_PREVIEW_SIZE comments of each pin are loaded (one more
+        to tell whether `comments_next` is needed); the rest are paged
+        through the pin's comments endpoint.
+        """
+        if isinstance(self.fields.get('user'), UserSerializer):
+            queryset = queryset.select_related('user')
+        if 'comments' in self.fields or 'comments_next' in self.fields:
+            comments = Prefetch('comments', queryset=self._comments_queryset(), to_attr='comments_loaded')
+            queryset = queryset.prefetch_related(comments)
+        return queryset
+
+    def _comments_queryset(self, comments=None):
+        child = self.fields['comments'].child if 'comments' in self.fields else CommentSerializer()
+        comments = child.setup_eager_loading(Comment.objects.all() if comments is None else comments)
+        return comments.order_by(*CommentPagination.ordering)[:comments_preview_size() + 1]
+
+    def get_is_liked(self, obj):
+        state = viewer_state_for(self.context)
+        return state.flag('is_liked', obj.pk) if state is not None else None
+
+    def get_is_saved(self, obj):
+        state = viewer_state_for(self.context)
+        return state.flag('is_saved', obj.pk) if state is not None else None
+
+    def get_comments_next(self, obj):
+        request = self.context.get('request')
+        if request is None or len(obj.comments_loaded) <= comments_preview_size():
+            return None
+        url = reverse('comment-list-create', kwargs={'pin_id': obj.pk})
+        return CommentPagination.link_after(request, url, obj.comments_preview[-1])
+
+    def to_representation(self, instance):
+        if 'comments' in self.fields or 'comments_next' in self.fields:
+            if not hasattr(instance, 'comments_loaded'):
+                instance.comments_loaded = list(self._comments_queryset(instance.comments.all()))
+            instance.comments_preview = instance.comments_loaded[:comments_preview_size()]
+        return super().to_representation(instance)
+
+    def validate(self, data):
+        if not data.get('title'):
+            raise serializers.ValidationError("Title cannot be empty.")
+        return data
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    offset = serializers.IntegerField(source='received', read_only=True)
+
+    class Meta:
+        model = VideoUpload
+        fields = ['id', 'filename', 'size', 'offset', 'status', 'pin', 'error', 'created_at']
+        read_only_fields = ['status', 'pin', 'error', 'created_at']
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Size must be positive.")
+        if value > max_size():
+            raise serializers.ValidationError(f"Videos can be at most {max_size()} bytes.")
+        return value
+
+    def create(self, validated_data):
+        validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
-    
-    def get_comments_count(self, obj):
-        return obj.comments.count()
-    def get_likes_count(self, obj):
-        return obj.likes.count()
 
-    def get_saves_count(self, obj):
-        return obj.savepins_set.count()
+
+class VideoPinSerializer(serializers.ModelSerializer):
+    """The pin fields sent when finalizing a video upload; the video itself comes from the upload."""
+    board = serializers.PrimaryKeyRelatedField(queryset=Board.objects.all(), required=False, allow_null=True)
+
+    class Meta:
+        model = Pin
+        fields = ['title', 'description', 'link', 'board']
 
     def validate(self, data):
         if not data.get('title'):
             raise serializers.ValidationError("Title cannot be empty.")
-        return data
\ No newline at end of file
+        return data
+
+    def to_internal_value(self, data):
+        validated = super().to_internal_value(data)
+        if validated.get('board') is not None:
+            # kept as JSON on the upload until the pin is created
+            validated['board'] = validated['board'].pk
+        return validated
@@ -0,0 +1,202 @@
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.models import Follow, User
+from accounts.serializers import UserSerializer
+from boards.models import Board, BoardPin
+from DreamBoard.cache import bump_version
+from . import dedup, feed, images, similar, viewer
+from .models import Pin, Comment, CommentReplies, LikePins, SavePins
+
+
+def bump_counter(pin_ids, field, delta):
+    """Atomically add `delta` to `field` on the given pins, never going below zero."""
+    if not pin_ids or not delta:
+        return
+    Pin.objects.filter(pk__in=pin_ids).update(
+        updated_at=timezone.now(), **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def touch_pins(*pin_ids):
+    """Move Pin.updated_at for changes that show up in the pin's representation but not its row."""
+    Pin.objects.filter(pk__in=pin_ids).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Pin.likes.through)
+def pin_likes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keeps Pin.likes_count in step with the Pin.likes relation.
+    `post_add` only reports rows that were really inserted, but `remove`
+    reports whatever was asked for, so the rows that exist are resolved
+    before they go.
+    """
+    owner = 'user_id' if reverse else 'pin_id'
+    other = 'pin_id' if reverse else 'user_id'
+
+    if action in ('pre_remove', 'pre_clear'):
+        rows = sender.objects.filter(**{owner: instance.pk})
+        if action == 'pre_remove':
+            rows = rows.filter(**{f'{other}__in': pk_set})
+        instance._removed_likes = list(rows.values_list('pin_id', flat=True))
+        return
+
+    if action == 'post_add':
+        if reverse:
+            bump_counter(pk_set, 'likes_count', 1)
+        else:
+            bump_counter([instance.pk], 'likes_count', len(pk_set))
+    elif action in ('post_remove', 'post_clear'):
+        removed = instance.__dict__.pop('_removed_likes', [])
+        if reverse:
+            bump_counter(removed, 'likes_count', -1)
+        else:
+            bump_counter([instance.pk], 'likes_count', -len(removed))
+
+
+@receiver(pre_delete, sender=User)
+def liker_deleted(sender, instance, **kwargs):
+    # the cascade removes the user's Pin.likes rows without any m2m signal
+    liked = Pin.likes.through.objects.filter(user_id=instance.pk).values_list('pin_id', flat=True)
+    bump_counter(list(liked), 'likes_count', -1)
+
+
+@receiver(post_save, sender=LikePins)
+def like_created(sender, instance, created, **kwargs):
+    # LikePins mirrors into Pin.likes, which in turn moves the counter
+    if created:
+        Pin(pk=instance.pin_id).likes.add(instance.user_id)
+
+
+@receiver(post_delete, sender=LikePins)
+def like_deleted(sender, instance, **kwargs):
+    Pin(pk=instance.pin_id).likes.remove(instance.user_id)
+
+
+@receiver(post_save, sender=SavePins)
+def save_created(sender, instance, created, **kwargs):
+    if created:
+        bump_counter([instance.pin_id], 'saves_count', 1)
+
+
+@receiver(post_delete, sender=SavePins)
+def save_deleted(sender, instance, **kwargs):
+    bump_counter([instance.pin_id], 'saves_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        bump_counter([instance.pin_id], 'comments_count', 1)
+    else:
+        touch_pins(instance.pin_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump_counter([instance.pin_id], 'comments_count', -1)
+
+
+@receiver(post_save, sender=Pin)
+def pin_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: feed.fan_out(instance))
+
+
+@receiver(pre_save, sender=Pin)
+def pin_image_uploaded(sender, instance, **kwargs):
+    # an uncommitted file is one being uploaded by this save, not one already in storage
+    if instance.image and not instance.image._committed:
+        images.describe_pin(instance)
+        if dedup.upload_dedup():
+            dedup.reuse_duplicate(instance)
+
+
+@receiver(post_save, sender=Pin)
+def pin_image_saved(sender, instance, **kwargs):
+    images.schedule_variants(instance.image)
+    vector = instance.__dict__.pop('image_vector', None)
+    if vector is not None:
+        transaction.on_commit(lambda: similar.get_index().append([(instance.pk, vector)]))
+    if instance.__dict__.pop('describe_later', False):
+        image = instance.image
+        transaction.on_commit(lambda: images.describe_later(instance.pk, image))
+
+
+@receiver(post_save, sender=Board)
+def board_cover_saved(sender, instance, **kwargs):
+    images.schedule_variants(instance.cover)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: feed.follow(instance.follower_id, instance.followed_user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    feed.unfollow(instance.follower_id, instance.followed_user_id)
+
+
+def invalidate_pins(*pin_ids):
+    """Drop the cached renders of these pins and of every board that embeds them."""
+    boards = BoardPin.objects.filter(pin_id__in=pin_ids).values_list('board_id', flat=True)
+    bump_version('pin', *pin_ids)
+    bump_version('board', *boards)
+
+
+@receiver([post_save, pre_delete], sender=Pin)
+def pin_cache_changed(sender, instance, **kwargs):
+    # pre_delete, because the board memberships are gone by post_delete
+    invalidate_pins(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=LikePins)
+@receiver([post_save, post_delete], sender=SavePins)
+def pin_engagement_cache_changed(sender, instance, **kwargs):
+    invalidate_pins(instance.pin_id)
+
+
+@receiver([post_save, post_delete], sender=LikePins)
+@receiver([post_save, post_delete], sender=SavePins)
+def viewer_state_changed(sender, instance, **kwargs):
+    viewer.forget(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=CommentReplies)
+def reply_cache_changed(sender, instance, **kwargs):
+    pin_id = Comment.objects.filter(pk=instance.comment_id).values_list('pin_id', flat=True).first()
+    if pin_id is not None:
+        touch_pins(pin_id)
+        invalidate_pins(pin_id)
+
+
+@receiver(m2m_changed, sender=Pin.likes.through)
+def pin_likes_cache_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        pin_ids = (pk_set or ()) if reverse else [instance.pk]
+        if pin_ids:
+            invalidate_pins(*pin_ids)
+
+
+@receiver(post_save, sender=User)
+def user_cache_changed(sender, instance, created, update_fields=None, **kwargs):
+    # a new user is in no render yet, and e.g. a login only saves last_login
+    if created or (update_fields is not None and not set(update_fields) & set(UserSerializer.Meta.fields)):
+        return
+    # renders embedding the user check its token (see DreamBoard.cache), so only it is bumped
+    bump_version('user', instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_cache_changed(sender, instance, created=True, **kwargs):
+    # both users' follower/following counts moved
+    if created:
+        bump_version('user', instance.follower_id, instance.followed_user_id)
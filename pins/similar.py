@@ -0,0 +1,221 @@
+"""
+"More like this" for pin images.
+
+Each image is summarised by a DIMENSIONS-long float32 vector: an HSV colour
+histogram and a 2x2 grid of gradient-orientation histograms (coarse
+texture/shape), each square-rooted and the whole L2-normalised, so cosine
+similarity is a plain dot product.
+
+Vectors live outside the database in two append-only files under
+SIMILAR_INDEX_DIR, shared by every process on the host: `vectors.f32`, the
+contiguous N x DIMENSIONS matrix, and `ids.i64`, the pin id of each row.
+They are memory-mapped, so a search is one vectorised mat-vec over the page
+cache plus an argpartition for the top k: 320 MB of float32 and a few tens
+of milliseconds at a million pins. New pins are appended as they are
+uploaded (under an flock), and every process picks the new rows up on its
+next search. A pin whose image is replaced gets a new row that shadows the
+old one; deleted pins are dropped when results are loaded. The
+build_similarity_index command rewrites both files from the stored images.
+"""
+import fcntl
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+HUE_BINS, SATURATION_BINS, VALUE_BINS = 8, 3, 2
+ORIENTATIONS = 8
+CELLS = 2
+COLOR_DIMENSIONS = HUE_BINS * SATURATION_BINS * VALUE_BINS
+DIMENSIONS = COLOR_DIMENSIONS + CELLS * CELLS * ORIENTATIONS
+
+VECTORS, IDS, LOCK = 'vectors.f32', 'ids.i64', 'index.lock'
+
+
+def index_dir():
+    return getattr(settings, 'SIMILAR_INDEX_DIR', os.path.join(settings.BASE_DIR, 'var', 'similar'))
+
+
+def default_limit():
+    return getattr(settings, 'SIMILAR_PINS_LIMIT', 20)
+
+
+def _hellinger(histogram):
+    total = histogram.sum()
+    return np.sqrt(histogram / total) if total else histogram
+
+
+def features(sample):
+    """The feature vector of a small RGB Pillow image, e.g. pins.images.load_sample's sample."""
+    hsv = np.asarray(sample.convert('HSV'), dtype=np.int64).reshape(-1, 3)
+    # hue is circular and reds sit either side of 0, so each pixel is shared
+    # linearly between its two nearest hue bins instead of falling into one
+    position = (hsv[:, 0] + 0.5) * HUE_BINS / 256 - 0.5
+    lower = np.floor(position).astype(np.int64)
+    upper_weight = position - lower
+    rest = hsv[:, 1] * SATURATION_BINS // 256 * VALUE_BINS + hsv[:, 2] * VALUE_BINS // 256
+    color = np.zeros(COLOR_DIMENSIONS, dtype=np.float64)
+    for hue, weight in ((lower % HUE_BINS, 1 - upper_weight), ((lower + 1) % HUE_BINS, upper_weight)):
+        color += np.bincount(hue * SATURATION_BINS * VALUE_BINS + rest, weights=weight, minlength=COLOR_DIMENSIONS)
+
+    grey = np.asarray(sample.convert('L'), dtype=np.float32)
+    if min(grey.shape) > 1:
+        dy, dx = np.gradient(grey)
+    else:
+        dy = dx = np.zeros_like(grey)
+    orientation = ((np.arctan2(dy, dx) % np.pi) / np.pi * ORIENTATIONS).astype(np.int64) % ORIENTATIONS
+    rows, cols = np.indices(grey.shape)
+    cell = (rows * CELLS // grey.shape[0]) * CELLS + cols * CELLS // grey.shape[1]
+    texture = np.bincount(
+        (cell * ORIENTATIONS + orientation).ravel(), weights=np.hypot(dx, dy).ravel(),
+        minlength=CELLS * CELLS * ORIENTATIONS,
+    )
+
+    vector = np.concatenate([_hellinger(color), _hellinger(texture)]).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).astype(np.float32)
+
+
+class SimilarityIndex:
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._stamp = None
+        # (ids, vectors, shadowed), always replaced together so readers never mix two refreshes
+        self._snapshot = (
+            np.zeros(0, dtype=np.int64), np.zeros((0, DIMENSIONS), dtype=np.float32), np.zeros(0, dtype=bool)
+        )
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _flock(self):
+        return open(self._path(LOCK), 'a')
+
+    def append(self, rows):
+        """Add [(pin_id, vector)] rows; every process sees them on its next search."""
+        if not rows:
+            return
+        ids = np.array([pin_id for pin_id, _ in rows], dtype=np.int64)
+        vectors = np.stack([vector for _, vector in rows]).astype(np.float32)
+        with self._flock() as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # vectors before ids: readers only use rows present in both files
+            with open(self._path(VECTORS), 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(self._path(IDS), 'ab') as f:
+                f.write(ids.tobytes())
+
+    def rebuild(self, rows):
+        """
+        Replace the index with the [(pin_id, vector)] of `rows`, an iterable
+        written out as it is consumed. Rows appended while it runs are kept.
+        """
+        with self._flock() as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            start = self._count()
+        with open(self._path(VECTORS + '.new'), 'wb') as vectors, open(self._path(IDS + '.new'), 'wb') as ids:
+            for pin_id, vector in rows:
+                vectors.write(np.asarray(vector, dtype=np.float32).tobytes())
+                ids.write(np.int64(pin_id).tobytes())
+        with self._flock() as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            count = self._count()
+            if count > start:
+                old_ids, old_vectors = self._map(count)
+                with open(self._path(VECTORS + '.new'), 'ab') as f:
+                    f.write(np.ascontiguousarray(old_vectors[start:]).tobytes())
+                with open(self._path(IDS + '.new'), 'ab') as f:
+                    f.write(np.ascontiguousarray(old_ids[start:]).tobytes())
+            os.replace(self._path(VECTORS + '.new'), self._path(VECTORS))
+            os.replace(self._path(IDS + '.new'), self._path(IDS))
+
+    def _count(self):
+        try:
+            return min(
+                os.path.getsize(self._path(IDS)) // 8,
+                os.path.getsize(self._path(VECTORS)) // (4 * DIMENSIONS),
+            )
+        except FileNotFoundError:
+            return 0
+
+    def _map(self, count):
+        if not count:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, DIMENSIONS), dtype=np.float32)
+        ids = np.memmap(self._path(IDS), dtype=np.int64, mode='r', shape=(count,))
+        vectors = np.memmap(self._path(VECTORS), dtype=np.float32, mode='r', shape=(count, DIMENSIONS))
+        return ids, vectors
+
+    def refresh(self):
+        """
+        Map rows appended since the last call, or the whole index again if it
+        was rebuilt, and return the current `(ids, vectors, shadowed)`.
+        """
+        try:
+            inode = os.stat(self._path(IDS)).st_ino
+        except FileNotFoundError:
+            inode = None
+        count = self._count()
+        with self._lock:
+            known = 0 if self._stamp is None or self._stamp[0] != inode else self._stamp[1]
+            if known == count and self._stamp is not None:
+                return self._snapshot
+            ids, vectors = self._map(count)
+            if known:
+                # a row is shadowed by a later row for the same pin
+                shadowed = np.concatenate([self._snapshot[2], np.zeros(count - known, dtype=bool)])
+                shadowed[:known] |= np.isin(ids[:known], ids[known:])
+                new_ids = np.asarray(ids[known:])
+            else:
+                shadowed = np.zeros(count, dtype=bool)
+                new_ids = np.asarray(ids)
+            # duplicates among the new rows: keep the last of each
+            _, last = np.unique(new_ids[::-1], return_index=True)
+            tail = np.ones(len(new_ids), dtype=bool)
+            tail[len(new_ids) - 1 - last] = False
+            shadowed[known:] |= tail
+            self._snapshot = (ids, vectors, shadowed)
+            self._stamp = (inode, count)
+            return self._snapshot
+
+    def vector_for(self, pin_id):
+        ids, vectors, shadowed = self.refresh()
+        rows = np.flatnonzero((ids == pin_id) & ~shadowed)
+        return np.array(vectors[rows[-1]]) if len(rows) else None
+
+    def search(self, vector, k, exclude=None):
+        """[(pin_id, cosine similarity)] of the `k` rows nearest `vector`, best first."""
+        ids, vectors, shadowed = self.refresh()
+        if not len(ids):
+            return []
+        scores = vectors @ np.asarray(vector, dtype=np.float32)
+        scores[shadowed] = -np.inf
+        if exclude is not None:
+            scores[ids == exclude] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[row]), float(scores[row])) for row in top if scores[row] > -np.inf]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index():
+    directory = index_dir()
+    with _indexes_lock:
+        if directory not in _indexes:
+            _indexes[directory] = SimilarityIndex(directory)
+        return _indexes[directory]
+
+
+def similar_to(pin_id, k):
+    """[(pin_id, similarity)] of the `k` pins whose images look most like `pin_id`'s."""
+    index = get_index()
+    vector = index.vector_for(pin_id)
+    if vector is None:
+        return []
+    return index.search(vector, k, exclude=pin_id)
@@ -1,3 +1,1041 @@
-from django.test import TestCase
+import fcntl
+import io
+import os
+import random
+import tempfile
+from base64 import b64encode
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from accounts.models import Follow
+from DreamBoard.pagination import KeysetPagination
+from . import blurhash, dedup, feed, images, similar, uploads, writebehind
+from .models import Comment, CommentReplies, FeedItem, ImageVariant, LikePins, Pin, SavePins, VideoUpload
+from .search import search_pins
+from .serializers import CommentSerializer
+from .viewer import ViewerState
+
+User = get_user_model()
+
+
+def make_user(name):
+    return User.objects.create_user(email=f'{name}@example.com', password='secret', username=name)
+
+
+def make_pin(user, title='Pin', description='', **fields):
+    return Pin.objects.create(user=user, title=title, description=description, **fields)
+
+
+def image_bytes(size=(800, 600), color=(200, 30, 30), fmt='JPEG', **save):
+    out = io.BytesIO()
+    Image.new('RGB', size, color).save(out, fmt, **save)
+    return out.getvalue()
+
+
+def image_upload(name='photo.jpg', **kwargs):
+    return SimpleUploadedFile(name, image_bytes(**kwargs), content_type='image/jpeg')
+
+
+def pattern_bytes(seed, size=(640, 480), fmt='JPEG'):
+    """A blocky random picture, so its dHash has structure for a near copy to keep."""
+    rng = random.Random(seed)
+    blocks = Image.frombytes('L', (16, 12), bytes(rng.randrange(256) for _ in range(16 * 12)))
+    out = io.BytesIO()
+    blocks.resize(size, Image.BILINEAR).convert('RGB').save(out, fmt)
+    return out.getvalue()
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('counted')
+        cls.fans = [make_user(f'fan-{i}') for i in range(3)]
+        cls.pin = make_pin(cls.author, 'Counted')
+
+    def counts(self):
+        self.pin.refresh_from_db()
+        return self.pin.likes_count, self.pin.saves_count, self.pin.comments_count
+
+    def test_likes_saves_and_comments_move_the_counters(self):
+        likes = [LikePins.objects.create(user=fan, pin=self.pin) for fan in self.fans]
+        SavePins.objects.create(user=self.fans[0], pin=self.pin)
+        comment = Comment.objects.create(pin=self.pin, user=self.fans[1], content='Hi')
+        self.assertEqual(self.counts(), (3, 1, 1))
+        likes[0].delete()
+        comment.delete()
+        self.assertEqual(self.counts(), (2, 1, 0))
+
+    def test_like_relation_counts_only_real_changes(self):
+        self.pin.likes.add(*self.fans)
+        self.pin.likes.add(self.fans[0])
+        self.fans[1].liked_pins.remove(self.pin)
+        self.pin.likes.remove(self.fans[1])
+        self.assertEqual(self.counts()[0], 2)
+        self.pin.likes.clear()
+        self.assertEqual(self.counts()[0], 0)
+
+    def test_deleted_liker_is_uncounted(self):
+        self.pin.likes.add(*self.fans)
+        self.fans[2].delete()
+        self.assertEqual(self.counts()[0], 2)
+
+    def test_reconcile_repairs_drift(self):
+        self.pin.likes.add(self.fans[0])
+        Pin.objects.filter(pk=self.pin.pk).update(likes_count=40, saves_count=7, comments_count=3)
+        call_command('reconcile_pin_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.counts(), (1, 0, 0))
+
+
+@mock.patch.object(KeysetPagination, 'page_size', 3)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('pager')
+        # two pins share every timestamp, so pages must break ties on id
+        moment = timezone.now()
+        cls.pins = [
+            make_pin(cls.user, f'Paged {i}', date_created=moment - timedelta(minutes=i // 2)) for i in range(8)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, link='next'):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            ids += [pin['id'] for pin in response.data['results']]
+            url = response.data[link]
+        return ids
+
+    def test_pages_cover_every_pin_once_in_order(self):
+        expected = [pin.pk for pin in sorted(self.pins, key=lambda pin: (pin.date_created, pin.pk), reverse=True)]
+        self.assertEqual(self.walk(reverse('pin-list-create')), expected)
+
+    def test_new_pins_do_not_shift_later_pages(self):
+        expected = self.walk(reverse('pin-list-create'))[:6]
+        first = self.client.get(reverse('pin-list-create')).data
+        make_pin(self.user, 'Newest')
+        second = self.client.get(first['next']).data
+        self.assertEqual([pin['id'] for pin in first['results'] + second['results']], expected)
+
+    def test_previous_link_returns_the_earlier_page(self):
+        first = self.client.get(reverse('pin-list-create')).data
+        second = self.client.get(first['next']).data
+        self.assertIsNone(first['previous'])
+        self.assertEqual(self.client.get(second['previous']).data['results'], first['results'])
+
+    def test_garbled_cursor_is_not_found(self):
+        for position in ('not json', '["2024-01-01"]', '["yesterday", "1"]'):
+            cursor = b64encode(urlencode({'p': position}).encode()).decode()
+            response = self.client.get(reverse('pin-list-create'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, position)
+
+    def test_comments_read_oldest_first(self):
+        pin = self.pins[0]
+        comments = [Comment.objects.create(pin=pin, user=self.user, content=f'Comment {i}') for i in range(7)]
+        url = reverse('comment-list-create', kwargs={'pin_id': pin.pk})
+        self.assertEqual(self.walk(url), [comment.pk for comment in comments])
+
+
+class SparseFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('sparse')
+        cls.pin = make_pin(cls.user, 'Sparse')
+        Comment.objects.create(pin=cls.pin, user=cls.user, content='First')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('pin-details', kwargs={'pk': self.pin.pk})
+
+    def test_fields_keep_only_listed_paths(self):
+        data = self.client.get(self.url, {'fields': 'id,title,user.username', 'expand': 'user'}).data
+        self.assertEqual(data, {'id': self.pin.pk, 'title': 'Sparse', 'user': {'username': 'sparse'}})
+
+    def test_unexpanded_relations_collapse(self):
+        data = self.client.get(self.url, {'expand': 'comments'}).data
+        self.assertEqual(data['user'], self.user.pk)
+        self.assertEqual(len(data['comments']), 1)
+        self.assertNotIn('comments', self.client.get(self.url, {'expand': 'user'}).data)
+
+    def test_listed_relations_are_expanded(self):
+        data = self.client.get(self.url, {'fields': 'id,user.username,comments.content'}).data
+        self.assertEqual(data, {'id': self.pin.pk, 'user': {'username': 'sparse'}, 'comments': [{'content': 'First'}]})
+
+    def test_without_parameters_the_full_tree_renders(self):
+        data = self.client.get(self.url).data
+        self.assertEqual(data['user']['username'], 'sparse')
+        self.assertEqual([comment['content'] for comment in data['comments']], ['First'])
+
+    def test_unrendered_relations_are_not_loaded(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('pin-list-create'), {'fields': 'id,title'})
+        self.assertFalse([query for query in queries if 'pins_comment' in query['sql']])
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = make_user('reader')
+        cls.author = make_user('writer')
+        cls.star = make_user('star')
+
+    def follow(self, followed):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Follow.objects.create(follower=self.reader, followed_user=followed)
+
+    def post(self, user, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_pin(user, title)
+
+    def feed(self):
+        return [pin_id for _, pin_id in feed.read(self.reader)]
+
+    def test_new_pins_fan_out_to_followers(self):
+        self.follow(self.author)
+        pin = self.post(self.author, 'Fresh')
+        self.assertEqual(self.feed(), [pin.pk])
+        self.assertTrue(FeedItem.objects.filter(user=self.author, pin=pin).exists())
+
+    def test_follow_backfills_and_unfollow_clears(self):
+        older = self.post(self.author, 'Older')
+        newer = self.post(self.author, 'Newer')
+        follow = self.follow(self.author)
+        self.assertEqual(self.feed(), [newer.pk, older.pk])
+        follow.delete()
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_popular_authors_are_merged_on_read(self):
+        self.follow(self.star)
+        pin = self.post(self.star, 'Big news')
+        self.assertFalse(FeedItem.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), [pin.pk])
+
+    def test_endpoint_pages_forward(self):
+        self.follow(self.author)
+        pins = [self.post(self.author, f'Feed {i}') for i in range(3)]
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        with mock.patch.object(KeysetPagination, 'page_size', 2):
+            first = client.get(reverse('feed')).data
+            second = client.get(first['next']).data
+        ids = [pin['id'] for pin in first['results'] + second['results']]
+        self.assertEqual(ids, [pin.pk for pin in reversed(pins)])
+        self.assertIsNone(second['next'])
+
+
+@override_settings(REPLY_TREE_MAX_DEPTH=3, REPLY_TREE_MAX_CHILDREN=2)
+class ReplyThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('threader')
+        cls.pin = make_pin(cls.user, 'Threads')
+        cls.comment = Comment.objects.create(pin=cls.pin, user=cls.user, content='Root')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('comment-detail', kwargs={'pin_id': self.pin.pk, 'pk': self.comment.pk})
+
+    def reply(self, parent=None, content='Reply'):
+        return CommentReplies.objects.create(comment=self.comment, user=self.user, parent_reply=parent, content=content)
+
+    def chain(self, length):
+        parent = None
+        for i in range(length):
+            parent = self.reply(parent, f'Depth {i}')
+        return parent
+
+    def queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        return len(queries)
+
+    def test_deep_threads_render_in_constant_queries(self):
+        self.chain(2)
+        shallow = self.queries()
+        self.chain(8)
+        for _ in range(5):
+            self.reply()
+        self.assertEqual(self.queries(), shallow)
+
+    def test_cut_off_depths_link_to_the_rest(self):
+        self.chain(5)
+        data = self.client.get(self.url).data
+        node, depth = data['replies'][0], 0
+        while node['replies']:
+            node, depth = node['replies'][0], depth + 1
+        self.assertEqual(depth, 2)
+        self.assertIsNotNone(node['more_replies'])
+        rest = self.client.get(node['more_replies']).data['results']
+        self.assertEqual([reply['content'] for reply in rest], ['Depth 3'])
+
+    def test_loads_only_the_rendered_replies_but_counts_them_all(self):
+        roots = [self.reply(content=f'Root {i}') for i in range(6)]
+        for i in range(6):
+            self.reply(roots[0], f'Child {i}')
+        comment = CommentSerializer().setup_eager_loading(Comment.objects.filter(pk=self.comment.pk)).get()
+        # two shown per node, and one more to tell that a link is needed
+        self.assertEqual(len(comment.loaded_replies), 3)
+        self.assertEqual(len(comment.loaded_replies[0].loaded_replies), 3)
+        data = self.client.get(self.url).data
+        self.assertEqual((data['replies_count'], data['replies'][0]['replies_count']), (12, 6))
+        self.assertIsNotNone(data['replies'][0]['more_replies'])
+
+    def test_wide_levels_link_to_the_next_page(self):
+        replies = [self.reply(content=f'Sibling {i}') for i in range(3)]
+        data = self.client.get(self.url).data
+        self.assertEqual([reply['id'] for reply in data['replies']], [reply.pk for reply in replies[:2]])
+        self.assertEqual(data['replies_count'], 3)
+        rest = self.client.get(data['more_replies']).data['results']
+        self.assertEqual([reply['id'] for reply in rest], [replies[2].pk])
+
+
+@override_settings(PIN_COMMENTS_PREVIEW_SIZE=2)
+class CommentPreviewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('previewer')
+        cls.pin = make_pin(cls.user, 'Talked about')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def comment(self, pin, i):
+        return Comment.objects.create(pin=pin, user=self.user, content=f'Comment {i}')
+
+    def test_short_threads_are_inlined_whole(self):
+        self.comment(self.pin, 0)
+        data = self.client.get(reverse('pin-details', kwargs={'pk': self.pin.pk})).data
+        self.assertEqual(len(data['comments']), 1)
+        self.assertIsNone(data['comments_next'])
+
+    def test_long_threads_continue_on_the_comment_stream(self):
+        comments = [self.comment(self.pin, i) for i in range(5)]
+        data = self.client.get(reverse('pin-details', kwargs={'pk': self.pin.pk})).data
+        self.assertEqual([comment['id'] for comment in data['comments']], [comment.pk for comment in comments[:2]])
+        rest = self.client.get(data['comments_next']).data
+        self.assertEqual([comment['id'] for comment in rest['results']], [comment.pk for comment in comments[2:]])
+
+    def test_preview_is_capped_per_pin_on_lists(self):
+        other = make_pin(self.user, 'Also talked about')
+        for pin in (self.pin, other):
+            for i in range(4):
+                self.comment(pin, i)
+        results = self.client.get(reverse('pin-list-create')).data['results']
+        self.assertEqual([len(pin['comments']) for pin in results], [2, 2])
+        self.assertTrue(all(pin['comments_next'] for pin in results))
+
+
+@override_settings(IMAGE_VARIANT_WIDTHS=(200, 400, 1200))
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('photographer')
+
+    def test_ladder_stops_below_the_original(self):
+        rendered = images.render_variants(image_bytes((500, 250)), images.widths())
+        self.assertEqual(sorted({(width, height) for _, width, height, _ in rendered}), [(200, 100), (400, 200)])
+        self.assertEqual(sorted({fmt for fmt, *_ in rendered}), ['jpeg', 'webp'])
+        small = images.render_variants(image_bytes((120, 90)), images.widths())
+        self.assertEqual({(width, height) for _, width, height, _ in small}, {(120, 90)})
+
+    def test_variants_drop_metadata_and_apply_orientation(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees clockwise
+        exif[0x010f] = 'Camera maker'
+        data = image_bytes((600, 300), exif=exif.tobytes())
+        for _, width, height, variant in images.render_variants(data, images.widths()):
+            self.assertLess(width, height)
+            with Image.open(io.BytesIO(variant)) as decoded:
+                self.assertFalse(dict(decoded.getexif()))
+
+    def test_upload_renders_srcsets(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pin = make_pin(self.user, 'Photo', image=image_upload(size=(500, 250)))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = client.get(reverse('pin-details', kwargs={'pk': pin.pk})).data
+        self.assertEqual(data['images']['sizes'], [(200, 100), (400, 200)])
+        srcset = r'^http://testserver/\S+\.webp 200w, http://testserver/\S+\.webp 400w$'
+        self.assertRegex(data['images']['webp'], srcset)
+
+    def test_images_are_null_until_variants_exist(self):
+        pin = make_pin(self.user, 'Pending', image='pins/images/pending.jpg')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertIsNone(client.get(reverse('pin-details', kwargs={'pk': pin.pk})).data['images'])
+
+
+class ImageMetadataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('describer')
+
+    def test_blurhash_of_a_flat_image(self):
+        encoded = blurhash.encode(Image.new('RGB', (8, 6), (40, 120, 200)))
+        # 4x3 components, then the average colour in four base-83 digits
+        self.assertEqual((len(encoded), encoded[0]), (28, 'L'))
+        average = sum(blurhash.ALPHABET.index(c) * 83 ** (3 - i) for i, c in enumerate(encoded[2:6]))
+        self.assertEqual(average, 40 << 16 | 120 << 8 | 200)
+
+    def test_upload_stores_oriented_size_and_colour(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        upload = image_upload(size=(640, 480), color=(10, 200, 10), exif=exif.tobytes())
+        pin = make_pin(self.user, 'Rotated', image=upload)
+        pin.refresh_from_db()
+        self.assertEqual((pin.width, pin.height), (480, 640))
+        red, green, blue = (int(pin.dominant_color[i:i + 2], 16) for i in (1, 3, 5))
+        self.assertTrue(green > 180 and red < 40 and blue < 40, pin.dominant_color)
+        self.assertEqual(len(pin.blurhash), 28)
+
+
+    @override_settings(IMAGE_DESCRIBE_MAX_PIXELS=1000)
+    def test_large_uploads_are_sampled_after_commit(self):
+        upload = SimpleUploadedFile('large.png', image_bytes(size=(64, 48), color=(10, 10, 200), fmt='PNG'))
+        with self.captureOnCommitCallbacks() as callbacks:
+            pin = make_pin(self.user, 'Large', image=upload)
+        stored = Pin.objects.get(pk=pin.pk)
+        # the header gives the size at once; nothing was decoded on the request thread
+        self.assertEqual((stored.width, stored.height, stored.blurhash, stored.image_hash), (64, 48, '', None))
+        for callback in callbacks:
+            callback()
+        stored.refresh_from_db()
+        self.assertEqual(len(stored.blurhash), 28)
+        self.assertIsNotNone(stored.image_hash)
+        self.assertEqual(stored.dominant_color, '#0a0ac8')
+
+
+class BackfillImageMetadataTests(TransactionTestCase):
+    # the command reads files on a thread pool, which only sees committed rows
+
+    def test_backfill_describes_older_pins(self):
+        user = make_user('backfiller')
+        pin = make_pin(user, 'Old upload', image=image_upload(size=(300, 200)))
+        Pin.objects.filter(pk=pin.pk).update(width=None, height=None, dominant_color='', blurhash='', image_hash=None)
+        with self.assertLogs('pins.images', 'ERROR'):
+            broken = make_pin(user, 'Lost file', image='pins/images/missing.jpg')
+        out = StringIO()
+        call_command('backfill_image_metadata', workers=0, stdout=out)
+        pin.refresh_from_db()
+        self.assertEqual((pin.width, pin.height), (300, 200))
+        self.assertTrue(pin.blurhash and pin.image_hash is not None)
+        self.assertIsNone(Pin.objects.get(pk=broken.pk).width)
+        self.assertIn('1 pins (1 unreadable)', out.getvalue())
+
+class DuplicateImageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('deduper')
+
+    def hashed_pin(self, value):
+        return make_pin(self.user, f'Hash {value:x}', **dedup.hash_fields(value))
+
+    @staticmethod
+    def flip(value, chunk_flips):
+        """`value` with the low `n` bits of each chunk flipped, for n in `chunk_flips`."""
+        for chunk, flips in enumerate(chunk_flips):
+            for bit in range(flips):
+                value ^= 1 << (chunk * dedup.CHUNK_BITS + bit)
+        return value
+
+    def test_signed_storage_round_trips(self):
+        value = 0xF0E1D2C3B4A59687
+        fields = dedup.hash_fields(value)
+        self.assertLess(fields['image_hash'], 0)
+        self.assertEqual(dedup.unsigned(fields['image_hash']), value)
+        self.assertEqual(sum(fields[f'image_hash_{i}'] << (16 * i) for i in range(4)), value)
+
+    def test_finds_matches_through_any_close_chunk(self):
+        base = 0x8123456789ABCDEF
+        query = self.hashed_pin(base)
+        # seven bits apart, but only the last chunk is within one bit
+        spread = self.hashed_pin(self.flip(base, (2, 2, 2, 1)))
+        exact = self.hashed_pin(base)
+        self.hashed_pin(self.flip(base, (2, 2, 2, 2)))
+        self.hashed_pin(base ^ (1 << 64) - 1)
+        self.assertEqual(dedup.duplicates_of(query, 7), [(exact.pk, 0), (spread.pk, 7)])
+
+    def test_re_encoded_copies_hash_close(self):
+        original = dedup.dhash(Image.open(io.BytesIO(pattern_bytes(1))))
+        smaller = dedup.dhash(Image.open(io.BytesIO(pattern_bytes(1, size=(320, 240), fmt='PNG'))))
+        other = dedup.dhash(Image.open(io.BytesIO(pattern_bytes(2))))
+        self.assertLessEqual(dedup.distance(original, smaller), 2)
+        self.assertGreater(dedup.distance(original, other), dedup.MAX_DISTANCE)
+
+    def test_endpoint_lists_nearest_first(self):
+        base = 0x0123456789ABCDEF
+        query = self.hashed_pin(base)
+        near = self.hashed_pin(self.flip(base, (1, 0, 0, 0)))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('pin-duplicates', kwargs={'pk': query.pk})
+        self.assertEqual([(pin['id'], pin['distance']) for pin in client.get(url).data], [(near.pk, 1)])
+        self.assertEqual(client.get(url, {'distance': 0}).data, [])
+        self.assertEqual(client.get(url, {'distance': dedup.MAX_DISTANCE + 1}).status_code, 400)
+
+    @override_settings(PIN_UPLOAD_DEDUP=True)
+    def test_uploads_reuse_a_stored_copy(self):
+        first = make_pin(self.user, 'Original', image=SimpleUploadedFile('a.jpg', pattern_bytes(3)))
+        again = make_pin(self.user, 'Again', image=SimpleUploadedFile('b.png', pattern_bytes(3, fmt='PNG')))
+        self.assertEqual(again.image.name, first.image.name)
+        smaller = make_pin(self.user, 'Smaller', image=SimpleUploadedFile('c.jpg', pattern_bytes(3, size=(320, 240))))
+        self.assertEqual(smaller.image.name, first.image.name)
+        other = make_pin(self.user, 'Other', image=SimpleUploadedFile('d.jpg', pattern_bytes(4)))
+        self.assertNotEqual(other.image.name, first.image.name)
+
+
+class SimilarityIndexTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = similar.SimilarityIndex(self.directory)
+
+    @staticmethod
+    def vector(seed):
+        return similar.features(Image.open(io.BytesIO(pattern_bytes(seed, size=(32, 24)))))
+
+    def test_features_are_unit_length(self):
+        vector = self.vector(1)
+        self.assertEqual(vector.shape, (similar.DIMENSIONS,))
+        self.assertAlmostEqual(float(vector @ vector), 1.0, places=5)
+
+    def test_search_ranks_by_similarity(self):
+        base = self.vector(1)
+        self.index.append([(1, base), (2, self.vector(2)), (3, base)])
+        results = self.index.search(base, 2, exclude=1)
+        self.assertEqual(results[0][0], 3)
+        self.assertAlmostEqual(results[0][1], 1.0, places=5)
+        self.assertEqual(len(results), 2)
+
+    def test_other_processes_see_appends_and_replacements(self):
+        reader = similar.SimilarityIndex(self.directory)
+        self.assertEqual(reader.search(self.vector(1), 5), [])
+        self.index.append([(1, self.vector(1)), (2, self.vector(2))])
+        self.index.append([(1, self.vector(3))])
+        self.assertEqual([pin_id for pin_id, _ in reader.search(self.vector(3), 5)][:1], [1])
+        self.assertEqual(len(reader.search(self.vector(3), 5)), 2)
+
+    def test_rebuild_replaces_every_row(self):
+        self.index.append([(1, self.vector(1)), (2, self.vector(2))])
+        self.index.rebuild(iter([(2, self.vector(2)), (5, self.vector(5))]))
+        self.assertEqual(sorted(pin_id for pin_id, _ in self.index.search(self.vector(5), 5)), [2, 5])
+        self.assertIsNone(self.index.vector_for(1))
+
+    def test_search_uses_one_snapshot(self):
+        self.index.append([(1, self.vector(1)), (2, self.vector(2))])
+        refresh = self.index.refresh
+
+        def racing_refresh():
+            # another thread maps a newer, longer index right after this one's snapshot
+            snapshot = refresh()
+            self.index.append([(3, self.vector(1))])
+            refresh()
+            return snapshot
+
+        with mock.patch.object(self.index, 'refresh', racing_refresh):
+            results = self.index.search(self.vector(1), 5)
+        self.assertEqual(sorted(pin_id for pin_id, _ in results), [1, 2])
+
+    def test_endpoint_lists_most_similar_first(self):
+        user = make_user('lookalike')
+        with override_settings(SIMILAR_INDEX_DIR=self.directory), self.captureOnCommitCallbacks(execute=True):
+            pins = [
+                make_pin(user, f'Look {seed}', image=SimpleUploadedFile(f'{seed}.jpg', pattern_bytes(seed)))
+                for seed in (1, 1, 2)
+            ]
+        pins[2].delete()
+        client = APIClient()
+        client.force_authenticate(user)
+        with override_settings(SIMILAR_INDEX_DIR=self.directory):
+            data = client.get(reverse('similar-pins', kwargs={'pk': pins[0].pk})).data
+        self.assertEqual([pin['id'] for pin in data], [pins[1].pk])
+        self.assertGreater(data[0]['similarity'], 0.99)
+
+
+class VideoUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('filmmaker')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.data = os.urandom(uploads.BLOCK_SIZE * 2 + 100)
+        response = self.client.post(reverse('video-upload-create'), {'filename': 'clip.mp4', 'size': len(self.data)})
+        self.upload = VideoUpload.objects.get(pk=response.data['id'])
+        self.url = reverse('video-upload-details', kwargs={'upload_id': self.upload.pk})
+
+    def put(self, offset, chunk):
+        return self.client.put(self.url, chunk, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def offset(self):
+        return int(self.client.get(self.url)['Upload-Offset'])
+
+    def test_chunks_resume_at_the_offset(self):
+        self.assertEqual(self.put(0, self.data[:1000]).data, {'offset': 1000})
+        self.assertEqual(self.put(500, self.data[500:2000]).status_code, 409)
+        self.assertEqual(self.put(1000, self.data[1000:]).data['offset'], len(self.data))
+        with open(uploads.staged_path(self.upload), 'rb') as staged:
+            self.assertEqual(staged.read(), self.data)
+
+    def test_interrupted_chunk_keeps_what_arrived(self):
+        class Dropped(io.BytesIO):
+            def read(self, size=-1):
+                if self.tell() >= uploads.BLOCK_SIZE:
+                    raise OSError('connection reset')
+                return super().read(size)
+
+        uploads.write_chunk(self.upload, 0, Dropped(self.data), len(self.data))
+        self.assertEqual(self.offset(), uploads.BLOCK_SIZE)
+        self.put(uploads.BLOCK_SIZE, self.data[uploads.BLOCK_SIZE:])
+        self.assertEqual(self.offset(), len(self.data))
+
+    def test_concurrent_chunk_is_turned_away_without_locking_the_row(self):
+        with open(uploads.staged_path(self.upload), 'wb') as staged:
+            fcntl.flock(staged, fcntl.LOCK_EX)
+            response = self.put(0, self.data[:10])
+            self.assertEqual((response.status_code, response.data['offset']), (409, 0))
+        self.assertEqual(self.put(0, self.data[:10]).data['offset'], 10)
+
+    def test_chunk_body_is_read_outside_a_transaction(self):
+        # the test case's own transaction aside, no atomic block is open while the body arrives
+        outer = list(connection.savepoint_ids)
+        seen = []
+
+        class Watched(io.BytesIO):
+            def read(self, size=-1):
+                seen.append(list(connection.savepoint_ids))
+                return super().read(size)
+
+        self.assertEqual(uploads.write_chunk(self.upload, 0, Watched(self.data[:100]), 100), 100)
+        self.assertTrue(seen)
+        self.assertTrue(all(savepoints == outer for savepoints in seen))
+
+    def test_rejects_chunks_past_the_declared_size(self):
+        response = self.put(0, self.data + b'extra')
+        self.assertEqual((response.status_code, response.data['offset']), (400, 0))
+
+    def test_finalize_creates_the_pin(self):
+        finalize = reverse('video-upload-finalize', kwargs={'upload_id': self.upload.pk})
+        self.put(0, self.data[:10])
+        self.assertEqual(self.client.post(finalize, {'title': 'Clip', 'description': 'Short'}).status_code, 409)
+        self.put(10, self.data[10:])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(finalize, {'title': 'Clip', 'description': 'Short'}).status_code, 202)
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.status, VideoUpload.Status.DONE)
+        with self.upload.pin.video.open('rb') as video:
+            self.assertEqual(video.read(), self.data)
+        self.assertFalse(os.path.exists(uploads.staged_path(self.upload)))
+        self.assertEqual(self.put(len(self.data), b'more').status_code, 409)
+
+    def test_expire_drops_stale_sessions(self):
+        self.put(0, self.data[:10])
+        VideoUpload.objects.filter(pk=self.upload.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(uploads.expire(timedelta(days=1)), 1)
+        self.assertFalse(os.path.exists(uploads.staged_path(self.upload)))
+        self.assertFalse(VideoUpload.objects.exists())
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('searcher')
+
+    def test_finds_pin_created_after_migrate(self):
+        # the SQLite triggers must survive every later migration that rebuilt pins_pin
+        pin = make_pin(self.user, 'Mountain cabins', 'Wooden huts above the tree line')
+        make_pin(self.user, 'Beach houses', 'By the sea')
+        self.assertEqual(list(search_pins(Pin.objects.all(), 'mountain')), [pin])
+        self.assertEqual(list(search_pins(Pin.objects.all(), 'moun')), [pin])
+
+    def test_follows_updates_and_deletes(self):
+        pin = make_pin(self.user, 'Autumn leaves', 'Orange and red')
+        Pin.objects.filter(pk=pin.pk).update(title='Winter snow')
+        pin.refresh_from_db()
+        pin.save()
+        self.assertFalse(search_pins(Pin.objects.all(), 'autumn').exists())
+        self.assertEqual(list(search_pins(Pin.objects.all(), 'winter')), [pin])
+        pin.delete()
+        self.assertFalse(search_pins(Pin.objects.all(), 'winter').exists())
+
+    def test_title_outranks_description(self):
+        in_description = make_pin(self.user, 'Kitchen', 'A garden view')
+        in_title = make_pin(self.user, 'Garden', 'Flowers')
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('no ranked search on this backend')
+        self.assertEqual(list(search_pins(Pin.objects.all(), 'garden')), [in_title, in_description])
+
+    def test_endpoint_pages_through_ranked_results(self):
+        in_description = make_pin(self.user, 'Kitchen', 'A garden view')
+        in_title = make_pin(self.user, 'Garden', 'Flowers')
+        make_pin(self.user, 'Garage', 'Tools')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch.object(KeysetPagination, 'page_size', 1):
+            first = client.get(reverse('pin-list-create'), {'search': 'gard'}).data
+            second = client.get(first['next']).data
+        self.assertEqual([pin['id'] for pin in first['results'] + second['results']], [in_title.pk, in_description.pk])
+        self.assertIsNone(second['next'])
+        titles = client.get(reverse('pin-list-create'), {'title': 'garden'}).data['results']
+        self.assertEqual([pin['id'] for pin in titles], [in_title.pk])
+
+    def test_blank_query_leaves_queryset_alone(self):
+        queryset = Pin.objects.all()
+        self.assertIs(search_pins(queryset, ' ,. '), queryset)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.viewer = make_user('viewer')
+        cls.pin = make_pin(cls.author, 'Lanterns')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        self.url = reverse('pin-details', kwargs={'pk': self.pin.pk})
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        return etag, self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pin_is_not_modified(self):
+        etag, response = self.revalidate(self.url)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_pin_edit_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        Pin.objects.filter(pk=self.pin.pk).update(updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_author_change_changes_etag(self):
+        for url in (self.url, reverse('pin-list-create')):
+            etag = self.client.get(url)['ETag']
+            self.author.bio = f'Now at {url}'
+            self.author.save()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_viewer_toggle_changes_etag(self):
+        for url in (self.url, reverse('pin-list-create')):
+            etag = self.client.get(url)['ETag']
+            with self.captureOnCommitCallbacks(execute=True):
+                SavePins.objects.create(user=self.viewer, pin=self.pin)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+            SavePins.objects.all().delete()
+
+    @override_settings(WRITE_BEHIND_ENABLED=True)
+    def test_buffered_toggle_changes_etag(self):
+        with mock.patch.object(writebehind, '_buffer', writebehind.ToggleBuffer(1000, 3600)):
+            etag = self.client.get(self.url)['ETag']
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('like-pin', kwargs={'pin_id': self.pin.pk}))
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(response.data['is_liked'], True)
+
+    def test_etags_differ_between_viewers(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_authenticate(self.author)
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('cached-author')
+        cls.reader = make_user('cached-reader')
+        cls.pin = make_pin(cls.author, 'Kites')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.url = reverse('pin-details', kwargs={'pk': self.pin.pk})
+
+    def test_serves_repeat_reads_from_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(3):
+            # validators, viewer flags (likes, saves); no render
+            self.client.get(self.url)
+
+    def test_pin_edit_invalidates(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pin.title = 'Gliders'
+            self.pin.save()
+        self.assertEqual(self.client.get(self.url).data['title'], 'Gliders')
+
+    def test_author_profile_edit_invalidates(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.bio = 'Flies kites'
+            self.author.save()
+        self.assertEqual(self.client.get(self.url).data['user']['bio'], 'Flies kites')
+
+    def test_follow_invalidates_author_counts(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.reader, followed_user=self.author)
+        self.assertEqual(self.client.get(self.url).data['user']['followers_count'], 1)
+
+    def test_follow_bumps_only_the_two_users(self):
+        self.client.get(self.url)
+        with mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            with self.captureOnCommitCallbacks(execute=True):
+                Follow.objects.create(follower=self.reader, followed_user=self.author)
+        bumped = {key for call in set_many.call_args_list for key in call.args[0] if key.endswith(':version')}
+        self.assertEqual(bumped, {f'user:{self.reader.pk}:version', f'user:{self.author.pk}:version'})
+
+    def test_commenter_profile_edit_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(pin=self.pin, user=self.reader, content='Nice')
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.bio = 'Reads pins'
+            self.reader.save()
+        self.assertEqual(self.client.get(self.url).data['comments'][0]['user']['bio'], 'Reads pins')
+
+    def test_login_does_not_invalidate(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.last_login = timezone.now()
+            self.author.save(update_fields=['last_login'])
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+
+class WriteBehindTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [make_user(f'toggler{i}') for i in range(3)]
+        cls.pins = [make_pin(cls.users[0], f'Pin {i}') for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self, pin):
+        pin.refresh_from_db()
+        return pin.likes_count, pin.saves_count
+
+    def test_flush_writes_rows_and_counters(self):
+        buffer = writebehind.ToggleBuffer(1000, 3600)
+        pin = self.pins[0]
+        for user in self.users:
+            buffer.toggle('like', user.pk, pin.pk, True)
+        buffer.toggle('save', self.users[0].pk, pin.pk, True)
+        # the last toggle of a (user, pin) wins
+        buffer.toggle('like', self.users[2].pk, pin.pk, False)
+        self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(self.counts(pin), (2, 1))
+        self.assertEqual(set(pin.likes.values_list('pk', flat=True)), {self.users[0].pk, self.users[1].pk})
+        self.assertEqual(LikePins.objects.filter(pin=pin).count(), 2)
+
+    def test_counters_follow_rows_actually_changed(self):
+        buffer = writebehind.ToggleBuffer(1000, 3600)
+        pin = self.pins[1]
+        buffer.toggle('like', self.users[0].pk, pin.pk, True)
+        buffer.toggle('like', self.users[1].pk, pin.pk, False)
+        # written by another request while the toggles sat in the buffer
+        LikePins.objects.create(user=self.users[0], pin=pin)
+        buffer.flush()
+        self.assertEqual(self.counts(pin), (1, 0))
+
+    def test_pending_is_per_user_and_kind(self):
+        buffer = writebehind.ToggleBuffer(1000, 3600)
+        buffer.toggle('like', self.users[0].pk, self.pins[0].pk, True)
+        buffer.toggle('like', self.users[0].pk, self.pins[1].pk, False)
+        buffer.toggle('save', self.users[0].pk, self.pins[2].pk, True)
+        buffer.toggle('like', self.users[1].pk, self.pins[2].pk, True)
+        self.assertEqual(buffer.pending('like', self.users[0].pk), {self.pins[0].pk: True, self.pins[1].pk: False})
+        self.assertEqual(buffer.pending('save', self.users[1].pk), {})
+        buffer.flush()
+        self.assertEqual(buffer.pending('like', self.users[0].pk), {})
+
+    def test_other_workers_see_pending_toggles(self):
+        worker, other = writebehind.ToggleBuffer(1000, 3600), writebehind.ToggleBuffer(1000, 3600)
+        worker.toggle('like', self.users[0].pk, self.pins[0].pk, True)
+        self.assertEqual(other.pending('like', self.users[0].pk), {self.pins[0].pk: True})
+        # a newer toggle from the other worker outlives the first worker's flush
+        other.toggle('like', self.users[0].pk, self.pins[1].pk, True)
+        worker.flush()
+        self.assertEqual(other.pending('like', self.users[0].pk), {self.pins[1].pk: True})
+        other.flush()
+        self.assertEqual(worker.pending('like', self.users[0].pk), {})
+
+    def test_full_buffer_writes_through(self):
+        buffer = writebehind.ToggleBuffer(1000, 3600, max_pending=2)
+        first, second, third = (user.pk for user in self.users)
+        pin = self.pins[0].pk
+        with mock.patch.object(writebehind, '_buffer', buffer):
+            writebehind.toggle('save', first, pin, True)
+            writebehind.toggle('save', second, pin, True)
+            with mock.patch.object(writebehind, 'apply', side_effect=RuntimeError), \
+                    self.assertLogs('pins.writebehind'):
+                buffer.flush()
+            # full: written now instead
+            writebehind.toggle('save', third, pin, True)
+            self.assertEqual(list(SavePins.objects.values_list('user_id', flat=True)), [third])
+            # and an older buffered toggle of the same pair is dropped, so the flush cannot undo it
+            writebehind.toggle('save', first, pin, False)
+        self.assertEqual(buffer.pending('save', first), {})
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(set(SavePins.objects.values_list('user_id', flat=True)), {second, third})
+        self.assertEqual(self.counts(self.pins[0]), (0, 2))
+
+    def test_full_buffer_flushes_inline(self):
+        buffer = writebehind.ToggleBuffer(2, 3600)
+        buffer.toggle('save', self.users[0].pk, self.pins[0].pk, True)
+        buffer.toggle('save', self.users[0].pk, self.pins[0].pk, False)
+        self.assertFalse(SavePins.objects.exists())
+        buffer.toggle('save', self.users[1].pk, self.pins[0].pk, True)
+        self.assertEqual(SavePins.objects.count(), 1)
+
+    def test_failed_flush_keeps_toggles(self):
+        buffer = writebehind.ToggleBuffer(1000, 3600)
+        buffer.toggle('save', self.users[0].pk, self.pins[0].pk, True)
+        with mock.patch.object(writebehind, 'apply', side_effect=RuntimeError), self.assertLogs('pins.writebehind'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending('save', self.users[0].pk), {self.pins[0].pk: True})
+        self.assertEqual(buffer.flush(), 1)
+
+    def test_journal_is_replayed_after_a_crash(self):
+        with tempfile.TemporaryDirectory() as directory:
+            crashed = writebehind.ToggleBuffer(1000, 3600, journal_dir=directory)
+            crashed.toggle('like', self.users[1].pk, self.pins[2].pk, True)
+            crashed._journal.seal()
+            # make the segment look like a dead process's
+            for name in os.listdir(directory):
+                os.rename(os.path.join(directory, name), os.path.join(directory, '999999999' + name[name.index('-'):]))
+            recovered = writebehind.ToggleBuffer(1000, 3600, journal_dir=directory)
+            self.assertEqual(recovered.pending('like', self.users[1].pk), {self.pins[2].pk: True})
+            recovered.flush()
+            self.assertEqual(os.listdir(directory), [])
+        self.assertEqual(self.counts(self.pins[2]), (1, 0))
+
+
+class ViewerStateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('viewing')
+        cls.pins = [make_pin(cls.user, f'Viewed {i}') for i in range(6)]
+        LikePins.objects.create(user=cls.user, pin=cls.pins[0])
+        SavePins.objects.create(user=cls.user, pin=cls.pins[1])
+
+    def test_a_page_costs_one_query_per_flag(self):
+        state = ViewerState(self.user)
+        with self.assertNumQueries(2):
+            state.prime([pin.pk for pin in self.pins])
+            flags = [(state.flag('is_liked', pin.pk), state.flag('is_saved', pin.pk)) for pin in self.pins]
+        self.assertEqual(flags[:3], [(True, False), (False, True), (False, False)])
+
+    def test_list_flags_match_the_viewer(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        results = client.get(reverse('pin-list-create')).data['results']
+        liked = {pin['id'] for pin in results if pin['is_liked']}
+        saved = {pin['id'] for pin in results if pin['is_saved']}
+        self.assertEqual((liked, saved), ({self.pins[0].pk}, {self.pins[1].pk}))
+
+
+@override_settings(VIEWER_STATE_CACHE_LIMIT=10)
+class ViewerStateCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('flagger')
+        cls.pins = [make_pin(cls.user, f'Pin {i}') for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_user_without_flags_is_answered_from_cache(self):
+        ViewerState(self.user).prime([pin.pk for pin in self.pins])
+        with self.assertNumQueries(0):
+            state = ViewerState(self.user)
+            self.assertFalse(state.flag('is_liked', self.pins[0].pk))
+            self.assertFalse(state.flag('is_saved', self.pins[1].pk))
+
+    def test_flag_changes_drop_the_cached_sets(self):
+        ViewerState(self.user).prime([self.pins[0].pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            SavePins.objects.create(user=self.user, pin=self.pins[0])
+        self.assertTrue(ViewerState(self.user).flag('is_saved', self.pins[0].pk))
+
+    @override_settings(VIEWER_STATE_CACHE_LIMIT=1)
+    def test_users_over_the_limit_are_queried(self):
+        for pin in self.pins[:2]:
+            SavePins.objects.create(user=self.user, pin=pin)
+        ViewerState(self.user).prime([self.pins[0].pk])
+        # likes still come from the cached (empty) set, saves from an IN query
+        with self.assertNumQueries(1):
+            state = ViewerState(self.user)
+            self.assertTrue(state.flag('is_saved', self.pins[1].pk))
+
+
+class PinListQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = make_user('lister')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def add_pins(self, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            self.add_pin(i)
+
+    def add_pin(self, i):
+        author = make_user(f'lister-{i}')
+        # the image files do not exist, so leave the variant and metadata jobs uncommitted
+        pin = make_pin(author, f'Pin {i}', image=f'pins/images/{i}.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            # following backfills the viewer's feed
+            Follow.objects.create(follower=self.viewer, followed_user=author)
+        ImageVariant.objects.create(
+            source=pin.image.name, format='webp', width=320, height=240, file=f'pins/variants/{i}-320.webp',
+        )
+        comment = Comment.objects.create(pin=pin, user=author, content='Nice')
+        CommentReplies.objects.create(comment=comment, user=self.viewer, content='Thanks')
+        LikePins.objects.create(user=self.viewer, pin=pin)
+
+    def queries(self, url, expected):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), expected)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        for url in (reverse('pin-list-create'), reverse('feed')):
+            Pin.objects.all().delete()
+            self.add_pins(2)
+            few = self.queries(url, 2)
+            self.add_pins(6)
+            self.assertEqual(self.queries(url, 8), few, url)
@@ -0,0 +1,117 @@
+"""
+Reply trees for comments.
+
+Rendering stops after REPLY_TREE_MAX_DEPTH levels and
+REPLY_TREE_MAX_CHILDREN replies per node; whatever is cut off is reachable
+through a `more_replies` link into the replies endpoint. Only the rendered
+part is loaded: `reply_prefetches()` fetches one level per query, each cut
+to the first REPLY_TREE_MAX_CHILDREN + 1 replies of every node (the extra
+one tells whether a link is needed), so a thread renders in a bounded
+number of queries and rows however large it grows. `ReplyThread` indexes
+the loaded rows by parent in memory and the serializers walk it; reply
+counts come from a `children_count` annotation on each row.
+"""
+from collections import defaultdict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+from django.urls import reverse
+
+from .models import CommentReplies
+from .pagination import CommentPagination
+
+
+def max_depth():
+    return getattr(settings, 'REPLY_TREE_MAX_DEPTH', 5)
+
+
+def max_children():
+    return getattr(settings, 'REPLY_TREE_MAX_CHILDREN', 10)
+
+
+class ReplyThread:
+    """
+    The replies of one comment below `root` (a reply id, or None for the
+    comment itself). `replies` are the top-level rows as loaded by
+    `reply_prefetches()`, in (created_date, id) order; each loaded row gets a
+    `thread` attribute pointing back here.
+    """
+
+    def __init__(self, pin_id, comment_id, replies, root=None):
+        self.pin_id = pin_id
+        self.comment_id = comment_id
+        self.children = defaultdict(list)
+        self.rows = {}
+        level = list(replies)
+        while level:
+            for reply in level:
+                self.children[reply.parent_reply_id].append(reply)
+                self.rows[reply.pk] = reply
+                reply.thread = self
+            level = [child for reply in level for child in getattr(reply, 'loaded_replies', ())]
+
+        # depths relative to root, only as far down as will be rendered
+        self.depth = {root: -1}
+        level, depth = [root], 0
+        while level and depth < max_depth():
+            level = [child.pk for parent in level for child in self.children.get(parent, ())]
+            self.depth.update((pk, depth) for pk in level)
+            depth += 1
+
+    def expands(self, parent_id):
+        depth = self.depth.get(parent_id)
+        return depth is not None and depth + 1 < max_depth()
+
+    def shown_children(self, parent_id):
+        if not self.expands(parent_id):
+            return []
+        return self.children.get(parent_id, [])[:max_children()]
+
+    def count(self, parent_id):
+        reply = self.rows.get(parent_id)
+        if reply is not None and hasattr(reply, 'children_count'):
+            return reply.children_count
+        return len(self.children.get(parent_id, ()))
+
+    def more_link(self, request, parent_id):
+        """Where to fetch the replies to `parent_id` that were not rendered, or None."""
+        children = self.children.get(parent_id, ())
+        if request is None or not self.count(parent_id):
+            return None
+        if self.expands(parent_id):
+            if len(children) <= max_children():
+                return None
+            after = children[max_children() - 1]
+        else:
+            after = None
+
+        url = reverse('comment-replies-create', kwargs={'pin_id': self.pin_id, 'pk': self.comment_id})
+        if parent_id is not None:
+            url = f'{url}?{urlencode({"parent": parent_id})}'
+        return CommentPagination.link_after(request, url, after)
+
+
+def reply_prefetches(replies, levels, first=None):
+    """
+    Prefetches for `levels` levels of replies below the objects they are
+    applied to, each a `loaded_replies` list of the first max_children() + 1
+    rows of `replies` (or of `first`, for the top level) under its parent.
+    """
+    lookups, path = [], ''
+    for level in range(levels):
+        queryset = first if level == 0 and first is not None else replies
+        lookups.append(Prefetch(f'{path}replies', queryset=queryset[:max_children() + 1], to_attr='loaded_replies'))
+        path += 'loaded_replies__'
+    return lookups
+
+
+def attach_thread(serializer, pin_id, comment_id, replies, root=None):
+    """
+    Load the rendered part of the trees below `replies`, planned by the reply
+    `serializer`, and attach it to them; they are rendered as the children of
+    `root`.
+    """
+    rows = serializer.setup_eager_loading(CommentReplies.objects.all())
+    prefetch_related_objects(replies, *reply_prefetches(rows, max_depth() - 1))
+    return ReplyThread(pin_id, comment_id, replies, root=root)
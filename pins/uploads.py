@@ -0,0 +1,204 @@
+"""
+Resumable chunked video uploads.
+
+A client creates a VideoUpload session with the file's name and size, then
+PUTs the bytes in any number of chunks, each tagged with the offset it
+starts at (`Upload-Offset`). Chunks are streamed from the request straight
+into one staging file under VIDEO_UPLOAD_STAGING_DIR at that offset, a
+block at a time, so neither a chunk nor the file is ever held in memory,
+and there is nothing to assemble afterwards. A chunk cut off mid-way still
+counts for the bytes that arrived; the client asks for the session's offset
+and carries on from there.
+
+Finalizing a complete upload validates the pin fields and returns at once.
+Handing the staged file to storage (Cloudinary in production) and creating
+the Pin happen on a thread pool of VIDEO_UPLOAD_WORKERS threads, after
+which the session reports `done` and the pin id. With 0 workers this runs
+inline.
+"""
+import fcntl
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status
+
+from boards.membership import change_pins
+from boards.models import Board
+from .models import Pin, VideoUpload
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=status.HTTP_409_CONFLICT, **extra):
+        super().__init__(message)
+        self.status_code = status_code
+        self.extra = extra
+
+
+def staging_dir():
+    return getattr(settings, 'VIDEO_UPLOAD_STAGING_DIR', os.path.join(settings.BASE_DIR, 'var', 'uploads'))
+
+
+def max_size():
+    return getattr(settings, 'VIDEO_UPLOAD_MAX_SIZE', 1024 ** 3)
+
+
+def workers():
+    return getattr(settings, 'VIDEO_UPLOAD_WORKERS', 2)
+
+
+def staged_path(upload):
+    return os.path.join(staging_dir(), f'{upload.pk}.part')
+
+
+def discard(upload):
+    """Remove the session's staged file, if any."""
+    try:
+        os.remove(staged_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def write_chunk(upload, offset, stream, length):
+    """
+    Append `length` bytes read from `stream` to the upload at `offset`, which
+    must be where the previous chunk stopped. Returns the new offset.
+
+    Chunks of one session are serialized by an flock on the staged file, so
+    no transaction or row lock is held while the body arrives; a second
+    concurrent PUT is turned away at once. Only the final offset update runs
+    under select_for_update.
+    """
+    os.makedirs(staging_dir(), exist_ok=True)
+    with open(os.open(staged_path(upload), os.O_RDWR | os.O_CREAT, 0o600), 'r+b') as staged:
+        try:
+            fcntl.flock(staged, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another chunk of this upload is being written.", offset=upload.received)
+
+        # nothing else moves the offset while the claim is held
+        upload = VideoUpload.objects.filter(pk=upload.pk).first()
+        if upload is None:
+            raise UploadError("This upload no longer exists.", status.HTTP_404_NOT_FOUND)
+        if upload.status != VideoUpload.Status.UPLOADING:
+            raise UploadError("This upload is no longer accepting data.", offset=upload.received)
+        if offset != upload.received:
+            raise UploadError("Chunk does not start at the upload offset.", offset=upload.received)
+        if offset + length > upload.size:
+            raise UploadError(
+                "Chunk runs past the declared upload size.", status.HTTP_400_BAD_REQUEST, offset=upload.received
+            )
+
+        written = 0
+        staged.seek(offset)
+        staged.truncate()
+        try:
+            while written < length:
+                block = stream.read(min(BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                staged.write(block)
+                written += len(block)
+        except OSError:
+            # the client went away; keep what arrived so it can resume from there
+            logger.info("Upload %s interrupted after %d bytes of a chunk", upload.pk, written)
+        staged.flush()
+        os.fsync(staged.fileno())
+
+        with transaction.atomic():
+            # a cancel may have landed while the body was arriving
+            upload = VideoUpload.objects.select_for_update().filter(pk=upload.pk).first()
+            if upload is None:
+                raise UploadError("This upload no longer exists.", status.HTTP_404_NOT_FOUND)
+            if upload.status != VideoUpload.Status.UPLOADING:
+                raise UploadError("This upload is no longer accepting data.", offset=upload.received)
+            upload.received = offset + written
+            upload.save(update_fields=['received', 'updated_at'])
+    return upload.received
+
+
+def finalize(upload, pin_data):
+    """Queue a fully received upload to be stored and turned into a pin."""
+    with transaction.atomic():
+        upload = VideoUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.status not in (VideoUpload.Status.UPLOADING, VideoUpload.Status.FAILED):
+            raise UploadError("This upload has already been finalized.")
+        if upload.received != upload.size:
+            raise UploadError("The upload is incomplete.", offset=upload.received)
+        upload.status = VideoUpload.Status.PROCESSING
+        upload.pin_data = pin_data
+        upload.error = ''
+        upload.save(update_fields=['status', 'pin_data', 'error', 'updated_at'])
+        transaction.on_commit(lambda: _submit(upload.pk))
+    return upload
+
+
+def _submit(upload_id):
+    global _pool
+    if not workers():
+        finish(upload_id)
+        return
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(workers(), thread_name_prefix='video-upload')
+    _pool.submit(_finish_in_thread, upload_id)
+
+
+def _finish_in_thread(upload_id):
+    try:
+        finish(upload_id)
+    finally:
+        connection.close()
+
+
+def finish(upload_id):
+    """Store the staged file and create its pin; marks the session failed instead of raising."""
+    upload = VideoUpload.objects.select_related('user').get(pk=upload_id)
+    try:
+        data = dict(upload.pin_data)
+        board_id = data.pop('board', None)
+        field = Pin._meta.get_field('video')
+        with open(staged_path(upload), 'rb') as staged:
+            name = field.storage.save(field.generate_filename(None, upload.filename), File(staged, upload.filename))
+        with transaction.atomic():
+            pin = Pin.objects.create(user=upload.user, video=name, **data)
+            board = Board.objects.filter(pk=board_id).first() if board_id is not None else None
+            if board is not None:
+                change_pins(board, add=[pin.pk])
+            upload.status = VideoUpload.Status.DONE
+            upload.pin = pin
+            upload.save(update_fields=['status', 'pin', 'updated_at'])
+    except Exception as exc:
+        logger.exception("Could not store video upload %s", upload.pk)
+        # the staged file is kept, so finalizing again retries
+        upload.status = VideoUpload.Status.FAILED
+        upload.error = str(exc)[:255]
+        upload.save(update_fields=['status', 'error', 'updated_at'])
+        return
+    discard(upload)
+
+
+def expire(older_than):
+    """Delete sessions not finished within `older_than` (a timedelta) and their staged files."""
+    stale = VideoUpload.objects.filter(
+        status__in=[VideoUpload.Status.UPLOADING, VideoUpload.Status.FAILED],
+        updated_at__lt=timezone.now() - older_than,
+    )
+    expired = list(stale)
+    for upload in expired:
+        discard(upload)
+    stale.filter(pk__in=[upload.pk for upload in expired]).delete()
+    return len(expired)
+
@@ -2,6 +2,9 @@ from django.urls import path
 from .views import (
     PinListCreate,
     PinDetails,
+    PinDuplicates,
+    SimilarPins,
+    FeedView,
     SavePin,
     UserCreatedPins,
     UserSavedPins,
@@ -9,16 +12,25 @@ from .views import (
     CommentDetails,
     CommentRepliesCreate,
     CommentReplyDetails,
-    LikePin
+    LikePin,
+    VideoUploadCreate,
+    VideoUploadDetails,
+    VideoUploadFinalize,
 )
 
 urlpatterns = [
     path('pins/', PinListCreate.as_view(), name='pin-list-create'),
     path('pins/<int:pk>/', PinDetails.as_view(), name='pin-details'),
+    path('pins/<int:pk>/duplicates/', PinDuplicates.as_view(), name='pin-duplicates'),
+    path('pins/<int:pk>/similar/', SimilarPins.as_view(), name='similar-pins'),
+    path('feed/', FeedView.as_view(), name='feed'),
     path('pins/<int:pin_id>/save/', SavePin.as_view(), name='save-pin'),
     path('pins/<int:pin_id>/like/', LikePin.as_view(), name='like-pin'),
     path('pins/created/', UserCreatedPins.as_view(), name='user-created-pins'),
     path('pins/saved/', UserSavedPins.as_view(), name='user-saved-pins'),
+    path('uploads/videos/', VideoUploadCreate.as_view(), name='video-upload-create'),
+    path('uploads/videos/<uuid:upload_id>/', VideoUploadDetails.as_view(), name='video-upload-details'),
+    path('uploads/videos/<uuid:upload_id>/finalize/', VideoUploadFinalize.as_view(), name='video-upload-finalize'),
     path('pins/<int:pin_id>/comments/', CommentListCreate.as_view(), name='comment-list-create'),
     path('pins/<int:pin_id>/comments/<int:pk>/', CommentDetails.as_view(), name='comment-detail'),
     path('pins/<int:pin_id>/comments/<int:pk>/replies/', CommentRepliesCreate.as_view(), name='comment-replies-create'),
@@ -0,0 +1,123 @@
+"""
+Viewer state for pins: whether the requesting user has liked or saved them.
+
+One `ViewerState` is shared by a whole render through the serializer
+context. List serializers prime it with every pin id on the page, so the
+flags cost one `pin_id IN (...)` query against LikePins and one against
+SavePins per response, however many pins (or boards of pins) it holds.
+
+With VIEWER_STATE_CACHE_LIMIT set, a user's complete liked and saved id
+sets are kept in the cache instead (for users with up to that many), and
+flags are answered without touching the database at all.
+
+Every change to a user's flags, buffered toggles included, moves a version
+token; `marker()` puts it in the ETags of responses that render the flags.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from DreamBoard.cache import bump_version, get_version
+from . import writebehind
+from .models import LikePins, SavePins
+
+FLAGS = (('is_liked', LikePins), ('is_saved', SavePins))
+# the pins.writebehind toggle kind behind each flag
+KINDS = {'is_liked': 'like', 'is_saved': 'save'}
+
+
+def cache_limit():
+    return getattr(settings, 'VIEWER_STATE_CACHE_LIMIT', 0)
+
+
+def _cache_key(flag, user_id):
+    return f'viewer:{user_id}:{flag}'
+
+
+def forget(user_id):
+    """Drop a user's cached id sets once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete_many([_cache_key(flag, user_id) for flag, _ in FLAGS]))
+    changed(user_id)
+
+
+def changed(user_id):
+    """Note that the user's flags render differently now, e.g. for a toggle still in the write-behind buffer."""
+    bump_version('viewer', user_id)
+
+
+def marker(user):
+    """ETag source for the requesting user's flags: moves whenever any of them may have."""
+    if user is None or not user.is_authenticated:
+        return ''
+    return f'{user.pk}:{get_version("viewer", user.pk)}'
+
+
+def _cached_ids(flag, model, user_id):
+    """The user's full id set for `flag`, or None when caching is off or the user has too many."""
+    limit = cache_limit()
+    if not limit:
+        return None
+    key = _cache_key(flag, user_id)
+    ids = cache.get(key)
+    if ids is None:
+        rows = model.objects.filter(user_id=user_id).values_list('pin_id', flat=True)[:limit + 1]
+        # cache an over-limit user as False so the next request skips straight to the IN query
+        ids = frozenset(rows) if len(rows) <= limit else False
+        cache.set(key, ids, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+    # an empty set is a complete answer too: the user has flagged nothing
+    return None if ids is False else ids
+
+
+class ViewerState:
+    def __init__(self, user):
+        self.user = user
+        self.known = set()
+        self.ids = {flag: set() for flag, _ in FLAGS}
+
+    def prime(self, pin_ids):
+        """Load the flags of every pin in `pin_ids` not seen yet, one query per flag at most."""
+        missing = set(pin_ids) - self.known
+        if not missing:
+            return
+        for flag, model in FLAGS:
+            cached = _cached_ids(flag, model, self.user.pk)
+            if cached is not None:
+                self.ids[flag].update(missing & cached)
+            else:
+                rows = model.objects.filter(user=self.user, pin_id__in=missing).values_list('pin_id', flat=True)
+                self.ids[flag].update(rows)
+            # read-your-writes: toggles still waiting in the write-behind buffer
+            for pin_id, state in writebehind.pending(KINDS[flag], self.user.pk).items():
+                if pin_id in missing:
+                    (self.ids[flag].add if state else self.ids[flag].discard)(pin_id)
+        self.known |= missing
+
+    def flag(self, name, pin_id):
+        self.prime([pin_id])
+        return pin_id in self.ids[name]
+
+    def fill(self, pins):
+        """Set the flags on already rendered pin dicts, e.g. from the response cache, in one batch."""
+        pins = [pin for pin in pins if any(flag in pin for flag, _ in FLAGS)]
+        self.prime([pin['id'] for pin in pins if 'id' in pin])
+        for pin in pins:
+            for flag, _ in FLAGS:
+                if flag in pin:
+                    pin[flag] = pin.get('id') in self.ids[flag]
+
+
+def viewer_state_for(context):
+    """
+    The ViewerState of the render that owns `context`, created on first use.
+    None for anonymous requests and for shared renders that end up in the
+    response cache, which must stay viewer-independent.
+    """
+    if context.get('shared'):
+        return None
+    state = context.get('viewer_state')
+    if state is None:
+        user = getattr(context.get('request'), 'user', None)
+        if user is None or not user.is_authenticated:
+            return None
+        state = context['viewer_state'] = ViewerState(user)
+    return state
@@ -1,138 +1,528 @@
+from django.db.models import F
 from django.shortcuts import get_object_or_404
-from rest_framework import generics, views
+from rest_framework import generics, status, views
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from .models import Board, Pin, Comment, CommentReplies, LikePins, SavePins
-from .serializers import BoardSerializer, PinSerializer, CommentSerializer, CommentRepliesSerializer
-from .filters import BoardFilter, PinFilter
-from accounts.models import Follow
+from .models import Pin, Comment, CommentReplies, LikePins, SavePins, VideoUpload
+from .serializers import (
+    PinSerializer, CommentSerializer, CommentRepliesSerializer, VideoUploadSerializer, VideoPinSerializer
+)
+from .filters import PinFilter
+from .pagination import CommentPagination, FeedPagination
+from . import dedup, similar, uploads, viewer, writebehind
+from .threads import attach_thread
+from .viewer import ViewerState
+from DreamBoard.cache import CachedRetrieveMixin
+from DreamBoard.conditional import ConditionalGetMixin
+from DreamBoard.pagination import KeysetPagination
 
-class BoardListCreate(generics.ListCreateAPIView):
+class PinListCreate(ConditionalGetMixin, generics.ListCreateAPIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
-    queryset = Board.objects.all()
-    serializer_class = BoardSerializer
-    filterset_class = BoardFilter
+    queryset = Pin.objects.all()
+    serializer_class = PinSerializer
+    filterset_class = PinFilter
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return self.get_serializer().setup_eager_loading(Pin.objects.all())
+
+    def get_validators(self):
+        # pins embed their author and the viewer's is_liked/is_saved, neither of which moves Pin.updated_at
+        pins = Pin.objects.annotate(author_updated_at=F('user__updated_at'))
+        return self.page_validators(
+            pins, stamp_fields=('updated_at', 'author_updated_at'), marker=viewer.marker(self.request.user)
+        )
 
     @swagger_auto_schema(
-        operation_description="Retrieve a list of boards or create a new board.",
-        responses={200: BoardSerializer(many=True), 201: BoardSerializer, 400: "Bad Request"}
+        operation_description="Retrieve a list of pins or create a new pin.",
+        responses={200: PinSerializer(many=True), 201: PinSerializer, 400: "Bad Request"}
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
     @swagger_auto_schema(
-        operation_description="Create a new board.",
-        request_body=BoardSerializer,
-        responses={201: BoardSerializer, 400: "Bad Request"}
+        operation_description="Create a new pin.",
+        request_body=PinSerializer,
+        responses={201: PinSerializer, 400: "Bad Request"}
     )
     def post(self, request, *args, **kwargs):
         return super().post(request, *args, **kwargs)
 
-class BoardDetails(generics.RetrieveUpdateDestroyAPIView):
+class PinDetails(ConditionalGetMixin, CachedRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
-    queryset = Board.objects.all()
-    serializer_class = BoardSerializer
+    queryset = Pin.objects.all()
+    serializer_class = PinSerializer
+    cache_prefix = 'pin'
+
+    def get_queryset(self):
+        return self.get_serializer().setup_eager_loading(Pin.objects.all())
+
+    def get_validators(self):
+        state = Pin.objects.filter(pk=self.kwargs['pk']).values_list('updated_at', 'user__updated_at').first()
+        if state is None:
+            return None
+        updated_at, author_updated_at = state
+        source = f'{updated_at.isoformat()}|{author_updated_at.isoformat()}|{viewer.marker(self.request.user)}'
+        # no Last-Modified: a toggle still in the write-behind buffer moves no timestamp, only the ETag
+        return source, None
+
+    def add_viewer_data(self, data):
+        ViewerState(self.request.user).fill([data])
+        return data
 
     @swagger_auto_schema(
-        operation_description="Retrieve, update, or delete a specific board.",
-        responses={200: BoardSerializer, 204: "No Content", 400: "Bad Request", 404: "Not Found"}
+        operation_description="Retrieve, update, or delete a specific pin.",
+        responses={200: PinSerializer, 204: "No Content", 400: "Bad Request", 404: "Not Found"}
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
     @swagger_auto_schema(
-        operation_description="Update a specific board.",
-        request_body=BoardSerializer,
-        responses={200: BoardSerializer, 400: "Bad Request", 404: "Not Found"}
+        operation_description="Update a specific pin.",
+        request_body=PinSerializer,
+        responses={200: PinSerializer, 400: "Bad Request", 404: "Not Found"}
     )
     def put(self, request, *args, **kwargs):
         return super().put(request, *args, **kwargs)
 
     @swagger_auto_schema(
-        operation_description="Delete a specific board.",
+        operation_description="Delete a specific pin.",
         responses={204: "No Content", 400: "Bad Request", 404: "Not Found"}
     )
     def delete(self, request, *args, **kwargs):
         return super().delete(request, *args, **kwargs)
 
-class AddPinToBoard(views.APIView):
+class PinDuplicates(generics.ListAPIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
+    serializer_class = PinSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        return self.get_serializer().setup_eager_loading(Pin.objects.all())
+
+    def list(self, request, *args, **kwargs):
+        pin = get_object_or_404(Pin.objects.only('pk', 'image_hash'), pk=self.kwargs['pk'])
+        try:
+            max_distance = int(request.query_params.get('distance', dedup.duplicate_distance()))
+        except ValueError:
+            return Response({"error": "distance must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= max_distance <= dedup.MAX_DISTANCE:
+            return Response(
+                {"error": f"distance must be between 0 and {dedup.MAX_DISTANCE}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        matches = dedup.duplicates_of(pin, max_distance)
+        pins = self.get_queryset().in_bulk([pin_id for pin_id, _ in matches])
+        found = [(pins[pin_id], distance) for pin_id, distance in matches if pin_id in pins]
+        data = self.get_serializer([duplicate for duplicate, _ in found], many=True).data
+        for item, (_, distance) in zip(data, found):
+            item['distance'] = distance
+        return Response(data)
 
     @swagger_auto_schema(
-        operation_description="Add a pin to a specific board.",
-        request_body=openapi.Schema(
-            type=openapi.TYPE_OBJECT,
-            properties={
-                'id': openapi.Schema(type=openapi.TYPE_INTEGER, description='Pin ID')
-            },
-            required=['id']
-        ),
-        responses={200: BoardSerializer, 400: "Bad Request", 404: "Not Found"}
+        operation_description="List pins whose image is a near-duplicate of this pin's, nearest first, "
+                              "each with the Hamming `distance` between their image hashes.",
+        manual_parameters=[
+            openapi.Parameter('distance', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description="Largest hash distance to match (default PIN_DUPLICATE_DISTANCE).")
+        ],
+        responses={200: PinSerializer(many=True), 400: "Bad Request", 404: "Not Found"}
     )
-    def post(self, request, pk):
-        board = get_object_or_404(Board, pk=pk)
-        pin_id = request.data.get("id")
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+class SimilarPins(generics.ListAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = PinSerializer
+    pagination_class = None
+    max_limit = 50
+
+    def get_queryset(self):
+        return self.get_serializer().setup_eager_loading(Pin.objects.all())
 
-        if not pin_id:
-            return Response({"error": "Pin ID is required"}, status=400)
+    def list(self, request, *args, **kwargs):
+        get_object_or_404(Pin.objects.only('pk'), pk=self.kwargs['pk'])
+        try:
+            limit = int(request.query_params.get('limit', similar.default_limit()))
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, self.max_limit))
 
-        board.pins.add(pin_id)
-        serializer = BoardSerializer(board)
-        return Response(serializer.data)
+        # ask for a few extra rows to cover pins deleted since they were indexed
+        matches = similar.similar_to(self.kwargs['pk'], limit + 10)
+        pins = self.get_queryset().in_bulk([pin_id for pin_id, _ in matches])
+        found = [(pins[pin_id], score) for pin_id, score in matches if pin_id in pins][:limit]
+        data = self.get_serializer([pin for pin, _ in found], many=True).data
+        for item, (_, score) in zip(data, found):
+            item['similarity'] = round(score, 4)
+        return Response(data)
 
-class PinListCreate(generics.ListCreateAPIView):
+    @swagger_auto_schema(
+        operation_description="List the pins whose images look most like this pin's, most similar first, "
+                              "each with its cosine `similarity`.",
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description="Number of pins to return (default SIMILAR_PINS_LIMIT, at most 50).")
+        ],
+        responses={200: PinSerializer(many=True), 400: "Bad Request", 404: "Not Found"}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+class FeedView(generics.ListAPIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
-    queryset = Pin.objects.all()
     serializer_class = PinSerializer
-    filterset_class = PinFilter
+    pagination_class = FeedPagination
+
+    def get_queryset(self):
+        return self.get_serializer().setup_eager_loading(Pin.objects.all())
 
     @swagger_auto_schema(
-        operation_description="Retrieve a list of pins or create a new pin.",
-        responses={200: PinSerializer(many=True), 201: PinSerializer, 400: "Bad Request"}
+        operation_description="Retrieve the current user's home feed: their own pins and pins from accounts they follow, newest first.",
+        responses={200: PinSerializer(many=True)}
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+class UserCreatedPins(generics.ListAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = PinSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return self.get_serializer().setup_eager_loading(Pin.objects.filter(user=self.request.user))
+
     @swagger_auto_schema(
-        operation_description="Create a new pin.",
-        request_body=PinSerializer,
-        responses={201: PinSerializer, 400: "Bad Request"}
+        operation_description="Retrieve the pins created by the current user.",
+        responses={200: PinSerializer(many=True)}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+class UserSavedPins(generics.ListAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = PinSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return self.get_serializer().setup_eager_loading(Pin.objects.filter(savepins__user=self.request.user))
+
+    @swagger_auto_schema(
+        operation_description="Retrieve the pins saved by the current user.",
+        responses={200: PinSerializer(many=True)}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+class SavePin(views.APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Save a pin for the current user.",
+        responses={201: "Pin saved", 200: "Pin already saved", 404: "Not Found"}
+    )
+    def post(self, request, pin_id):
+        pin = get_object_or_404(Pin, pk=pin_id)
+        if writebehind.enabled():
+            created = not ViewerState(request.user).flag('is_saved', pin.pk)
+            writebehind.toggle('save', request.user.pk, pin.pk, True)
+        else:
+            _, created = SavePins.objects.get_or_create(user=request.user, pin=pin)
+        if created:
+            return Response({"detail": "Pin saved"}, status=status.HTTP_201_CREATED)
+        return Response({"detail": "Pin already saved"}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Remove a pin from the current user's saved pins.",
+        responses={204: "No Content", 404: "Not Found"}
+    )
+    def delete(self, request, pin_id):
+        pin = get_object_or_404(Pin, pk=pin_id)
+        if writebehind.enabled():
+            writebehind.toggle('save', request.user.pk, pin.pk, False)
+        else:
+            SavePins.objects.filter(user=request.user, pin=pin).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class LikePin(views.APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Like a pin as the current user.",
+        responses={201: "Pin liked", 200: "Pin already liked", 404: "Not Found"}
+    )
+    def post(self, request, pin_id):
+        pin = get_object_or_404(Pin, pk=pin_id)
+        if writebehind.enabled():
+            created = not ViewerState(request.user).flag('is_liked', pin.pk)
+            writebehind.toggle('like', request.user.pk, pin.pk, True)
+        else:
+            _, created = LikePins.objects.get_or_create(user=request.user, pin=pin)
+        if created:
+            return Response({"detail": "Pin liked"}, status=status.HTTP_201_CREATED)
+        return Response({"detail": "Pin already liked"}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Remove the current user's like from a pin.",
+        responses={204: "No Content", 404: "Not Found"}
+    )
+    def delete(self, request, pin_id):
+        pin = get_object_or_404(Pin, pk=pin_id)
+        if writebehind.enabled():
+            writebehind.toggle('like', request.user.pk, pin.pk, False)
+        else:
+            LikePins.objects.filter(user=request.user, pin=pin).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class VideoUploadCreate(generics.CreateAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = VideoUploadSerializer
+
+    @swagger_auto_schema(
+        operation_description="Start a resumable video upload with the file's name and total size in bytes. "
+                              "Send the bytes with PUT /uploads/videos/<id>/, then finalize it into a pin.",
+        request_body=VideoUploadSerializer,
+        responses={201: VideoUploadSerializer, 400: "Bad Request"}
     )
     def post(self, request, *args, **kwargs):
         return super().post(request, *args, **kwargs)
 
-class PinDetails(generics.RetrieveUpdateDestroyAPIView):
+class VideoUploadDetails(views.APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
-    queryset = Pin.objects.all()
-    serializer_class = PinSerializer
+
+    def get_upload(self, upload_id):
+        return get_object_or_404(VideoUpload, pk=upload_id, user=self.request.user)
 
     @swagger_auto_schema(
-        operation_description="Retrieve, update, or delete a specific pin.",
-        responses={200: PinSerializer, 204: "No Content", 400: "Bad Request", 404: "Not Found"}
+        operation_description="Get the state of a video upload: the offset to resume from, or the pin it became.",
+        responses={200: VideoUploadSerializer, 404: "Not Found"}
+    )
+    def get(self, request, upload_id):
+        upload = self.get_upload(upload_id)
+        return Response(VideoUploadSerializer(upload).data, headers={'Upload-Offset': str(upload.received)})
+
+    @swagger_auto_schema(
+        operation_description="Upload the next chunk as the raw request body. `Upload-Offset` must equal the "
+                              "upload's current offset; the response carries the new one.",
+        manual_parameters=[
+            openapi.Parameter('Upload-Offset', openapi.IN_HEADER, type=openapi.TYPE_INTEGER, required=True,
+                              description="Byte offset this chunk starts at.")
+        ],
+        responses={200: "New offset", 400: "Bad Request", 404: "Not Found", 409: "Offset mismatch"}
+    )
+    def put(self, request, upload_id):
+        upload = self.get_upload(upload_id)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers.get('Content-Length') or 0)
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "Upload-Offset and Content-Length headers are required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            received = uploads.write_chunk(upload, offset, request.stream, length)
+        except uploads.UploadError as exc:
+            return Response({"error": str(exc), **exc.extra}, status=exc.status_code)
+        return Response({"offset": received}, headers={'Upload-Offset': str(received)})
+
+    @swagger_auto_schema(
+        operation_description="Abandon an unfinished video upload.",
+        responses={204: "No Content", 404: "Not Found", 409: "Already finalized"}
+    )
+    def delete(self, request, upload_id):
+        upload = self.get_upload(upload_id)
+        if upload.status in (VideoUpload.Status.PROCESSING, VideoUpload.Status.DONE):
+            return Response({"error": "This upload has already been finalized."}, status=status.HTTP_409_CONFLICT)
+        uploads.discard(upload)
+        upload.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class VideoUploadFinalize(views.APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Turn a complete video upload into a pin. The video is stored and the pin created "
+                              "in the background; poll the upload until its status is `done`.",
+        request_body=VideoPinSerializer,
+        responses={202: VideoUploadSerializer, 400: "Bad Request", 404: "Not Found", 409: "Incomplete upload"}
+    )
+    def post(self, request, upload_id):
+        upload = get_object_or_404(VideoUpload, pk=upload_id, user=request.user)
+        serializer = VideoPinSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = uploads.finalize(upload, serializer.validated_data)
+        except uploads.UploadError as exc:
+            return Response({"error": str(exc), **exc.extra}, status=exc.status_code)
+        upload.refresh_from_db()
+        return Response(VideoUploadSerializer(upload).data, status=status.HTTP_202_ACCEPTED)
+
+class CommentListCreate(generics.ListCreateAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = CommentSerializer
+    pagination_class = CommentPagination
+
+    def get_queryset(self):
+        comments = Comment.objects.filter(pin_id=self.kwargs['pin_id'])
+        return self.get_serializer().setup_eager_loading(comments)
+
+    def perform_create(self, serializer):
+        pin = get_object_or_404(Pin, pk=self.kwargs['pin_id'])
+        serializer.save(pin=pin)
+
+    @swagger_auto_schema(
+        operation_description="Retrieve the comments on a pin.",
+        responses={200: CommentSerializer(many=True), 404: "Not Found"}
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
     @swagger_auto_schema(
-        operation_description="Update a specific pin.",
-        request_body=PinSerializer,
-        responses={200: PinSerializer, 400: "Bad Request", 404: "Not Found"}
+        operation_description="Comment on a pin.",
+        request_body=CommentSerializer,
+        responses={201: CommentSerializer, 400: "Bad Request", 404: "Not Found"}
+    )
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+class CommentDetails(generics.RetrieveUpdateDestroyAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = CommentSerializer
+
+    def get_queryset(self):
+        comments = Comment.objects.filter(pin_id=self.kwargs['pin_id'])
+        return self.get_serializer().setup_eager_loading(comments)
+
+    @swagger_auto_schema(
+        operation_description="Retrieve, update, or delete a comment.",
+        responses={200: CommentSerializer, 204: "No Content", 404: "Not Found"}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_description="Update a comment.",
+        request_body=CommentSerializer,
+        responses={200: CommentSerializer, 400: "Bad Request", 404: "Not Found"}
     )
     def put(self, request, *args, **kwargs):
         return super().put(request, *args, **kwargs)
 
     @swagger_auto_schema(
-        operation_description="Delete a specific pin.",
-        responses={204: "No Content", 400: "Bad Request", 404: "Not Found"}
+        operation_description="Delete a comment.",
+        responses={204: "No Content", 404: "Not Found"}
+    )
+    def delete(self, request, *args, **kwargs):
+        return super().delete(request, *args, **kwargs)
+
+class CommentRepliesCreate(generics.ListCreateAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = CommentRepliesSerializer
+    pagination_class = CommentPagination
+
+    def get_parent(self):
+        parent = self.request.query_params.get('parent')
+        if parent is None:
+            return None
+        try:
+            return int(parent)
+        except ValueError:
+            raise ValidationError({"error": "parent must be a reply id"})
+
+    def get_queryset(self):
+        replies = CommentReplies.objects.filter(
+            comment_id=self.kwargs['pk'], comment__pin_id=self.kwargs['pin_id'],
+            parent_reply_id=self.get_parent()
+        )
+        return self.get_serializer().setup_eager_loading(replies)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page:
+            attach_thread(
+                self.get_serializer(), self.kwargs['pin_id'], self.kwargs['pk'], page, root=self.get_parent()
+            )
+        return page
+
+    def perform_create(self, serializer):
+        comment = get_object_or_404(Comment, pk=self.kwargs['pk'], pin_id=self.kwargs['pin_id'])
+        serializer.save(comment=comment)
+
+    @swagger_auto_schema(
+        operation_description="Retrieve a page of replies to a comment, or with ?parent= to a reply, each with its reply tree.",
+        responses={200: CommentRepliesSerializer(many=True), 404: "Not Found"}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_description="Reply to a comment.",
+        request_body=CommentRepliesSerializer,
+        responses={201: CommentRepliesSerializer, 400: "Bad Request", 404: "Not Found"}
+    )
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+class CommentReplyDetails(generics.RetrieveUpdateDestroyAPIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = CommentRepliesSerializer
+    lookup_url_kwarg = 'reply_pk'
+
+    def get_queryset(self):
+        replies = CommentReplies.objects.filter(
+            comment_id=self.kwargs['pk'], comment__pin_id=self.kwargs['pin_id']
+        )
+        return self.get_serializer().setup_eager_loading(replies)
+
+    def get_object(self):
+        reply = super().get_object()
+        if self.request.method == 'GET':
+            attach_thread(
+                self.get_serializer(), self.kwargs['pin_id'], reply.comment_id, [reply], root=reply.parent_reply_id
+            )
+        return reply
+
+    @swagger_auto_schema(
+        operation_description="Retrieve, update, or delete a reply.",
+        responses={200: CommentRepliesSerializer, 204: "No Content", 404: "Not Found"}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_description="Update a reply.",
+        request_body=CommentRepliesSerializer,
+        responses={200: CommentRepliesSerializer, 400: "Bad Request", 404: "Not Found"}
+    )
+    def put(self, request, *args, **kwargs):
+        return super().put(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_description="Delete a reply.",
+        responses={204: "No Content", 404: "Not Found"}
     )
     def delete(self, request, *args, **kwargs):
         return super().delete(request, *args, **kwargs)
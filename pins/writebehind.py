@@ -0,0 +1,419 @@
+"""
+Write-behind buffering for like/save toggles.
+
+With WRITE_BEHIND_ENABLED, the like and save endpoints record the state the
+user asked for in a process-wide ToggleBuffer instead of writing it. Repeated
+toggles of the same (user, pin) coalesce to the last one. The buffer is
+flushed every WRITE_BEHIND_INTERVAL seconds by a daemon thread, or inline by
+the request that fills it to WRITE_BEHIND_FLUSH_SIZE entries, as a single
+transaction: per kind, one bulk INSERT ... ON CONFLICT DO NOTHING and one
+DELETE, and one counter UPDATE per distinct delta rather than one per
+toggle. Those bulk statements send no model signals, so the flush applies
+the counter, Pin.likes mirror and cache side effects of pins.signals itself.
+Both statements RETURN the rows they really changed (PostgreSQL, SQLite
+3.35+), and the counters move by those alone.
+
+Pending toggles are also published to the cache, per user and kind, and
+overlaid from there on pins.viewer.ViewerState, so the acting user reads
+their own writes straight away on whichever worker serves the next request;
+counters catch up on the next flush. That takes a cache shared by the
+workers (REDIS_URL): with the local-memory cache only the process holding a
+toggle sees it before the flush, and a warning is logged.
+
+If flushes keep failing, the buffer stops growing at WRITE_BEHIND_MAX_PENDING
+toggles; beyond that, toggles are written through synchronously instead.
+
+With WRITE_BEHIND_JOURNAL_DIR set, every toggle is appended to a journal
+file before it is acknowledged, journal segments are deleted once their
+toggles are flushed, and segments left behind by a crashed process are
+replayed by the next buffer to start.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from accounts.models import User
+from . import signals, viewer
+from .models import LikePins, Pin, SavePins
+
+logger = logging.getLogger(__name__)
+
+KINDS = {
+    'like': (LikePins, 'likes_count'),
+    'save': (SavePins, 'saves_count'),
+}
+
+
+def enabled():
+    return getattr(settings, 'WRITE_BEHIND_ENABLED', False)
+
+
+def pending_timeout():
+    return getattr(settings, 'WRITE_BEHIND_PENDING_TIMEOUT', 300)
+
+
+def _shared_key(kind, user_id):
+    return f'writebehind:{kind}:{user_id}'
+
+
+def _publish(kind, user_id, pin_id, state):
+    key = _shared_key(kind, user_id)
+    toggles = cache.get(key) or {}
+    toggles[pin_id] = state
+    cache.set(key, toggles, pending_timeout())
+
+
+def _retract(entries):
+    """
+    Drop [(kind, user_id, pin_id, state)] from the shared pending toggles,
+    each only if it still holds `state` (any state for None): a newer toggle
+    from another worker stays until that worker flushes it.
+    """
+    by_key = defaultdict(list)
+    for kind, user_id, pin_id, state in entries:
+        by_key[_shared_key(kind, user_id)].append((pin_id, state))
+    for key, written in by_key.items():
+        toggles = cache.get(key)
+        if not toggles:
+            continue
+        for pin_id, state in written:
+            if pin_id in toggles and (state is None or toggles[pin_id] == state):
+                del toggles[pin_id]
+        if toggles:
+            cache.set(key, toggles, pending_timeout())
+        else:
+            cache.delete(key)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Journal:
+    """
+    Append-only segments named `<pid>-<token>-<seq>.jsonl`, one JSON
+    `[kind, user_id, pin_id, state]` line per toggle. Lines are flushed to
+    the OS before the toggle is acknowledged, so they survive a process
+    crash (not a power cut).
+
+    A `state` of None records a toggle that was written through instead,
+    cancelling the buffered ones before it.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = f'{os.getpid()}-{time.time_ns():x}'
+        self.seq = 0
+        self.sealed = []
+        self._file = None
+
+    def _path(self):
+        return os.path.join(self.directory, f'{self.prefix}-{self.seq:06d}.jsonl')
+
+    def recover(self):
+        """Claim the segments of dead processes (or of an earlier process with our pid) and return their toggles."""
+        entries = []
+        for name in sorted(os.listdir(self.directory)):
+            pid = name.split('-', 1)[0]
+            if not pid.isdigit() or (int(pid) != os.getpid() and _alive(int(pid))):
+                continue
+            claimed = self._path()
+            try:
+                os.rename(os.path.join(self.directory, name), claimed)
+            except OSError:
+                continue  # claimed by another process first
+            self.seq += 1
+            self.sealed.append(claimed)
+            with open(claimed) as segment:
+                for line in segment:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break  # torn final line from the crash
+        return entries
+
+    def append(self, entry):
+        if self._file is None:
+            self._file = open(self._path(), 'a')
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def seal(self):
+        """Close the open segment; return every segment not yet known to be flushed."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self.sealed.append(self._path())
+            self.seq += 1
+        sealed, self.sealed = self.sealed, []
+        return sealed
+
+
+class ToggleBuffer:
+    def __init__(self, flush_size, interval, journal_dir=None, max_pending=None):
+        self.flush_size = flush_size
+        self.interval = interval
+        self.max_pending = max_pending or flush_size * 10
+        # {(kind, user_id): {pin_id: state}}, so a user's pending toggles are one lookup
+        self._pending = {}
+        self._size = 0
+        # toggles taken by a flush that has not finished yet; they come back if it fails
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._journal = Journal(journal_dir) if journal_dir else None
+        if self._journal is not None:
+            for kind, user_id, pin_id, state in self._journal.recover():
+                if state is None:
+                    self._drop(kind, user_id, pin_id)
+                else:
+                    self._put(kind, user_id, pin_id, state)
+            if self._size:
+                self._start()
+
+    def _put(self, kind, user_id, pin_id, state, replace=True):
+        toggles = self._pending.setdefault((kind, user_id), {})
+        if pin_id not in toggles:
+            self._size += 1
+        elif not replace:
+            return
+        toggles[pin_id] = state
+
+    def _drop(self, kind, user_id, pin_id):
+        toggles = self._pending.get((kind, user_id))
+        if toggles is not None and pin_id in toggles:
+            del toggles[pin_id]
+            self._size -= 1
+            return True
+        return False
+
+    def toggle(self, kind, user_id, pin_id, state):
+        """
+        Buffer a toggle. Returns False, buffering nothing, once the buffer
+        holds `max_pending` toggles; the caller then writes it itself, and any
+        older toggle of the same (user, pin) still buffered is dropped so the
+        next flush cannot undo that write.
+        """
+        with self._lock:
+            if self._size + self._in_flight >= self.max_pending:
+                if self._drop(kind, user_id, pin_id) and self._journal is not None:
+                    self._journal.append([kind, user_id, pin_id, None])
+                _retract([(kind, user_id, pin_id, None)])
+                return False
+            if self._journal is not None:
+                self._journal.append([kind, user_id, pin_id, state])
+            self._put(kind, user_id, pin_id, state)
+            _publish(kind, user_id, pin_id, state)
+            full = self._size >= self.flush_size
+        self._start()
+        if full:
+            self.flush()
+        return True
+
+    def pending(self, kind, user_id):
+        """{pin_id: state} of the user's toggles of `kind` not flushed yet, by any worker."""
+        with self._lock:
+            local = dict(self._pending.get((kind, user_id), ()))
+        # the shared copy is the newest; this process's own toggles survive its eviction
+        return {**local, **(cache.get(_shared_key(kind, user_id)) or {})}
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of toggles written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._in_flight, self._size = self._size, 0
+                segments = self._journal.seal() if self._journal is not None else []
+            batch = {
+                (kind, user_id, pin_id): state
+                for (kind, user_id), toggles in pending.items() for pin_id, state in toggles.items()
+            }
+            try:
+                if batch:
+                    apply(batch)
+            except Exception:
+                logger.exception("Flushing %d buffered toggles failed; keeping them for the next flush", len(batch))
+                with self._lock:
+                    for (kind, user_id, pin_id), state in batch.items():
+                        self._put(kind, user_id, pin_id, state, replace=False)  # toggles made since win
+                    self._in_flight = 0
+                    if self._journal is not None:
+                        self._journal.sealed[:0] = segments
+                return 0
+            with self._lock:
+                self._in_flight = 0
+            _retract([(kind, user_id, pin_id, state) for (kind, user_id, pin_id), state in batch.items()])
+            for segment in segments:
+                os.remove(segment)
+            return len(batch)
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='toggle-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Background toggle flush failed")
+            finally:
+                connection.close()
+
+
+def apply(batch):
+    """
+    Write a {(kind, user_id, pin_id): state} batch of toggles in one
+    transaction. Counters move by the rows the INSERT and DELETE report
+    back, not by what the batch asked for, so rows another request or
+    process wrote meanwhile are never counted twice.
+    """
+    touched_pins, touched_users = set(), set()
+    with transaction.atomic():
+        for kind, (model, counter) in KINDS.items():
+            wanted = {(user_id, pin_id): state for (k, user_id, pin_id), state in batch.items() if k == kind}
+            if not wanted:
+                continue
+            user_ids = {user_id for user_id, _ in wanted}
+            pin_ids = {pin_id for _, pin_id in wanted}
+            # skip pins and users deleted while their toggles sat in the buffer
+            live_pins = set(Pin.objects.filter(pk__in=pin_ids).values_list('pk', flat=True))
+            live_users = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+            added = _insert_pairs(model, [
+                (user_id, pin_id) for (user_id, pin_id), state in wanted.items()
+                if state and pin_id in live_pins and user_id in live_users
+            ])
+            removed = _delete_pairs(model, [key for key, state in wanted.items() if not state])
+            if kind == 'like':
+                # what pins.signals.like_created/like_deleted would have mirrored, row by row;
+                # likes_count counts Pin.likes, so it follows these rows
+                added = _insert_pairs(Pin.likes.through, added)
+                removed = _delete_pairs(Pin.likes.through, removed)
+
+            deltas = defaultdict(int)
+            for _, pin_id in added:
+                deltas[pin_id] += 1
+            for _, pin_id in removed:
+                deltas[pin_id] -= 1
+            by_delta = defaultdict(list)
+            for pin_id, delta in deltas.items():
+                by_delta[delta].append(pin_id)
+            for delta, pins in by_delta.items():
+                signals.bump_counter(pins, counter, delta)
+
+            touched_pins.update(pin_id for _, pin_id in added + removed)
+            touched_users.update(user_id for user_id, _ in added + removed)
+
+        if touched_pins:
+            signals.invalidate_pins(*touched_pins)
+        for user_id in touched_users:
+            viewer.forget(user_id)
+
+
+# pairs per statement, two parameters each; well under SQLite's limit on bound parameters
+PAIRS_PER_STATEMENT = 400
+
+
+def _run_pairs(sql, pairs):
+    rows = []
+    with connection.cursor() as cursor:
+        for start in range(0, len(pairs), PAIRS_PER_STATEMENT):
+            chunk = pairs[start:start + PAIRS_PER_STATEMENT]
+            cursor.execute(sql(len(chunk)), [value for pair in chunk for value in pair])
+            rows.extend(tuple(row) for row in cursor.fetchall())
+    return rows
+
+
+def _insert_pairs(model, pairs):
+    """
+    INSERT ... ON CONFLICT DO NOTHING the (user_id, pin_id) pairs into
+    `model`'s table, without signals; returns the pairs actually inserted.
+    """
+    if not pairs:
+        return []
+    quote = connection.ops.quote_name
+    table, user, pin = quote(model._meta.db_table), quote('user_id'), quote('pin_id')
+    return _run_pairs(
+        lambda count: (
+            f'INSERT INTO {table} ({user}, {pin}) VALUES {", ".join(["(%s, %s)"] * count)} '
+            f'ON CONFLICT DO NOTHING RETURNING {user}, {pin}'
+        ),
+        pairs,
+    )
+
+
+def _delete_pairs(model, pairs):
+    """DELETE the (user_id, pin_id) pairs from `model`'s table, without signals; returns the pairs actually deleted."""
+    if not pairs:
+        return []
+    quote = connection.ops.quote_name
+    table, user, pin = quote(model._meta.db_table), quote('user_id'), quote('pin_id')
+    return _run_pairs(
+        lambda count: (
+            f'DELETE FROM {table} WHERE {" OR ".join([f"({user} = %s AND {pin} = %s)"] * count)} '
+            f'RETURNING {user}, {pin}'
+        ),
+        pairs,
+    )
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                if settings.CACHES['default']['BACKEND'].endswith(('LocMemCache', 'DummyCache')):
+                    logger.warning(
+                        "Write-behind with a process-local cache: other workers will not show a user's "
+                        "buffered toggles until they are flushed. Set REDIS_URL when running several workers."
+                    )
+                _buffer = ToggleBuffer(
+                    flush_size=getattr(settings, 'WRITE_BEHIND_FLUSH_SIZE', 1000),
+                    interval=getattr(settings, 'WRITE_BEHIND_INTERVAL', 1.0),
+                    journal_dir=getattr(settings, 'WRITE_BEHIND_JOURNAL_DIR', None),
+                    max_pending=getattr(settings, 'WRITE_BEHIND_MAX_PENDING', None),
+                )
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def toggle(kind, user_id, pin_id, state):
+    if not get_buffer().toggle(kind, user_id, pin_id, state):
+        # the buffer is full because flushes keep failing: write through, with the usual signals
+        model = KINDS[kind][0]
+        if state:
+            model.objects.get_or_create(user_id=user_id, pin_id=pin_id)
+        else:
+            model.objects.filter(user_id=user_id, pin_id=pin_id).delete()
+    viewer.changed(user_id)
+
+
+def pending(kind, user_id):
+    if not enabled():
+        return {}
+    return get_buffer().pending(kind, user_id)